@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass
+from typing import Callable, Collection
+
+import orjson
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import Settings
+from .queue import QueueBackend
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Rejection:
+    reason: str
+    retry_after_seconds: int
+
+
+class AdmissionController:
+    """Decides whether an upload may start, based on backlog and bytes being received.
+
+    Queue limits are checked against Redis (one pipelined round trip, skipped when no
+    queue limit is configured); the bytes-in-flight cap is local to this pod.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.inflight_bytes = 0
+
+    @property
+    def checks_queue(self) -> bool:
+        return bool(self.settings.admission_max_queue_depth or self.settings.admission_max_submitter_depth)
+
+    def check_bytes(self, content_length: int) -> Rejection | None:
+        """Apply only the bytes-in-flight cap (no Redis round trip)."""
+        settings = self.settings
+        if settings.admission_max_inflight_bytes and self.inflight_bytes:
+            overflow = self.inflight_bytes + content_length - settings.admission_max_inflight_bytes
+            if overflow > 0:
+                return Rejection(
+                    "Too many bytes being uploaded; retry shortly",
+                    self._retry_after(overflow / settings.admission_ingest_bytes_per_second),
+                )
+        return None
+
+    async def check(self, queue: QueueBackend, *, submitter: str | None, content_length: int) -> Rejection | None:
+        settings = self.settings
+        rejection = self.check_bytes(content_length)
+        if rejection is not None or not self.checks_queue:
+            return rejection
+        depth, submitter_depth = await queue.admission_snapshot(submitter)
+        limit = settings.admission_max_queue_depth
+        if limit and depth >= limit:
+            return Rejection(
+                f"OCR queue is full ({depth} tasks waiting)",
+                self._retry_after((depth - limit + 1) / settings.admission_drain_tasks_per_second),
+            )
+        limit = settings.admission_max_submitter_depth
+        if limit and submitter and submitter_depth >= limit:
+            return Rejection(
+                f"Submitter already has {submitter_depth} tasks waiting",
+                self._retry_after((submitter_depth - limit + 1) / settings.admission_drain_tasks_per_second),
+            )
+        return None
+
+    def _retry_after(self, seconds: float) -> int:
+        return max(1, min(self.settings.admission_max_retry_after_seconds, math.ceil(seconds)))
+
+
+class AdmissionMiddleware:
+    """Rejects ``POST`` requests that start an upload (``paths``) with 429 before the body is read.
+
+    FastAPI parses the multipart body before any dependency runs, so the check has to
+    sit in front of the router to keep rejected uploads off the spool and storage.
+    Uploads that do not stream through the pod are checked when they are started.
+    ``PATCH`` chunks under ``chunk_prefix`` belong to uploads already admitted, so they
+    are held only to the bytes-in-flight cap, which they count towards.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        controller: AdmissionController,
+        queue_getter: Callable[[], QueueBackend],
+        paths: Collection[str] = ("/upload",),
+        chunk_prefix: str | None = None,
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.queue_getter = queue_getter
+        self.paths = frozenset(paths)
+        self.chunk_prefix = chunk_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        starts_upload = scope["method"] == "POST" and scope["path"] in self.paths
+        is_chunk = (
+            scope["method"] == "PATCH" and self.chunk_prefix is not None and scope["path"].startswith(self.chunk_prefix)
+        )
+        if not starts_upload and not is_chunk:
+            await self.app(scope, receive, send)
+            return
+
+        settings = self.controller.settings
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        submitter = headers.get("x-submitter") or headers.get("x-sme-id")
+        try:
+            content_length = int(headers.get("content-length", ""))
+        except ValueError:
+            content_length = (
+                settings.resumable_max_chunk_size_mb * 1024 * 1024 if is_chunk else settings.max_pdf_bytes
+            )
+
+        if is_chunk:
+            rejection = self.controller.check_bytes(content_length)
+        else:
+            rejection = await self.controller.check(
+                self.queue_getter(), submitter=submitter, content_length=content_length
+            )
+        if rejection is not None:
+            LOGGER.warning("Rejected upload submitter=%s reason=%s", submitter, rejection.reason)
+            await send_rejection(send, rejection)
+            return
+
+        self.controller.inflight_bytes += content_length
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.inflight_bytes -= content_length
+
+
+async def send_rejection(send: Send, rejection: Rejection) -> None:
+    body = orjson.dumps({"detail": rejection.reason})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(rejection.retry_after_seconds).encode()),
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
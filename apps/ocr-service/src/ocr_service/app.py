@@ -1,27 +1,69 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable
+from typing import AsyncIterator, Awaitable, Callable
 from uuid import uuid4
 
-from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile, status
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
+from .admission import AdmissionController, AdmissionMiddleware
 from .config import Settings, get_settings
+from .events import EventBroker, EventScope
+from .metrics import (
+    INGESTED_BYTES,
+    QUEUE_DEPTH,
+    QUEUE_OLDEST_AGE_SECONDS,
+    UPLOAD_PHASE_SECONDS,
+    MetricsMiddleware,
+    current_request,
+    render_latest,
+    timed,
+)
 from .models import (
+    TERMINAL_STATUSES,
+    BatchStatusRequest,
+    BatchStatusResponse,
+    DeadLetterPage,
+    DeadLetterRequeueRequest,
+    DeadLetterRequeueResponse,
     HealthResponse,
+    PdfPreflight,
+    PendingUpload,
+    PresignRequest,
+    PresignResponse,
     QueueTask,
+    ResumableUpload,
+    ResumableUploadRequest,
+    ResumableUploadResponse,
     ReadyResponse,
     StatusResponse,
+    StorageArtifact,
+    TaskEvent,
+    TaskListResponse,
     TaskRecord,
     TaskStatus,
     UploadResponse,
 )
-from .queue import TaskQueue
-from .repository import TaskRepository
-from .storage import LocalStorageBackend, S3StorageBackend, StorageBackend, build_storage_key
+from .preflight import PdfLimitError, preflight_stored, preflight_upload
+from .queue import QueueBackend, create_queue
+from .repository import TaskRepository, create_repository
+from .results import ResultStore, create_result_store, decode_page
+from .resumable import ResumableUploadStore, Sha256State, create_resumable_store
+from .retries import RetryQueue, create_retry_queue
+from .shards import plan_shards, shard_task_id, split_task
+from .storage import (
+    StorageBackend,
+    build_storage_key,
+    compute_stored_digest,
+    compute_upload_digest,
+    create_storage_backend,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -29,24 +71,13 @@ LOGGER = logging.getLogger(__name__)
 @dataclass
 class ServiceState:
     settings: Settings
-    queue: TaskQueue
+    queue: QueueBackend
     storage: StorageBackend
+    results: ResultStore
     repo: TaskRepository | None = None
-
-
-def create_storage_backend(settings: Settings, override: StorageBackend | None = None) -> StorageBackend:
-    if override:
-        return override
-    if settings.storage_mode == "s3":
-        if not settings.s3_bucket:
-            raise ValueError("S3 bucket must be configured for storage_mode=s3")
-        return S3StorageBackend(
-            bucket=settings.s3_bucket,
-            prefix=settings.storage_prefix,
-            region=settings.s3_region,
-            endpoint_url=settings.s3_endpoint_url,
-        )
-    return LocalStorageBackend(base_path=settings.storage_root, base_uri=settings.storage_base_uri)
+    events: EventBroker | None = None
+    uploads: ResumableUploadStore | None = None
+    retries: RetryQueue | None = None
 
 
 def create_app(
@@ -60,18 +91,31 @@ def create_app(
     resolved_settings = settings or get_settings()
 
     storage = create_storage_backend(resolved_settings, override=storage_backend)
-    queue = TaskQueue(queue_name=resolved_settings.queue_name, redis_url=resolved_settings.redis_url, redis_client=redis_client)
-    state = ServiceState(settings=resolved_settings, queue=queue, storage=storage)
+    queue = create_queue(resolved_settings, redis_client=redis_client)
+    state = ServiceState(
+        settings=resolved_settings,
+        queue=queue,
+        storage=storage,
+        results=create_result_store(storage, resolved_settings),
+    )
     app.state.service = state
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=AdmissionController(resolved_settings),
+        queue_getter=lambda: state.queue,
+        paths=("/upload", "/uploads/presign", "/uploads"),
+        chunk_prefix="/uploads/",
+    )
+    app.add_middleware(MetricsMiddleware)
 
     @app.on_event("startup")
     async def startup() -> None:
         await state.queue.connect()
-        state.repo = TaskRepository(
-            state.queue.redis,
-            key_prefix=state.settings.task_status_prefix,
-            ttl_seconds=state.settings.task_ttl_seconds,
-        )
+        state.repo = create_repository(state.queue.redis, state.settings)
+        await state.repo.convert_legacy_records()
+        state.events = EventBroker(state.queue.redis, channel_prefix=state.settings.events_channel_prefix)
+        state.uploads = create_resumable_store(state.queue.redis, state.settings)
+        state.retries = create_retry_queue(state.queue.redis, state.settings)
         await state.storage.connect()
         LOGGER.info(
             "OCR service ready env=%s storage=%s queue=%s",
@@ -82,6 +126,8 @@ def create_app(
 
     @app.on_event("shutdown")
     async def shutdown() -> None:
+        if state.events is not None:
+            await state.events.close()
         await state.queue.close()
         await state.storage.close()
 
@@ -97,8 +143,12 @@ def create_app(
     async def upload_pdf(
         request: Request,
         file: UploadFile = File(...),
+        priority: int = Form(default=5, ge=0, le=9),
         service: ServiceState = Depends(get_state),
     ) -> UploadResponse:
+        request_metrics = current_request()
+        if request_metrics is not None:
+            UPLOAD_PHASE_SECONDS.labels(phase="receive").observe(time.perf_counter() - request_metrics.started)
         if not file.filename:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Filename missing")
         if not is_allowed(file.filename, service.settings):
@@ -109,6 +159,21 @@ def create_app(
 
         now = datetime.now(timezone.utc)
         task_id = uuid4().hex
+        assert service.repo
+
+        digest: str | None = None
+        if service.settings.dedup_enabled:
+            try:
+                with timed(UPLOAD_PHASE_SECONDS, phase="hash"):
+                    digest, _ = await compute_upload_digest(file, max_bytes=service.settings.max_pdf_bytes)
+            except ValueError as exc:  # file too large
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(exc)) from exc
+            with timed(UPLOAD_PHASE_SECONDS, phase="redis"):
+                duplicate = await find_duplicate(service, digest, task_id)
+            if duplicate:
+                LOGGER.info("Duplicate upload sha256=%s attached to task %s", digest, duplicate.task_id)
+                return await deduplicated_response(service, request, duplicate)
+
         key = build_storage_key(
             file.filename,
             prefix=service.settings.storage_prefix,
@@ -117,75 +182,520 @@ def create_app(
         )
 
         try:
-            artifact = await service.storage.save_upload(
-                file,
-                key=key,
-                max_bytes=service.settings.max_pdf_bytes,
-            )
+            with timed(UPLOAD_PHASE_SECONDS, phase="storage"):
+                # The digest, when dedup computed one, is not hashed a second time.
+                artifact = await service.storage.save_upload(
+                    file,
+                    key=key,
+                    max_bytes=service.settings.max_pdf_bytes,
+                    sha256=digest,
+                )
         except ValueError as exc:  # file too large
+            if digest:
+                await service.repo.release_digest(digest, task_id)
             raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(exc)) from exc
+        except Exception:
+            if digest:
+                await service.repo.release_digest(digest, task_id)
+            raise
 
-        submitter = request.headers.get("X-Submitter") or request.headers.get("X-SME-ID")
-
-        task_record = TaskRecord(
+        preflight = await run_preflight(
+            service, lambda: preflight_upload(file), task_id=task_id, storage_key=key, digest=digest
+        )
+        return await enqueue_upload(
+            service,
+            request,
             task_id=task_id,
             filename=file.filename,
-            status=TaskStatus.queued,
             content_type=file.content_type or "application/pdf",
-            size_bytes=artifact.size_bytes,
-            sha256=artifact.sha256,
-            storage_uri=artifact.uri,
-            storage_path=artifact.path,
-            queue_name=service.settings.queue_name,
+            artifact=artifact,
+            priority=priority,
             submitted_at=now,
-            updated_at=now,
-            submitted_by=submitter,
+            preflight=preflight,
         )
 
+    @app.post("/uploads/presign", response_model=PresignResponse, summary="Get a URL to upload a PDF directly to storage")
+    async def presign_upload(
+        body: PresignRequest,
+        request: Request,
+        service: ServiceState = Depends(get_state),
+    ) -> PresignResponse:
+        if not is_allowed(body.filename, service.settings):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Only PDF uploads are supported",
+            )
+        if body.size_bytes > service.settings.max_pdf_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds {service.settings.max_pdf_size_mb} MB limit",
+            )
         assert service.repo
-        await service.repo.save(task_record)
+        now = datetime.now(timezone.utc)
+        task_id = uuid4().hex
+        sha256 = body.sha256.lower()
+
+        expires_in = service.settings.presign_expires_seconds
+        if service.settings.dedup_enabled:
+            # The claim stays in flight for as long as the pending upload can be completed.
+            duplicate = await find_duplicate(service, sha256, task_id, pending_ttl_seconds=expires_in + 300)
+            if duplicate:
+                LOGGER.info("Duplicate presign sha256=%s attached to task %s", sha256, duplicate.task_id)
+                return PresignResponse(
+                    task_id=duplicate.task_id,
+                    status_url=str(request.url_for("get_status", task_id=duplicate.task_id)),
+                    deduplicated=True,
+                )
 
-        payload = QueueTask(
+        key = build_storage_key(body.filename, prefix=service.settings.storage_prefix, task_id=task_id, timestamp=now)
+        try:
+            presigned = await service.storage.presign_upload(
+                key,
+                size_bytes=body.size_bytes,
+                sha256=sha256,
+                content_type=body.content_type,
+                expires_in=expires_in,
+            )
+        except NotImplementedError as exc:
+            if service.settings.dedup_enabled:
+                await service.repo.release_digest(sha256, task_id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Presigned uploads require S3 storage",
+            ) from exc
+
+        pending = PendingUpload(
             task_id=task_id,
-            filename=file.filename,
-            content_type=task_record.content_type,
-            size_bytes=artifact.size_bytes,
-            sha256=artifact.sha256,
-            storage_uri=artifact.uri,
-            storage_path=artifact.path,
-            submitted_at=now,
-            submitted_by=submitter,
+            filename=body.filename,
+            content_type=body.content_type,
+            size_bytes=body.size_bytes,
+            sha256=sha256,
+            storage_key=key,
+            priority=body.priority,
+            submitted_by=request.headers.get("X-Submitter") or request.headers.get("X-SME-ID"),
+            batch_id=request.headers.get("X-Batch-ID"),
+            created_at=now,
+        )
+        # Outlive the URL a little so a PUT that finishes at the deadline can still complete.
+        await service.repo.save_pending_upload(pending, ttl_seconds=expires_in + 300)
+        return PresignResponse(
+            task_id=task_id,
+            status_url=str(request.url_for("get_status", task_id=task_id)),
+            complete_url=str(request.url_for("complete_upload", task_id=task_id)),
+            upload_url=presigned.url,
+            upload_headers=presigned.headers,
+            expires_at=presigned.expires_at,
+        )
+
+    @app.post(
+        "/uploads/{task_id}/complete",
+        response_model=UploadResponse,
+        status_code=status.HTTP_202_ACCEPTED,
+        name="complete_upload",
+        summary="Verify a presigned upload and queue OCR work",
+    )
+    async def complete_upload(
+        task_id: str,
+        request: Request,
+        service: ServiceState = Depends(get_state),
+    ) -> UploadResponse:
+        assert service.repo
+        pending = await service.repo.get_pending_upload(task_id)
+        if pending is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+        try:
+            info = await service.storage.head(pending.storage_key)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Object has not been uploaded yet") from exc
+        sha256 = info.sha256
+        if sha256 is None and info.size_bytes == pending.size_bytes:
+            # The store kept no SHA-256 of the body; the declared one is what dedup keys
+            # on, so hash the object here instead of trusting the client.
+            with timed(UPLOAD_PHASE_SECONDS, phase="hash"):
+                sha256 = await compute_stored_digest(service.storage, pending.storage_key, size_bytes=info.size_bytes)
+        if info.size_bytes != pending.size_bytes or sha256 != pending.sha256:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Uploaded object does not match the declared size and SHA-256",
+            )
+        if not await service.repo.consume_pending_upload(task_id):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already completed")
+
+        artifact = StorageArtifact(uri=info.uri, path=info.path, size_bytes=info.size_bytes, sha256=pending.sha256)
+        preflight = await run_preflight(
+            service,
+            lambda: preflight_stored(service.storage, pending.storage_key, size_bytes=info.size_bytes),
+            task_id=task_id,
+            storage_key=pending.storage_key,
+            digest=pending.sha256,
+        )
+        return await enqueue_upload(
+            service,
+            request,
+            task_id=task_id,
+            filename=pending.filename,
+            content_type=pending.content_type,
+            artifact=artifact,
+            priority=pending.priority,
+            submitted_at=pending.created_at,
+            submitter=pending.submitted_by,
+            batch_id=pending.batch_id,
+            preflight=preflight,
         )
-        await service.queue.enqueue(payload)
-        depth = await service.queue.depth()
 
-        status_url = request.url_for("get_status", task_id=task_id)
-        return UploadResponse(
+    @app.post(
+        "/uploads",
+        response_model=ResumableUploadResponse,
+        status_code=status.HTTP_201_CREATED,
+        summary="Start a resumable upload",
+    )
+    async def create_resumable_upload(
+        body: ResumableUploadRequest,
+        request: Request,
+        response: Response,
+        service: ServiceState = Depends(get_state),
+    ) -> ResumableUploadResponse:
+        if not is_allowed(body.filename, service.settings):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Only PDF uploads are supported",
+            )
+        if body.size_bytes > service.settings.max_pdf_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds {service.settings.max_pdf_size_mb} MB limit",
+            )
+        if not Sha256State.available():
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Resumable uploads need OpenSSL libcrypto on the server",
+            )
+        assert service.uploads
+        now = datetime.now(timezone.utc)
+        task_id = uuid4().hex
+        key = build_storage_key(body.filename, prefix=service.settings.storage_prefix, task_id=task_id, timestamp=now)
+        try:
+            upload_id = await service.storage.begin_resumable(key, content_type=body.content_type)
+        except NotImplementedError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Storage backend does not support resumable uploads",
+            ) from exc
+        await service.uploads.create(
+            ResumableUpload(
+                task_id=task_id,
+                filename=body.filename,
+                content_type=body.content_type,
+                size_bytes=body.size_bytes,
+                storage_key=key,
+                upload_id=upload_id,
+                priority=body.priority,
+                submitted_by=request.headers.get("X-Submitter") or request.headers.get("X-SME-ID"),
+                batch_id=request.headers.get("X-Batch-ID"),
+                created_at=now,
+            )
+        )
+        upload_url = str(request.url_for("append_upload_chunk", task_id=task_id))
+        response.headers["Location"] = upload_url
+        min_chunk = service.storage.resumable_min_part_size
+        return ResumableUploadResponse(
             task_id=task_id,
-            status=TaskStatus.queued,
-            received_bytes=artifact.size_bytes,
-            sha256=artifact.sha256,
-            storage_uri=artifact.uri,
-            queue_depth=depth,
-            status_url=str(status_url),
+            upload_url=upload_url,
+            offset=0,
+            size_bytes=body.size_bytes,
+            chunk_size=max(service.settings.resumable_chunk_size_mb * 1024 * 1024, min_chunk),
+            min_chunk_size=min_chunk,
+            max_chunk_size=service.settings.resumable_max_chunk_size_mb * 1024 * 1024,
         )
 
+    @app.head("/uploads/{task_id}", summary="Report how much of a resumable upload has been received")
+    async def get_upload_offset(task_id: str, service: ServiceState = Depends(get_state)) -> Response:
+        assert service.uploads
+        found = await service.uploads.get(task_id)
+        if found is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+        session, _ = found
+        return Response(headers={**upload_offset_headers(session.offset), "Upload-Length": str(session.size_bytes)})
+
+    @app.patch("/uploads/{task_id}", name="append_upload_chunk", summary="Append the next chunk of a resumable upload")
+    async def append_upload_chunk(
+        task_id: str,
+        request: Request,
+        service: ServiceState = Depends(get_state),
+    ) -> Response:
+        """Write the request body at ``Upload-Offset``.
+
+        Returns 204 with the new ``Upload-Offset`` until the last byte arrives, then 202
+        with the queued task. A chunk is committed only once it has been received and
+        stored in full; after a dropped connection, HEAD the upload and resend from the
+        reported offset. An empty PATCH at the final offset retries a failed assembly.
+        """
+        assert service.uploads
+        uploads = service.uploads
+        if await uploads.get(task_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+        try:
+            offset = int(request.headers["upload-offset"])
+        except (KeyError, ValueError) as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload-Offset header required") from exc
+        # The lock is held until the request is done, assembly and queueing included, so
+        # a retried PATCH never writes into or finishes an upload another one is finishing.
+        token = await uploads.acquire(task_id, timeout_seconds=service.settings.task_lease_seconds)
+        if token is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another chunk is being written")
+        try:
+            found = await uploads.get(task_id)
+            if found is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+            session, sha_state = found
+            if offset != session.offset:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Upload is at offset {session.offset}",
+                    headers=upload_offset_headers(session.offset),
+                )
+            hasher = Sha256State(sha_state)
+            if offset < session.size_bytes:
+                data = await read_chunk(
+                    request,
+                    limit=min(session.size_bytes - offset, service.settings.resumable_max_chunk_size_mb * 1024 * 1024),
+                )
+                end = offset + len(data)
+                if not data or (end < session.size_bytes and len(data) < service.storage.resumable_min_part_size):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Chunks before the last must be at least {service.storage.resumable_min_part_size} bytes",
+                    )
+                with timed(UPLOAD_PHASE_SECONDS, phase="storage"):
+                    await asyncio.gather(
+                        service.storage.write_resumable_part(
+                            session.storage_key,
+                            session.upload_id,
+                            part_number=session.parts + 1,
+                            offset=offset,
+                            data=data,
+                        ),
+                        asyncio.to_thread(hasher.update, data),
+                    )
+                stored = await uploads.advance(
+                    task_id, expected_offset=offset, offset=end, parts=session.parts + 1, sha_state=hasher.export()
+                )
+                if stored is None:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+                if stored != end:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"Upload is at offset {stored}",
+                        headers=upload_offset_headers(stored),
+                    )
+                if end < session.size_bytes:
+                    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=upload_offset_headers(end))
+            return await finish_resumable_upload(service, request, task_id, session, hasher.hexdigest())
+        finally:
+            await uploads.release(task_id, token)
+
+    @app.delete(
+        "/uploads/{task_id}",
+        status_code=status.HTTP_204_NO_CONTENT,
+        summary="Abandon a resumable upload",
+    )
+    async def delete_resumable_upload(task_id: str, service: ServiceState = Depends(get_state)) -> Response:
+        assert service.uploads
+        found = await service.uploads.get(task_id)
+        if found is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+        session, _ = found
+        await service.uploads.delete(task_id)
+        await service.storage.abort_resumable(session.storage_key, session.upload_id)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
     @app.get("/status/{task_id}", response_model=StatusResponse, name="get_status")
     async def get_status(
         task_id: str,
         service: ServiceState = Depends(get_state),
     ) -> StatusResponse:
         assert service.repo
-        record = await service.repo.get(task_id)
+        record, history = await asyncio.gather(service.repo.get(task_id), service.repo.get_history(task_id))
         if not record:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        depth = await service.queue.depth()
-        return StatusResponse(task=record, queue_depth=depth)
+        depth, by_tier = await asyncio.gather(service.queue.depth(), service.queue.depth_by_tier())
+        return StatusResponse(task=record, queue_depth=depth, queue_depth_by_tier=by_tier, history=history)
+
+    @app.post("/status/batch", response_model=BatchStatusResponse, summary="Look up many tasks at once")
+    async def get_status_batch(
+        body: BatchStatusRequest,
+        service: ServiceState = Depends(get_state),
+    ) -> BatchStatusResponse:
+        task_ids = list(dict.fromkeys(body.task_ids))
+        if len(task_ids) > service.settings.status_batch_max_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {service.settings.status_batch_max_ids} task ids per request",
+            )
+        assert service.repo
+        records, depth = await asyncio.gather(service.repo.get_many(task_ids), service.queue.depth())
+        return BatchStatusResponse(
+            tasks=[records[task_id] for task_id in task_ids if task_id in records],
+            missing=[task_id for task_id in task_ids if task_id not in records],
+            queue_depth=depth,
+        )
+
+    @app.get("/tasks", response_model=TaskListResponse, summary="List recent tasks, newest first")
+    async def list_tasks(
+        submitter: str | None = Query(default=None, description="Only tasks uploaded with this X-Submitter"),
+        cursor: str | None = Query(default=None, description="next_cursor of the previous page"),
+        limit: int = Query(default=50, ge=1, le=500),
+        service: ServiceState = Depends(get_state),
+    ) -> TaskListResponse:
+        assert service.repo
+        try:
+            tasks, next_cursor = await service.repo.list_tasks(submitter=submitter, cursor=cursor, limit=limit)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+        return TaskListResponse(tasks=tasks, next_cursor=next_cursor)
+
+    @app.post("/tasks/{task_id}/cancel", response_model=TaskEvent, summary="Cancel a task that has not finished")
+    async def cancel_task(task_id: str, service: ServiceState = Depends(get_state)) -> TaskEvent:
+        assert service.repo
+        event = await service.repo.cancel(task_id)
+        if event is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+        if event.status != TaskStatus.cancelled:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Task already {event.status.value}")
+        record = await service.repo.get(task_id)
+        if record is not None and record.shard_count:
+            await asyncio.gather(
+                *(service.repo.cancel(shard_task_id(task_id, index)) for index in range(record.shard_count))
+            )
+        LOGGER.info("Cancelled task %s", task_id)
+        return event
+
+    @app.get("/dead-letters", response_model=DeadLetterPage, summary="List tasks that ran out of retries")
+    async def list_dead_letters(
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=1, le=1000),
+        service: ServiceState = Depends(get_state),
+    ) -> DeadLetterPage:
+        assert service.retries
+        total, items = await service.retries.dead_letters(offset=offset, limit=limit)
+        return DeadLetterPage(total=total, items=items)
+
+    @app.post(
+        "/dead-letters/requeue",
+        response_model=DeadLetterRequeueResponse,
+        summary="Queue dead-lettered tasks again with a fresh retry budget",
+    )
+    async def requeue_dead_letters(
+        body: DeadLetterRequeueRequest,
+        service: ServiceState = Depends(get_state),
+    ) -> DeadLetterRequeueResponse:
+        assert service.retries and service.repo
+        requeued = await service.retries.requeue_dead_letters(
+            service.queue, service.repo, task_ids=body.task_ids, limit=body.limit
+        )
+        return DeadLetterRequeueResponse(requeued=requeued, queue_depth=await service.queue.depth())
+
+    @app.get("/result/{task_id}", summary="Download the full OCR result")
+    async def get_result(
+        task_id: str,
+        request: Request,
+        service: ServiceState = Depends(get_state),
+    ) -> Response:
+        index = await service.results.load_index(task_id)
+        if index is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Result not found")
+        etag = f'"{index.etag}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=result_headers(etag))
+        body = await service.results.read_document(index)
+        return Response(body, media_type="application/json", headers=result_headers(etag))
+
+    @app.get("/result/{task_id}/pages/{number}", summary="Download one page of the OCR result")
+    async def get_result_page(
+        task_id: str,
+        number: int,
+        request: Request,
+        service: ServiceState = Depends(get_state),
+    ) -> Response:
+        index = await service.results.load_index(task_id)
+        if index is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Result not found")
+        if not 1 <= number <= index.page_count:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Page not found")
+        etag = f'"{index.pages[number - 1].sha256}"'
+        headers = result_headers(etag)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        frame = await service.results.read_page_frame(index, number)
+        if accepts_zstd(request.headers.get("accept-encoding")):
+            # The stored frame is already the zstd-encoded page; pass it through.
+            return Response(frame, media_type="application/json", headers={**headers, "Content-Encoding": "zstd"})
+        return Response(decode_page(frame), media_type="application/json", headers=headers)
+
+    @app.get(
+        "/events/{scope}/{value}",
+        response_class=StreamingResponse,
+        summary="Stream task status changes as Server-Sent Events",
+    )
+    async def stream_events(
+        scope: EventScope,
+        value: str,
+        request: Request,
+        service: ServiceState = Depends(get_state),
+    ) -> StreamingResponse:
+        assert service.repo and service.events
+        if scope == "task" and not await service.repo.exists(value):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+        events = service.events
+        repo = service.repo
+        keepalive = service.settings.events_keepalive_seconds
+
+        async def stream() -> AsyncIterator[str]:
+            async with events.subscribe(scope, value) as inbox:
+                if scope == "task":
+                    # Snapshot after subscribing so a transition in between is not lost.
+                    snapshot = await repo.get_event(value)
+                    if snapshot is None:
+                        return
+                    yield format_sse(snapshot)
+                    if snapshot.status in TERMINAL_STATUSES:
+                        return
+                while True:
+                    try:
+                        event = await asyncio.wait_for(inbox.get(), timeout=keepalive)
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        yield ": keepalive\n\n"
+                        continue
+                    yield format_sse(event)
+                    if scope == "task" and event.status in TERMINAL_STATUSES:
+                        return
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(service: ServiceState = Depends(get_state)) -> Response:
+        # Queue gauges are sampled at scrape time so the upload path pays nothing for them.
+        depth, oldest_ms = await asyncio.gather(service.queue.depth(), service.queue.oldest_enqueued_ms())
+        QUEUE_DEPTH.set(depth)
+        QUEUE_OLDEST_AGE_SECONDS.set(max(0.0, time.time() - oldest_ms / 1000) if oldest_ms else 0.0)
+        body, content_type = render_latest()
+        return Response(content=body, media_type=content_type)
 
     @app.get("/healthz", response_model=HealthResponse)
     async def health(service: ServiceState = Depends(get_state)) -> HealthResponse:
         await service.queue.health()
-        return HealthResponse(status="ok", queue_depth=await service.queue.depth())
+        return HealthResponse(
+            status="ok",
+            queue_depth=await service.queue.depth(),
+            queue_depth_by_priority=await service.queue.depth_by_priority(),
+            queue_depth_by_tier=await service.queue.depth_by_tier(),
+        )
 
     @app.get("/readyz", response_model=ReadyResponse)
     async def ready(service: ServiceState = Depends(get_state)) -> ReadyResponse:
@@ -195,11 +705,299 @@ def create_app(
         except Exception as exc:  # pragma: no cover - defensive logging
             LOGGER.exception("Storage health failed: %s", exc)
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Storage unavailable") from exc
-        return ReadyResponse(status="ready", queue_depth=await service.queue.depth(), storage_writable=True)
+        return ReadyResponse(
+            status="ready",
+            queue_depth=await service.queue.depth(),
+            storage_writable=True,
+            storage_stats=service.storage.stats(),
+        )
 
     return app
 
 
+async def enqueue_upload(
+    service: ServiceState,
+    request: Request,
+    *,
+    task_id: str,
+    filename: str,
+    content_type: str,
+    artifact: StorageArtifact,
+    priority: int,
+    submitted_at: datetime,
+    submitter: str | None = None,
+    batch_id: str | None = None,
+    preflight: PdfPreflight | None = None,
+) -> UploadResponse:
+    """Record and queue a PDF that is already in storage.
+
+    ``submitter`` and ``batch_id`` default to the request's X-Submitter/X-SME-ID and
+    X-Batch-ID headers. ``preflight`` findings are copied onto the record and the task.
+    Documents with more than ``shard_pages`` pages are fanned out into page-range
+    shards; the parent record is stored but not queued and completes with the last shard.
+    """
+    assert service.repo
+    submitter = submitter or request.headers.get("X-Submitter") or request.headers.get("X-SME-ID")
+    batch_id = batch_id or request.headers.get("X-Batch-ID")
+    hints = preflight.model_dump() if preflight else {}
+
+    task_record = TaskRecord(
+        task_id=task_id,
+        filename=filename,
+        status=TaskStatus.queued,
+        content_type=content_type,
+        size_bytes=artifact.size_bytes,
+        sha256=artifact.sha256,
+        storage_uri=artifact.uri,
+        storage_path=artifact.path,
+        queue_name=service.settings.queue_name,
+        submitted_at=submitted_at,
+        updated_at=datetime.now(timezone.utc),
+        priority=priority,
+        submitted_by=submitter,
+        batch_id=batch_id,
+        **hints,
+    )
+
+    payload = QueueTask(
+        task_id=task_id,
+        filename=filename,
+        content_type=content_type,
+        size_bytes=artifact.size_bytes,
+        sha256=artifact.sha256,
+        storage_uri=artifact.uri,
+        storage_path=artifact.path,
+        submitted_at=submitted_at,
+        priority=priority,
+        submitted_by=submitter,
+        batch_id=batch_id,
+        **hints,
+    )
+    ranges = plan_shards(payload.page_count, service.settings.shard_pages)
+    tier: str | None = None
+    with timed(UPLOAD_PHASE_SECONDS, phase="redis"):
+        if len(ranges) > 1:
+            parent, shards = split_task(payload, task_record, ranges)
+            # The parent must exist before any shard can complete and count against it.
+            await service.repo.save(parent)
+            *queued, _ = await asyncio.gather(
+                *(
+                    service.queue.enqueue_with_depths(shard, record=record, repo=service.repo)
+                    for shard, record in shards
+                ),
+                commit_digest(service, artifact.sha256, task_id),
+            )
+            depth, by_tier = max(queued, key=lambda result: result[0])
+            LOGGER.info("Split task %s into %d shards of %d pages", task_id, len(ranges), service.settings.shard_pages)
+        else:
+            tier = service.queue.route(payload)
+            (depth, by_tier), _ = await asyncio.gather(
+                service.queue.enqueue_with_depths(payload, record=task_record, repo=service.repo),
+                commit_digest(service, artifact.sha256, task_id),
+            )
+    INGESTED_BYTES.inc(artifact.size_bytes)
+
+    return UploadResponse(
+        task_id=task_id,
+        status=TaskStatus.queued,
+        received_bytes=artifact.size_bytes,
+        sha256=artifact.sha256,
+        storage_uri=artifact.uri,
+        queue_depth=depth,
+        status_url=str(request.url_for("get_status", task_id=task_id)),
+        priority=priority,
+        tier=tier,
+        queue_depth_by_tier=by_tier,
+    )
+
+
+async def finish_resumable_upload(
+    service: ServiceState, request: Request, task_id: str, session: ResumableUpload, digest: str
+) -> Response:
+    """Publish a fully received resumable upload and queue it, or attach it to its duplicate.
+
+    Uses the hash built while the chunks streamed in rather than reading the file back.
+    The caller holds the upload's lock; the session is consumed once the object is
+    published, so a failed assembly can be retried but a finished one is never queued twice.
+    """
+    assert service.uploads
+    with timed(UPLOAD_PHASE_SECONDS, phase="storage"):
+        info = await service.storage.finish_resumable(
+            session.storage_key, session.upload_id, size_bytes=session.size_bytes
+        )
+    if not await service.uploads.consume(task_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+    headers = upload_offset_headers(session.size_bytes)
+    if service.settings.dedup_enabled:
+        try:
+            duplicate = await find_duplicate(service, digest, task_id)
+        except HTTPException:
+            await service.storage.delete(session.storage_key)
+            raise
+        if duplicate:
+            if duplicate.task_id != task_id:
+                # The object was published before its digest was known; nothing will read it.
+                await service.storage.delete(session.storage_key)
+            LOGGER.info("Duplicate resumable upload sha256=%s attached to task %s", digest, duplicate.task_id)
+            result = await deduplicated_response(service, request, duplicate)
+            return JSONResponse(result.model_dump(mode="json"), headers=headers)
+    preflight = await run_preflight(
+        service,
+        lambda: preflight_stored(service.storage, session.storage_key, size_bytes=session.size_bytes),
+        task_id=task_id,
+        storage_key=session.storage_key,
+        digest=digest,
+    )
+    result = await enqueue_upload(
+        service,
+        request,
+        task_id=task_id,
+        filename=session.filename,
+        content_type=session.content_type,
+        artifact=StorageArtifact(uri=info.uri, path=info.path, size_bytes=info.size_bytes, sha256=digest),
+        priority=session.priority,
+        submitted_at=session.created_at,
+        submitter=session.submitted_by,
+        batch_id=session.batch_id,
+        preflight=preflight,
+    )
+    return JSONResponse(result.model_dump(mode="json"), status_code=status.HTTP_202_ACCEPTED, headers=headers)
+
+
+async def run_preflight(
+    service: ServiceState,
+    inspect: Callable[[], Awaitable[PdfPreflight]],
+    *,
+    task_id: str,
+    storage_key: str,
+    digest: str | None,
+) -> PdfPreflight | None:
+    """Run a preflight; it only adds scheduling hints, so failures never fail the upload.
+
+    The exception is a file that trips a preflight limit: its stored object and digest
+    claim are dropped and the upload is refused with 422.
+    """
+    if not service.settings.preflight_enabled:
+        return None
+    try:
+        with timed(UPLOAD_PHASE_SECONDS, phase="preflight"):
+            return await inspect()
+    except PdfLimitError as exc:
+        assert service.repo
+        await service.storage.delete(storage_key)
+        if digest:
+            await service.repo.release_digest(digest, task_id)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"PDF rejected by preflight: {exc}"
+        ) from exc
+    except Exception:
+        LOGGER.warning("Preflight failed for task %s", task_id, exc_info=True)
+        return None
+
+
+async def deduplicated_response(service: ServiceState, request: Request, duplicate: TaskRecord) -> UploadResponse:
+    depth, by_tier = await asyncio.gather(service.queue.depth(), service.queue.depth_by_tier())
+    return UploadResponse(
+        task_id=duplicate.task_id,
+        status=duplicate.status,
+        received_bytes=duplicate.size_bytes,
+        sha256=duplicate.sha256,
+        storage_uri=duplicate.storage_uri,
+        queue_depth=depth,
+        status_url=str(request.url_for("get_status", task_id=duplicate.task_id)),
+        priority=duplicate.priority,
+        deduplicated=True,
+        tier=duplicate.tier,
+        queue_depth_by_tier=by_tier,
+    )
+
+
+async def read_chunk(request: Request, *, limit: int) -> bytes:
+    """Read the request body, refusing more than ``limit`` bytes."""
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Chunk may be at most {limit} bytes",
+        )
+    buffer = bytearray()
+    async for piece in request.stream():
+        buffer += piece
+        if len(buffer) > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Chunk may be at most {limit} bytes",
+            )
+    return bytes(buffer)
+
+
+def upload_offset_headers(offset: int) -> dict[str, str]:
+    return {"Upload-Offset": str(offset), "Cache-Control": "no-store"}
+
+
+async def find_duplicate(
+    service: ServiceState, digest: str, task_id: str, *, pending_ttl_seconds: int | None = None
+) -> TaskRecord | None:
+    """Return the live task that already owns ``digest`` or claim the digest for ``task_id``.
+
+    An identical upload that is still being written (its claim is in flight and has no
+    record yet) is refused with 409. Tasks that ended without a result (failed or
+    cancelled) and committed claims whose record has expired are taken over so the
+    document gets processed again; an in-flight claim
+    whose upload died is taken over once it expires after ``pending_ttl_seconds``.
+    """
+    assert service.repo
+    pending_ttl_seconds = pending_ttl_seconds or service.settings.dedup_pending_ttl_seconds
+    claim = await service.repo.claim_digest(digest, task_id, pending_ttl_seconds=pending_ttl_seconds)
+    if claim is None:
+        return None
+    owner, in_flight = claim
+    if owner == task_id and in_flight:
+        # Our own claim from an earlier attempt at this same upload.
+        return None
+    record = await service.repo.get(owner)
+    if record is None and in_flight:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"An identical upload is still in progress as task {owner}",
+        )
+    if record and record.status not in TERMINAL_STATUSES - {TaskStatus.completed}:
+        return record
+    await service.repo.claim_digest(digest, task_id, pending_ttl_seconds=pending_ttl_seconds, force=True)
+    return None
+
+
+async def commit_digest(service: ServiceState, digest: str | None, task_id: str) -> None:
+    """Make the in-flight digest claim of a task that is now recorded permanent."""
+    assert service.repo
+    if service.settings.dedup_enabled and digest:
+        await service.repo.commit_digest(digest, task_id)
+
+
+def result_headers(etag: str) -> dict[str, str]:
+    # Results can be rewritten when a task is retried, so clients revalidate with the ETag.
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def accepts_zstd(accept_encoding: str | None) -> bool:
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "zstd":
+            return params.replace(" ", "").lower() not in {"q=0", "q=0.0", "q=0.00", "q=0.000"}
+    return False
+
+
+def format_sse(event: TaskEvent) -> str:
+    return f"event: status\nid: {event.task_id}:{event.updated_at.timestamp()}\ndata: {event.model_dump_json()}\n\n"
+
+
 def is_allowed(filename: str, settings: Settings) -> bool:
     suffix = Path(filename).suffix.lower().lstrip(".")
     return suffix in settings.allowed_extensions
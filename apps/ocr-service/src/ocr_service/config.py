@@ -14,8 +14,39 @@ class Settings(BaseSettings):
 
     redis_url: str = Field(default="redis://localhost:6379/0")
     queue_name: str = Field(default="ocr:tasks")
+    queue_backend: Literal["sorted_set", "stream"] = Field(default="sorted_set")
+    stream_group: str = Field(default="ocr-workers")
+    stream_retention_seconds: int = Field(default=7 * 24 * 60 * 60, ge=60)
+    # Size tiers of the sorted_set backend: routed by preflight page count, or by
+    # size when the count is unknown; workers claim across tiers by weight.
+    queue_tier_small_max_pages: int = Field(default=20, ge=1)
+    queue_tier_medium_max_pages: int = Field(default=200, ge=1)
+    queue_tier_small_max_mb: int = Field(default=2, ge=1)
+    queue_tier_medium_max_mb: int = Field(default=20, ge=1)
+    queue_tier_weights: dict[str, int] = Field(default_factory=lambda: {"small": 6, "medium": 3, "large": 1})
+    # Fair share between submitters inside each tier (sorted_set backend): a submitter
+    # of weight w gets w turns for every one of a weight-1 submitter while both wait.
+    queue_fair_share_enabled: bool = Field(default=True)
+    queue_fair_share_default_weight: int = Field(default=1, ge=1, le=1000)
+    queue_fair_share_weights: dict[str, int] = Field(default_factory=dict)
     task_status_prefix: str = Field(default="ocr:task:")
+    # Per-task keys other than the record live under their own prefixes, so no task
+    # id (which clients put in URLs) can name one of them as a record.
+    task_history_prefix: str = Field(default="ocr:task-history:")
+    task_shards_prefix: str = Field(default="ocr:task-shards:")
+    task_index_prefix: str = Field(default="ocr:task-index:")
+    pending_upload_prefix: str = Field(default="ocr:pending-upload:")
     task_ttl_seconds: int = Field(default=7 * 24 * 60 * 60)
+    task_lease_seconds: int = Field(default=300, ge=1)
+    # Failed tasks are retried after exponential backoff with jitter, then dead-lettered.
+    task_max_retries: int = Field(default=3, ge=0)
+    task_retry_base_seconds: float = Field(default=10.0, gt=0)
+    task_retry_max_seconds: float = Field(default=600.0, gt=0)
+    task_dead_letter_size: int = Field(default=10_000, ge=1)
+    dedup_enabled: bool = Field(default=True)
+    dedup_index_prefix: str = Field(default="ocr:sha256:")
+    # How long a digest claim whose upload is not recorded yet holds off identical uploads.
+    dedup_pending_ttl_seconds: int = Field(default=900, ge=1)
 
     storage_mode: Literal["local", "s3"] = Field(default="local")
     storage_root: Path = Field(default=Path("/data/ocr-inbox"))
@@ -25,12 +56,45 @@ class Settings(BaseSettings):
     s3_bucket: str | None = None
     s3_region: str | None = None
     s3_endpoint_url: str | None = None
+    s3_part_size_mb: int = Field(default=8, ge=5, le=512)
+    s3_upload_concurrency: int = Field(default=4, ge=1, le=32)
+    s3_max_pool_connections: int = Field(default=16, ge=1, le=256)
+    presign_expires_seconds: int = Field(default=900, ge=60, le=7 * 24 * 60 * 60)
+    resumable_chunk_size_mb: int = Field(default=8, ge=1, le=256)
+    resumable_max_chunk_size_mb: int = Field(default=64, ge=5, le=512)
+    resumable_session_ttl_seconds: int = Field(default=24 * 60 * 60, ge=60)
+    resumable_prefix: str = Field(default="ocr:resumable:")
 
     max_pdf_size_mb: int = Field(default=80, ge=1, le=512)
     allowed_extensions: set[str] = Field(default_factory=lambda: {"pdf"})
+    preflight_enabled: bool = Field(default=True)
+    # Documents with more pages than this are split into page-range shards; 0 disables.
+    shard_pages: int = Field(default=0, ge=0)
+
+    result_prefix: str = Field(default="results")
+    result_compression_level: int = Field(default=3, ge=1, le=22)
+
+    worker_concurrency: int = Field(default=1, ge=1, le=64)
+    worker_prefetch: int = Field(default=1, ge=0, le=16)
+    # Required for ocr-worker: the service image ships no extraction engine of its own.
+    worker_engine: str | None = Field(default=None)
+    worker_scratch_dir: Path = Field(default=Path("/tmp/ocr-worker"))
+    worker_reap_interval_seconds: float = Field(default=30.0, gt=0)
+    worker_poll_interval_seconds: float = Field(default=1.0, gt=0)
+
+    # Admission control for uploads; 0 disables a limit.
+    admission_max_queue_depth: int = Field(default=0, ge=0)
+    admission_max_submitter_depth: int = Field(default=0, ge=0)
+    admission_max_inflight_bytes: int = Field(default=0, ge=0)
+    admission_drain_tasks_per_second: float = Field(default=0.5, gt=0)
+    admission_ingest_bytes_per_second: float = Field(default=64 * 1024 * 1024, gt=0)
+    admission_max_retry_after_seconds: int = Field(default=900, ge=1)
 
     request_timeout_seconds: int = Field(default=30)
     status_history_size: int = Field(default=100)
+    status_batch_max_ids: int = Field(default=500, ge=1, le=5000)
+    events_channel_prefix: str = Field(default="ocr:events:")
+    events_keepalive_seconds: float = Field(default=15.0, gt=0)
 
     model_config = SettingsConfigDict(env_prefix="OCR_SERVICE_", extra="ignore")
 
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Literal
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+from .models import TaskEvent
+
+LOGGER = logging.getLogger(__name__)
+
+EventScope = Literal["task", "submitter", "batch"]
+
+
+def event_channel(prefix: str, scope: EventScope, value: str) -> str:
+    return f"{prefix}{scope}:{value}"
+
+
+class EventBroker:
+    """Fans task events from one Redis pattern subscription out to local listeners.
+
+    Each pod holds a single pub/sub connection no matter how many SSE clients are
+    attached; the subscription is opened with the first listener.
+    """
+
+    def __init__(self, redis: Redis, *, channel_prefix: str, listener_queue_size: int = 256) -> None:
+        self.redis = redis
+        self.channel_prefix = channel_prefix
+        self.listener_queue_size = listener_queue_size
+        self._listeners: dict[str, set[asyncio.Queue[TaskEvent]]] = defaultdict(set)
+        self._pubsub: PubSub | None = None
+        self._reader: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_started(self) -> None:
+        async with self._lock:
+            if self._reader is not None:
+                return
+            self._pubsub = self.redis.pubsub()
+            await self._pubsub.psubscribe(f"{self.channel_prefix}*")
+            self._reader = asyncio.create_task(self._run(), name="ocr-event-broker")
+            LOGGER.info("Subscribed to task events pattern=%s*", self.channel_prefix)
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    @asynccontextmanager
+    async def subscribe(self, scope: EventScope, value: str) -> AsyncIterator[asyncio.Queue[TaskEvent]]:
+        await self._ensure_started()
+        channel = event_channel(self.channel_prefix, scope, value)
+        inbox: asyncio.Queue[TaskEvent] = asyncio.Queue(maxsize=self.listener_queue_size)
+        self._listeners[channel].add(inbox)
+        try:
+            yield inbox
+        finally:
+            listeners = self._listeners.get(channel)
+            if listeners is not None:
+                listeners.discard(inbox)
+                if not listeners:
+                    del self._listeners[channel]
+
+    async def _run(self) -> None:
+        assert self._pubsub is not None
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pragma: no cover - connection hiccup, keep the broker alive
+                LOGGER.exception("Task event subscription failed; retrying")
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "pmessage":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            listeners = self._listeners.get(channel)
+            if not listeners:
+                continue
+            event = TaskEvent.model_validate_json(message["data"])
+            for inbox in list(listeners):
+                try:
+                    inbox.put_nowait(event)
+                except asyncio.QueueFull:
+                    LOGGER.warning("Dropping task event for slow listener channel=%s", channel)
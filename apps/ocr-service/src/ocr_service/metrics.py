@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from redis.asyncio import Redis
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+UPLOAD_PHASE_SECONDS = Histogram(
+    "ocr_upload_phase_seconds",
+    "Time spent in each phase of POST /upload",
+    ["phase"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+INGESTED_BYTES = Counter("ocr_ingested_bytes_total", "PDF bytes accepted into storage")
+STORAGE_CALL_SECONDS = Histogram(
+    "ocr_storage_call_seconds",
+    "Latency of storage backend calls",
+    ["backend", "operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+S3_POOL_WAIT_SECONDS = Histogram(
+    "ocr_s3_pool_wait_seconds",
+    "Time S3 calls waited for a thread in the S3 pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+S3_INFLIGHT_CALLS = Gauge("ocr_s3_inflight_calls", "S3 calls submitted to the S3 pool and not yet finished")
+REDIS_ROUNDTRIPS = Histogram(
+    "ocr_redis_roundtrips_per_request",
+    "Redis round trips made while serving one HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21),
+)
+QUEUE_DEPTH = Gauge("ocr_queue_depth", "Tasks waiting in the ready queue")
+QUEUE_OLDEST_AGE_SECONDS = Gauge("ocr_queue_oldest_task_age_seconds", "Age of the oldest waiting task")
+
+
+@dataclass
+class RequestMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    redis_roundtrips: int = 0
+
+
+_current_request: ContextVar[RequestMetrics | None] = ContextVar("ocr_request_metrics", default=None)
+
+
+def current_request() -> RequestMetrics | None:
+    return _current_request.get()
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+
+class _RoundTripCounting:
+    """Connection mixin that counts each packet sent to Redis against the current request.
+
+    A pipeline or script is one send, so this counts round trips rather than commands.
+    """
+
+    async def send_packed_command(self, command, check_health: bool = True) -> None:
+        request = _current_request.get()
+        if request is not None:
+            request.redis_roundtrips += 1
+        await super().send_packed_command(command, check_health)  # type: ignore[misc]
+
+
+def instrument_redis(client: Redis) -> None:
+    """Swap the pool's connection class for a counting subclass (before it connects)."""
+    pool = client.connection_pool
+    connection_class = pool.connection_class
+    if issubclass(connection_class, _RoundTripCounting):
+        return
+    pool.connection_class = type(
+        f"RoundTripCounting{connection_class.__name__}", (_RoundTripCounting, connection_class), {}
+    )
+
+
+class MetricsMiddleware:
+    """Tracks per-request Redis round trips; everything else is observed at call sites."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = RequestMetrics()
+        token = _current_request.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_request.reset(token)
+            route = scope.get("route")
+            REDIS_ROUNDTRIPS.labels(route=getattr(route, "path", "unmatched")).observe(request.redis_roundtrips)
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
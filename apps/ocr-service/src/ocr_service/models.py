@@ -13,6 +13,10 @@ class TaskStatus(str, Enum):
     processing = "processing"
     completed = "completed"
     failed = "failed"
+    cancelled = "cancelled"
+
+
+TERMINAL_STATUSES = frozenset({TaskStatus.completed, TaskStatus.failed, TaskStatus.cancelled})
 
 
 class StorageArtifact(BaseModel):
@@ -22,6 +26,16 @@ class StorageArtifact(BaseModel):
     sha256: str
 
 
+class PdfPreflight(BaseModel):
+    """What a cheap structural read of a PDF revealed; ``None`` means undetermined."""
+
+    page_count: int | None = None
+    has_text_layer: bool | None = None
+    encrypted: bool | None = None
+    linearized: bool | None = None
+    pdf_version: str | None = None
+
+
 class QueueTask(BaseModel):
     task_id: str
     filename: str
@@ -33,6 +47,18 @@ class QueueTask(BaseModel):
     submitted_at: datetime
     priority: int = Field(default=5, ge=0, le=9)
     submitted_by: str | None = None
+    batch_id: str | None = None
+    page_count: int | None = None
+    has_text_layer: bool | None = None
+    encrypted: bool | None = None
+    linearized: bool | None = None
+    pdf_version: str | None = None
+    parent_id: str | None = None
+    shard_index: int | None = None
+    shard_count: int | None = None
+    first_page: int | None = None
+    last_page: int | None = None
+    tier: str | None = None
 
 
 class TaskRecord(BaseModel):
@@ -49,8 +75,82 @@ class TaskRecord(BaseModel):
     updated_at: datetime
     priority: int = Field(default=5, ge=0, le=9)
     submitted_by: str | None = None
+    batch_id: str | None = None
     error_message: str | None = None
     retry_count: int = 0
+    retry_at: datetime | None = None
+    result_uri: str | None = None
+    page_count: int | None = None
+    has_text_layer: bool | None = None
+    encrypted: bool | None = None
+    linearized: bool | None = None
+    pdf_version: str | None = None
+    parent_id: str | None = None
+    shard_index: int | None = None
+    shard_count: int | None = None
+    first_page: int | None = None
+    last_page: int | None = None
+    shards_completed: int | None = None
+    tier: str | None = None
+
+
+class TaskEvent(BaseModel):
+    task_id: str
+    status: TaskStatus
+    updated_at: datetime
+    submitted_by: str | None = None
+    batch_id: str | None = None
+    error_message: str | None = None
+    retry_count: int = 0
+    result_uri: str | None = None
+
+    @classmethod
+    def from_record(cls, record: TaskRecord) -> "TaskEvent":
+        return cls.model_validate(record.model_dump(include=set(cls.model_fields)))
+
+
+class ResultPage(BaseModel):
+    number: int
+    offset: int
+    length: int
+    size_bytes: int
+    sha256: str
+
+
+class ResultIndex(BaseModel):
+    """Where each page of a stored result lives inside its compressed pages object."""
+
+    task_id: str
+    etag: str
+    page_count: int
+    compressed_bytes: int
+    size_bytes: int
+    metadata: dict[str, Any] = Field(default_factory=dict)
+    pages: list[ResultPage] = Field(default_factory=list)
+
+
+class DeadLetter(BaseModel):
+    """A task that failed on every attempt, as kept on the dead-letter list."""
+
+    task: QueueTask
+    error: str
+    retry_count: int
+    failed_at: datetime
+
+
+class DeadLetterPage(BaseModel):
+    total: int
+    items: list[DeadLetter]
+
+
+class DeadLetterRequeueRequest(BaseModel):
+    task_ids: list[str] | None = Field(default=None, min_length=1)
+    limit: int = Field(default=100, ge=1, le=1000)
+
+
+class DeadLetterRequeueResponse(BaseModel):
+    requeued: list[str]
+    queue_depth: int
 
 
 class UploadResponse(BaseModel):
@@ -61,19 +161,117 @@ class UploadResponse(BaseModel):
     storage_uri: str
     queue_depth: int
     status_url: str
+    priority: int = 5
+    deduplicated: bool = False
+    tier: str | None = None
+    queue_depth_by_tier: dict[str, int] = Field(default_factory=dict)
+
+
+class StatusTransition(BaseModel):
+    status: TaskStatus
+    at: datetime
+    worker_id: str | None = None
 
 
 class StatusResponse(BaseModel):
     task: TaskRecord
     queue_depth: int
+    queue_depth_by_tier: dict[str, int] = Field(default_factory=dict)
+    history: list[StatusTransition] = Field(default_factory=list)
+
+
+class PresignRequest(BaseModel):
+    filename: str = Field(min_length=1)
+    size_bytes: int = Field(gt=0)
+    sha256: str = Field(pattern=r"^[0-9a-fA-F]{64}$")
+    content_type: str = "application/pdf"
+    priority: int = Field(default=5, ge=0, le=9)
+
+
+class PresignResponse(BaseModel):
+    task_id: str
+    status_url: str
+    complete_url: str | None = None
+    upload_url: str | None = None
+    upload_method: Literal["PUT"] = "PUT"
+    upload_headers: dict[str, str] = Field(default_factory=dict)
+    expires_at: datetime | None = None
+    deduplicated: bool = False
+
+
+class PendingUpload(BaseModel):
+    """A presigned upload waiting for ``POST /uploads/{task_id}/complete``."""
+
+    task_id: str
+    filename: str
+    content_type: str
+    size_bytes: int
+    sha256: str
+    storage_key: str
+    priority: int = 5
+    submitted_by: str | None = None
+    batch_id: str | None = None
+    created_at: datetime
+
+
+class ResumableUploadRequest(BaseModel):
+    filename: str = Field(min_length=1)
+    size_bytes: int = Field(gt=0)
+    content_type: str = "application/pdf"
+    priority: int = Field(default=5, ge=0, le=9)
+
+
+class ResumableUpload(BaseModel):
+    """Server-side state of a resumable upload between PATCH requests."""
+
+    task_id: str
+    filename: str
+    content_type: str
+    size_bytes: int
+    storage_key: str
+    upload_id: str | None = None
+    offset: int = 0
+    parts: int = 0
+    priority: int = 5
+    submitted_by: str | None = None
+    batch_id: str | None = None
+    created_at: datetime
+
+
+class ResumableUploadResponse(BaseModel):
+    task_id: str
+    upload_url: str
+    offset: int
+    size_bytes: int
+    chunk_size: int
+    min_chunk_size: int
+    max_chunk_size: int
+
+
+class BatchStatusRequest(BaseModel):
+    task_ids: list[str] = Field(min_length=1)
+
+
+class BatchStatusResponse(BaseModel):
+    tasks: list[TaskRecord]
+    missing: list[str]
+    queue_depth: int
+
+
+class TaskListResponse(BaseModel):
+    tasks: list[TaskRecord]
+    next_cursor: str | None = None
 
 
 class HealthResponse(BaseModel):
     status: Literal["ok"]
     queue_depth: int
+    queue_depth_by_priority: dict[int, int] = Field(default_factory=dict)
+    queue_depth_by_tier: dict[str, int] = Field(default_factory=dict)
 
 
 class ReadyResponse(BaseModel):
     status: Literal["ready"]
     queue_depth: int
     storage_writable: bool
+    storage_stats: dict[str, float] = Field(default_factory=dict)
@@ -0,0 +1,623 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import zlib
+from typing import Any, BinaryIO, Callable, NamedTuple, TypeVar
+
+from fastapi import UploadFile
+
+from .models import PdfPreflight
+from .storage import StorageBackend
+
+LOGGER = logging.getLogger(__name__)
+
+# (offset, length) -> bytes. Returns fewer bytes at the end of the file.
+RangeReader = Callable[[int, int], bytes]
+
+HEAD_BYTES = 1024
+TAIL_BYTES = 4096
+OBJECT_READ_BYTES = 4096
+MAX_OBJECT_BYTES = 1024 * 1024
+MAX_XREF_BYTES = 16 * 1024 * 1024
+MAX_STREAM_BYTES = 16 * 1024 * 1024
+MAX_XREF_SECTIONS = 64
+MAX_REF_DEPTH = 32
+MAX_TREE_DEPTH = 32
+SAMPLE_PAGES = 3
+SCAN_CHUNK_BYTES = 1024 * 1024
+SCAN_OVERLAP_BYTES = 64
+
+_WHITESPACE = frozenset(b"\x00\t\n\x0c\r ")
+_DELIMITERS = frozenset(b"()<>[]{}/%")
+_NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_NUMBER = re.compile(rb"[+-]?(\d+\.?\d*|\.\d+)")
+_VERSION = re.compile(rb"%PDF-(\d\.\d)")
+_PAGE_PATTERN = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+_FONT_PATTERN = re.compile(rb"/Font(?![A-Za-z])")
+_ENCRYPT_PATTERN = re.compile(rb"/Encrypt(?![A-Za-z])")
+
+T = TypeVar("T")
+
+
+class PdfSyntaxError(ValueError):
+    """The part of the file preflight needs could not be parsed."""
+
+
+class PdfLimitError(PdfSyntaxError):
+    """A stream is longer than the file or inflates past ``MAX_STREAM_BYTES``; the upload is refused."""
+
+
+class _Truncated(PdfSyntaxError):
+    """The read window ended mid-object; a larger read may succeed."""
+
+
+class Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+class Name(str):
+    """A PDF name, stored without its leading slash."""
+
+
+class Keyword(str):
+    """A bare token such as ``obj``, ``stream`` or ``trailer``."""
+
+
+class _Lexer:
+    """Parses PDF objects out of an in-memory window of the file.
+
+    ``complete`` says the window reaches the end of the data; otherwise running off
+    its end raises ``_Truncated`` so the caller can read more. String contents are
+    returned raw because preflight never needs them.
+    """
+
+    def __init__(self, data: bytes, pos: int = 0, *, complete: bool = True) -> None:
+        self.data = data
+        self.pos = pos
+        self.complete = complete
+
+    def skip_space(self) -> None:
+        data, pos = self.data, self.pos
+        while pos < len(data):
+            char = data[pos]
+            if char in _WHITESPACE:
+                pos += 1
+            elif char == 0x25:  # % comment
+                while pos < len(data) and data[pos] not in b"\r\n":
+                    pos += 1
+            else:
+                break
+        self.pos = pos
+
+    def _token(self) -> bytes:
+        data, start = self.data, self.pos
+        pos = start
+        while pos < len(data) and data[pos] not in _WHITESPACE and data[pos] not in _DELIMITERS:
+            pos += 1
+        if pos == len(data) and not self.complete:
+            raise _Truncated("Token runs past the read window")
+        self.pos = pos
+        return data[start:pos]
+
+    def value(self) -> Any:
+        self.skip_space()
+        data = self.data
+        if self.pos >= len(data):
+            raise _Truncated("Expected a value")
+        char = data[self.pos]
+        if char == 0x2F:  # /
+            self.pos += 1
+            return Name(_NAME_ESCAPE.sub(lambda m: bytes.fromhex(m.group(1).decode()), self._token()).decode("latin-1"))
+        if data.startswith(b"<<", self.pos):
+            return self._dictionary()
+        if char == 0x3C:  # <
+            end = data.find(b">", self.pos)
+            if end < 0:
+                raise _Truncated("Unterminated hex string")
+            raw = data[self.pos + 1 : end]
+            self.pos = end + 1
+            return raw
+        if char == 0x5B:  # [
+            return self._array()
+        if char == 0x28:  # (
+            return self._literal_string()
+        if char in _DELIMITERS:
+            raise PdfSyntaxError(f"Unexpected {chr(char)!r} at {self.pos}")
+        token = self._token()
+        if token.isdigit():
+            return self._maybe_ref(int(token))
+        if _NUMBER.fullmatch(token):
+            return float(token)
+        if token == b"true":
+            return True
+        if token == b"false":
+            return False
+        if token == b"null":
+            return None
+        return Keyword(token.decode("latin-1"))
+
+    def _maybe_ref(self, number: int) -> int | Ref:
+        start = self.pos
+        try:
+            self.skip_space()
+            generation = self._token()
+            self.skip_space()
+            data, pos = self.data, self.pos
+            if generation.isdigit() and pos < len(data) and data[pos] == 0x52:  # R
+                if pos + 1 == len(data) and not self.complete:
+                    raise _Truncated("Reference runs past the read window")
+                if pos + 1 == len(data) or data[pos + 1] in _WHITESPACE or data[pos + 1] in _DELIMITERS:
+                    self.pos = pos + 1
+                    return Ref(number, int(generation))
+        except _Truncated:
+            if not self.complete:
+                raise
+        self.pos = start
+        return number
+
+    def _dictionary(self) -> dict[str, Any]:
+        self.pos += 2
+        result: dict[str, Any] = {}
+        while True:
+            self.skip_space()
+            if self.pos >= len(self.data):
+                raise _Truncated("Unterminated dictionary")
+            if self.data.startswith(b">>", self.pos):
+                self.pos += 2
+                return result
+            key = self.value()
+            if not isinstance(key, Name):
+                raise PdfSyntaxError(f"Dictionary key {key!r} is not a name")
+            result[str(key)] = self.value()
+
+    def _array(self) -> list[Any]:
+        self.pos += 1
+        result: list[Any] = []
+        while True:
+            self.skip_space()
+            if self.pos >= len(self.data):
+                raise _Truncated("Unterminated array")
+            if self.data[self.pos] == 0x5D:  # ]
+                self.pos += 1
+                return result
+            result.append(self.value())
+
+    def _literal_string(self) -> bytes:
+        data = self.data
+        start = pos = self.pos + 1
+        depth = 1
+        while pos < len(data):
+            char = data[pos]
+            if char == 0x5C:  # backslash escapes the next byte
+                pos += 2
+                continue
+            if char == 0x28:
+                depth += 1
+            elif char == 0x29:
+                depth -= 1
+                if depth == 0:
+                    self.pos = pos + 1
+                    return data[start:pos]
+            pos += 1
+        raise _Truncated("Unterminated string")
+
+    def keyword(self) -> bytes:
+        self.skip_space()
+        return self._token()
+
+
+class _Document:
+    """Random access to the objects of a PDF through its cross-reference data.
+
+    Only the xref sections, the trailer and the objects actually asked for are read,
+    so preflighting a large scan touches a few kilobytes of it.
+    """
+
+    def __init__(self, read: RangeReader, size: int) -> None:
+        self._read = read
+        self.size = size
+        # object number -> (1, offset, generation) | (2, object stream, index) | (0, 0, 0) when free
+        self.xref: dict[int, tuple[int, int, int]] = {}
+        self.trailer: dict[str, Any] = {}
+        self._objects: dict[int, Any] = {}
+        self._object_streams: dict[int, tuple[bytes, list[int]]] = {}
+        self._load_xref(self._startxref())
+
+    def _startxref(self) -> int:
+        start = max(0, self.size - TAIL_BYTES)
+        tail = self._read(start, self.size - start)
+        marker = tail.rfind(b"startxref")
+        if marker < 0:
+            raise PdfSyntaxError("startxref not found")
+        offset = _Lexer(tail, marker + len(b"startxref")).value()
+        if not isinstance(offset, int) or not 0 <= offset < self.size:
+            raise PdfSyntaxError("Invalid startxref offset")
+        return offset
+
+    def _parse_at(self, offset: int, parse: Callable[[_Lexer], T], *, limit: int = MAX_OBJECT_BYTES) -> T:
+        """Run ``parse`` on a window at ``offset``, growing the window until it fits."""
+        length = OBJECT_READ_BYTES
+        while True:
+            data = self._read(offset, length)
+            complete = offset + len(data) >= self.size
+            try:
+                return parse(_Lexer(data, complete=complete))
+            except _Truncated:
+                if complete or length >= limit:
+                    raise
+                length *= 4
+
+    def _load_xref(self, offset: int) -> None:
+        pending = [offset]
+        seen: set[int] = set()
+        while pending:
+            offset = pending.pop(0)
+            if offset in seen:
+                continue
+            if len(seen) >= MAX_XREF_SECTIONS:
+                raise PdfSyntaxError("Too many cross-reference sections")
+            seen.add(offset)
+            if self._read(offset, 4) == b"xref":
+                trailer = self._parse_at(offset, self._xref_table, limit=MAX_XREF_BYTES)
+            else:
+                trailer = self._xref_stream(offset)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            # Entries of a hybrid file's xref stream override the older sections.
+            if isinstance(trailer.get("XRefStm"), int):
+                pending.insert(0, trailer["XRefStm"])
+            if isinstance(trailer.get("Prev"), int):
+                pending.append(trailer["Prev"])
+
+    def _xref_table(self, lexer: _Lexer) -> dict[str, Any]:
+        if lexer.keyword() != b"xref":
+            raise PdfSyntaxError("Expected xref")
+        entries: dict[int, tuple[int, int, int]] = {}
+        while True:
+            first = lexer.value()
+            if first == "trailer":
+                break
+            count = lexer.value()
+            if not isinstance(first, int) or not isinstance(count, int):
+                raise PdfSyntaxError("Malformed xref subsection")
+            for number in range(first, first + count):
+                offset, generation, kind = lexer.value(), lexer.value(), lexer.value()
+                entries[number] = (1, offset, generation) if kind == "n" else (0, 0, 0)
+        trailer = lexer.value()
+        if not isinstance(trailer, dict):
+            raise PdfSyntaxError("Malformed trailer")
+        for number, entry in entries.items():
+            self.xref.setdefault(number, entry)
+        return trailer
+
+    def _xref_stream(self, offset: int) -> dict[str, Any]:
+        stream, data = self._stream_at(offset)
+        if stream.get("Type") != "XRef":
+            raise PdfSyntaxError("startxref does not point at a cross-reference section")
+        widths = stream["W"]
+        if len(widths) != 3 or sum(widths) == 0:
+            raise PdfSyntaxError("Invalid cross-reference stream widths")
+        index = stream.get("Index") or [0, stream["Size"]]
+        pos = 0
+        for first, count in zip(index[::2], index[1::2]):
+            for number in range(first, first + count):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos : pos + width], "big"))
+                    pos += width
+                if pos > len(data):
+                    raise PdfSyntaxError("Cross-reference stream is short")
+                kind = fields[0] if widths[0] else 1
+                entry = (kind, fields[1], fields[2]) if kind in (1, 2) else (0, 0, 0)
+                self.xref.setdefault(number, entry)
+        return stream
+
+    def _object_at(self, offset: int) -> tuple[Any, int | None]:
+        """Parse ``n g obj`` at ``offset``; returns the value and where its stream data starts."""
+
+        def parse(lexer: _Lexer) -> tuple[Any, int | None]:
+            lexer.value()
+            lexer.value()
+            if lexer.keyword() != b"obj":
+                raise PdfSyntaxError(f"No object at offset {offset}")
+            value = lexer.value()
+            if not isinstance(value, dict) or lexer.keyword() != b"stream":
+                return value, None
+            data, pos = lexer.data, lexer.pos
+            if data.startswith(b"\r\n", pos):
+                pos += 2
+            elif data.startswith(b"\n", pos) or data.startswith(b"\r", pos):
+                pos += 1
+            return value, offset + pos
+
+        return self._parse_at(offset, parse)
+
+    def _stream_at(self, offset: int) -> tuple[dict[str, Any], bytes]:
+        value, start = self._object_at(offset)
+        if start is None:
+            raise PdfSyntaxError(f"Object at offset {offset} is not a stream")
+        length = self.resolve(value.get("Length"))
+        if not isinstance(length, int) or length < 0:
+            raise PdfSyntaxError("Stream has no usable /Length")
+        if length > self.size - start:
+            raise PdfLimitError(f"Stream /Length {length} runs past the end of the file")
+        return value, _decode_stream(value, self._read(start, length))
+
+    def object(self, number: int) -> Any:
+        if number in self._objects:
+            return self._objects[number]
+        kind, first, second = self.xref.get(number, (0, 0, 0))
+        if kind == 1:
+            value, _ = self._object_at(first)
+        elif kind == 2:
+            value = self._compressed_object(first, second)
+        else:
+            value = None
+        self._objects[number] = value
+        return value
+
+    def _compressed_object(self, stream_number: int, index: int) -> Any:
+        if stream_number not in self._object_streams:
+            kind, offset, _ = self.xref.get(stream_number, (0, 0, 0))
+            if kind != 1:
+                raise PdfSyntaxError(f"Object stream {stream_number} not found")
+            stream, data = self._stream_at(offset)
+            lexer = _Lexer(data)
+            header = [lexer.value() for _ in range(2 * stream["N"])]
+            first = stream["First"]
+            self._object_streams[stream_number] = (data, [first + pos for pos in header[1::2]])
+        data, offsets = self._object_streams[stream_number]
+        return _Lexer(data, offsets[index]).value()
+
+    def resolve(self, value: Any) -> Any:
+        for _ in range(MAX_REF_DEPTH):
+            if not isinstance(value, Ref):
+                return value
+            value = self.object(value.num)
+        raise PdfSyntaxError("Reference chain too deep")
+
+    def page_root(self) -> dict[str, Any]:
+        root = self.resolve(self.trailer["Root"])
+        pages = self.resolve(root["Pages"])
+        if not isinstance(pages, dict):
+            raise PdfSyntaxError("Catalog has no page tree")
+        return pages
+
+    def page_resources(self, pages: dict[str, Any], index: int) -> Any:
+        """Resources of page ``index`` (0-based), including ones inherited from the tree."""
+        node = pages
+        resources = node.get("Resources")
+        for _ in range(MAX_TREE_DEPTH):
+            kids = self.resolve(node.get("Kids")) or []
+            count = self.resolve(node.get("Count"))
+            child = None
+            if len(kids) == count:
+                # Flat node: usually every kid is a page, so jump straight to it.
+                candidate = self.resolve(kids[index])
+                if isinstance(candidate, dict) and "Kids" not in candidate:
+                    child, index = candidate, 0
+            if child is None:
+                for kid in kids:
+                    kid = self.resolve(kid)
+                    size = self.resolve(kid.get("Count")) if "Kids" in kid else 1
+                    if index < size:
+                        child = kid
+                        break
+                    index -= size
+            if child is None:
+                raise PdfSyntaxError("Page index outside the page tree")
+            if "Resources" in child:
+                resources = child["Resources"]
+            if "Kids" not in child:
+                return resources
+            node = child
+        raise PdfSyntaxError("Page tree too deep")
+
+    def has_fonts(self, resources: Any, *, depth: int = 0) -> bool:
+        """Whether the resources (or a form XObject they draw) declare any font."""
+        resources = self.resolve(resources)
+        if not isinstance(resources, dict):
+            return False
+        fonts = self.resolve(resources.get("Font"))
+        if isinstance(fonts, dict) and fonts:
+            return True
+        xobjects = self.resolve(resources.get("XObject"))
+        if depth >= 2 or not isinstance(xobjects, dict):
+            return False
+        for xobject in list(xobjects.values())[:8]:
+            xobject = self.resolve(xobject)
+            if (
+                isinstance(xobject, dict)
+                and xobject.get("Subtype") == "Form"
+                and self.has_fonts(xobject.get("Resources"), depth=depth + 1)
+            ):
+                return True
+        return False
+
+
+def _decode_stream(stream: dict[str, Any], data: bytes) -> bytes:
+    filters = stream.get("Filter")
+    params = stream.get("DecodeParms")
+    filters = filters if isinstance(filters, list) else [filters] if filters else []
+    params = params if isinstance(params, list) else [params] * len(filters)
+    for name, parms in zip(filters, params):
+        if name != "FlateDecode":
+            raise PdfSyntaxError(f"Unsupported stream filter {name}")
+        inflater = zlib.decompressobj()
+        try:
+            data = inflater.decompress(data, MAX_STREAM_BYTES)
+        except zlib.error as exc:
+            raise PdfSyntaxError(f"Corrupt Flate stream: {exc}") from exc
+        if inflater.unconsumed_tail:
+            raise PdfLimitError(f"Flate stream inflates past {MAX_STREAM_BYTES} bytes")
+        if isinstance(parms, dict):
+            data = _unpredict(data, parms)
+    return data
+
+
+def _unpredict(data: bytes, params: dict[str, Any]) -> bytes:
+    """Undo the PNG row predictors xref and object streams are usually written with."""
+    predictor = params.get("Predictor", 1)
+    if predictor == 1:
+        return data
+    if predictor < 10:
+        raise PdfSyntaxError(f"Unsupported predictor {predictor}")
+    pixel = max(1, params.get("Colors", 1) * params.get("BitsPerComponent", 8) // 8)
+    width = params.get("Columns", 1) * pixel
+    output = bytearray()
+    previous = bytearray(width)
+    for start in range(0, len(data), width + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1 : start + 1 + width].ljust(width, b"\x00"))
+        for i in range(width):
+            left = row[i - pixel] if i >= pixel else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                upper_left = previous[i - pixel] if i >= pixel else 0
+                estimate = left + up - upper_left
+                options = (abs(estimate - left), abs(estimate - up), abs(estimate - upper_left))
+                row[i] = (row[i] + (left, up, upper_left)[options.index(min(options))]) & 0xFF
+        output += row
+        previous = row
+    return bytes(output)
+
+
+def _linearization(head: bytes) -> dict[str, Any] | None:
+    """The linearization dictionary, which must be the first object in the file."""
+    match = re.search(rb"\d+\s+\d+\s+obj", head)
+    if match is None or b"/Linearized" not in head:
+        return None
+    try:
+        lexer = _Lexer(head, match.start(), complete=False)
+        lexer.value()
+        lexer.value()
+        lexer.keyword()
+        value = lexer.value()
+    except PdfSyntaxError:
+        return None
+    return value if isinstance(value, dict) and "Linearized" in value else None
+
+
+def _scan(read: RangeReader, size: int) -> tuple[int, bool, bool]:
+    """Count page objects and look for fonts by reading the whole file.
+
+    Used only when the cross-reference data is unusable; misses anything inside
+    compressed object streams.
+    """
+    pages = 0
+    fonts = encrypted = False
+    carry = b""
+    offset = 0
+    while offset < size:
+        chunk = read(offset, SCAN_CHUNK_BYTES)
+        if not chunk:
+            break
+        offset += len(chunk)
+        buffer = carry + chunk
+        boundary = len(buffer) if offset >= size else max(0, len(buffer) - SCAN_OVERLAP_BYTES)
+        pages += sum(1 for match in _PAGE_PATTERN.finditer(buffer) if match.start() < boundary)
+        fonts = fonts or _FONT_PATTERN.search(buffer) is not None
+        encrypted = encrypted or _ENCRYPT_PATTERN.search(buffer) is not None
+        carry = buffer[boundary:]
+    return pages, fonts, encrypted
+
+
+def _sample_indexes(count: int) -> list[int]:
+    return sorted({round(step * (count - 1) / max(1, SAMPLE_PAGES - 1)) for step in range(SAMPLE_PAGES)})
+
+
+def preflight_pdf(read: RangeReader, size: int, *, scan: bool = False) -> PdfPreflight:
+    """Inspect a PDF through ranged reads without parsing its content streams.
+
+    The page count comes from the page tree root found via the trailer, and the text
+    layer estimate from whether a few sampled pages declare fonts; OCR'd scans with an
+    invisible text layer count as text. When the cross-reference data is broken the
+    linearization hint is used, and with ``scan`` the whole file is searched instead.
+    Fields that cannot be determined are left as ``None``; only ``PdfLimitError`` is raised.
+    """
+
+    def bounded(offset: int, length: int) -> bytes:
+        length = min(length, size - offset)
+        return read(offset, length) if length > 0 else b""
+
+    head = bounded(0, HEAD_BYTES)
+    version = _VERSION.search(head)
+    if version is None:
+        return PdfPreflight()
+    linearization = _linearization(head)
+    result = PdfPreflight(
+        pdf_version=version.group(1).decode(),
+        # A linearized file that was updated incrementally no longer matches its /L.
+        linearized=linearization is not None and linearization.get("L") == size,
+    )
+    try:
+        document = _Document(bounded, size)
+        result.encrypted = "Encrypt" in document.trailer
+        pages = document.page_root()
+        count = document.resolve(pages.get("Count"))
+        if not isinstance(count, int) or count < 0:
+            raise PdfSyntaxError("Page tree has no /Count")
+        result.page_count = count
+        if count:
+            sampled = [document.has_fonts(document.page_resources(pages, index)) for index in _sample_indexes(count)]
+            result.has_text_layer = 2 * sum(sampled) > len(sampled)
+        return result
+    except PdfLimitError:
+        raise
+    except (ValueError, KeyError, TypeError, IndexError, AttributeError) as exc:
+        LOGGER.debug("Structured preflight stopped: %s", exc)
+    if result.page_count is None and linearization is not None and isinstance(linearization.get("N"), int):
+        result.page_count = linearization["N"]
+    if scan:
+        pages_found, fonts, encrypted = _scan(bounded, size)
+        if result.page_count is None and pages_found:
+            result.page_count = pages_found
+        if result.has_text_layer is None and result.page_count:
+            result.has_text_layer = fonts
+        if result.encrypted is None:
+            result.encrypted = encrypted
+    return result
+
+
+def preflight_file(handle: BinaryIO) -> PdfPreflight:
+    """Preflight a seekable local file, falling back to a full scan if needed."""
+    handle.seek(0, os.SEEK_END)
+    size = handle.tell()
+
+    def read(offset: int, length: int) -> bytes:
+        handle.seek(offset)
+        return handle.read(length)
+
+    try:
+        return preflight_pdf(read, size, scan=True)
+    finally:
+        handle.seek(0)
+
+
+async def preflight_upload(upload: UploadFile) -> PdfPreflight:
+    return await asyncio.to_thread(preflight_file, upload.file)
+
+
+async def preflight_stored(storage: StorageBackend, key: str, *, size_bytes: int) -> PdfPreflight:
+    """Preflight an object already in storage with a handful of range reads.
+
+    No full scan here: on S3 that would download the whole document.
+    """
+    loop = asyncio.get_running_loop()
+
+    def read(offset: int, length: int) -> bytes:
+        return asyncio.run_coroutine_threadsafe(
+            storage.read_bytes(key, offset=offset, length=length), loop
+        ).result()
+
+    return await asyncio.to_thread(preflight_pdf, read, size_bytes)
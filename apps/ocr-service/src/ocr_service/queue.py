@@ -1,18 +1,339 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from typing import Any
 
 import orjson
 from redis.asyncio import Redis, from_url
 
-from .models import QueueTask
+from .config import Settings
+from .metrics import instrument_redis
+from .models import QueueTask, TaskRecord
+from .repository import TaskRepository
 
 LOGGER = logging.getLogger(__name__)
 
+PRIORITY_LEVELS = range(0, 10)
+# Each priority level owns a band of the sorted-set score space so ZPOPMIN returns
+# higher priorities first. Inside a band the offset is the task's fair-share start
+# tag (or the enqueue time in epoch milliseconds with fair share off). 1e13 is ~300
+# years of milliseconds, and the largest score stays below 1e14, inside both a
+# double's exact integer range and the 14 digits Lua prints numbers with.
+PRIORITY_BAND = 10**13
+# Virtual cost of one task for a submitter of weight 1; weight w is charged 1/w of it.
+FAIR_SHARE_QUANTUM = 1000
 
-class TaskQueue:
-    """Thin wrapper around Redis for queue semantics."""
+
+def priority_band(priority: int) -> tuple[int, int]:
+    low = (max(PRIORITY_LEVELS) - priority) * PRIORITY_BAND
+    return low, low + PRIORITY_BAND - 1
+
+
+# Size tiers, each with its own ready set so short documents never queue behind scans.
+TIERS = ("small", "medium", "large")
+# Tier for messages without a tier (and for unknown tier names).
+DEFAULT_TIER = "medium"
+
+
+@dataclass(frozen=True)
+class TierPolicy:
+    """Routes a task to a size tier by page count, or by bytes when the count is unknown."""
+
+    small_max_pages: int = 20
+    medium_max_pages: int = 200
+    small_max_bytes: int = 2 * 1024 * 1024
+    medium_max_bytes: int = 20 * 1024 * 1024
+    weights: dict[str, int] = field(default_factory=lambda: {"small": 6, "medium": 3, "large": 1})
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "TierPolicy":
+        return cls(
+            small_max_pages=settings.queue_tier_small_max_pages,
+            medium_max_pages=settings.queue_tier_medium_max_pages,
+            small_max_bytes=settings.queue_tier_small_max_mb * 1024 * 1024,
+            medium_max_bytes=settings.queue_tier_medium_max_mb * 1024 * 1024,
+            weights=dict(settings.queue_tier_weights),
+        )
+
+    def route(self, task: QueueTask) -> str:
+        if task.page_count is not None:
+            size, small, medium = task.page_count, self.small_max_pages, self.medium_max_pages
+        else:
+            size, small, medium = task.size_bytes, self.small_max_bytes, self.medium_max_bytes
+        if size <= small:
+            return "small"
+        if size <= medium:
+            return "medium"
+        return "large"
+
+
+@dataclass(frozen=True)
+class FairSharePolicy:
+    """Weights for start-time fair queueing across submitters inside each tier.
+
+    Every submitter is a flow (anonymous uploads share one). Each task is tagged with
+    ``max(tier clock, submitter's previous finish tag)`` and charged
+    ``FAIR_SHARE_QUANTUM / weight``; the tier clock moves to the tag of each claimed
+    task. A bulk upload therefore spreads out over future tags while a newcomer starts
+    at the clock and is served within one task per backlogged submitter. Claims still
+    pop the lowest score, so the backlog soaks up all spare capacity.
+    """
+
+    enabled: bool = True
+    default_weight: int = 1
+    weights: dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "FairSharePolicy":
+        return cls(
+            enabled=settings.queue_fair_share_enabled,
+            default_weight=settings.queue_fair_share_default_weight,
+            weights=dict(settings.queue_fair_share_weights),
+        )
+
+    def weight(self, submitter: str | None) -> int:
+        return max(1, self.weights.get(submitter or "", self.default_weight))
+
+    def cost(self, submitter: str | None) -> int:
+        return max(1, FAIR_SHARE_QUANTUM // self.weight(submitter))
+
+
+class TierScheduler:
+    """Smooth weighted round-robin over the tiers, as nginx balances upstreams.
+
+    With weights 6/3/1, ten consecutive claims start at small six times, medium three
+    times and large once, interleaved rather than in bursts. Each call returns every
+    tier, preferred one first and the rest by weight, so a worker falls through to
+    other tiers instead of idling; a zero-weight tier is only served when the others
+    are empty.
+    """
+
+    def __init__(self, weights: dict[str, int]) -> None:
+        self.weights = {tier: max(0, int(weights.get(tier, 0))) for tier in TIERS}
+        self._current = dict.fromkeys(TIERS, 0)
+
+    def order(self) -> list[str]:
+        total = sum(self.weights.values())
+        by_weight = sorted(TIERS, key=lambda tier: -self.weights[tier])
+        if total == 0:
+            return list(TIERS)
+        for tier in TIERS:
+            self._current[tier] += self.weights[tier]
+        chosen = max(TIERS, key=lambda tier: self._current[tier])
+        self._current[chosen] -= total
+        return [chosen, *(tier for tier in by_weight if tier != chosen)]
+
+
+# Shared Lua helpers: per-submitter counts of ready tasks, kept in a hash so
+# admission control can read one field instead of scanning the queue.
+SUBMITTER_LUA = """
+local function submitter_of(message)
+  local who = cjson.decode(message)['submitted_by']
+  if who == nil or who == cjson.null or who == '' then
+    return nil
+  end
+  return who
+end
+local function tier_of(message, default)
+  local tier = cjson.decode(message)['tier']
+  if tier == nil or tier == cjson.null or tier == '' then
+    return default
+  end
+  return tier
+end
+local function count_submitter(key, who, delta)
+  if not who then
+    return
+  end
+  if redis.call('HINCRBY', key, who, delta) <= 0 then
+    redis.call('HDEL', key, who)
+  end
+end
+"""
+
+TIERS_LUA = f"local TIERS = {{{', '.join(repr(tier) for tier in TIERS)}}}\n"
+
+# Fair-share state lives in one hash: 'clock:<tier>' is the tier's virtual time and
+# '<tier>:<submitter>' the finish tag of the submitter's last queued task there.
+FAIR_SHARE_LUA = (
+    f"local PRIORITY_BAND = {PRIORITY_BAND}\n"
+    + TIERS_LUA
+    + """
+-- Called for every task taken off a ready set: moves the tier clock up to the task's
+-- start tag and, once a named submitter has nothing left waiting, drops its finish
+-- tags so the hash does not grow with every submitter ever seen.
+local function served(fair, submitter_depth, message, score, default)
+  local field = 'clock:' .. tier_of(message, default)
+  local tag = tonumber(score) % PRIORITY_BAND
+  local clock = tonumber(redis.call('HGET', fair, field))
+  if not clock or tag > clock then
+    redis.call('HSET', fair, field, tag)
+  end
+  local who = submitter_of(message)
+  if who and redis.call('HEXISTS', submitter_depth, who) == 0 then
+    for _, tier in ipairs(TIERS) do
+      redis.call('HDEL', fair, tier .. ':' .. who)
+    end
+  end
+end
+"""
+)
+
+# KEYS: ready (the task's tier), submitter_depth, fair_share, ready_small, ready_medium, ready_large
+#       [, record, history, index...]
+# ARGV: message, band, submitter, now_ms, cost ('' with fair share off), tier
+#       [, record_ttl, history_entry ('' to skip), index_score, index_cutoff, task_id, field, value, ...]
+# Writes the optional task record (with its submitted_at index entries) and the queue
+# entry together and returns the new depth of each tier, so an upload costs one round
+# trip and never leaves an orphaned record.
+ENQUEUE_SCRIPT = SUBMITTER_LUA + """
+if KEYS[7] then
+  redis.call('DEL', KEYS[7], KEYS[8])
+  redis.call('HSET', KEYS[7], unpack(ARGV, 12))
+  redis.call('EXPIRE', KEYS[7], ARGV[7])
+  if ARGV[8] ~= '' then
+    redis.call('LPUSH', KEYS[8], ARGV[8])
+    redis.call('EXPIRE', KEYS[8], ARGV[7])
+  end
+  for i = 9, #KEYS do
+    redis.call('ZADD', KEYS[i], ARGV[9], ARGV[11])
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', '(' .. ARGV[10])
+    redis.call('EXPIRE', KEYS[i], ARGV[7])
+  end
+end
+local offset = tonumber(ARGV[4])
+if ARGV[5] ~= '' then
+  -- The clock starts at the current time so tags continue where enqueue-time
+  -- scores of tasks queued before fair share left off.
+  local clock_field = 'clock:' .. ARGV[6]
+  local clock = tonumber(redis.call('HGET', KEYS[3], clock_field))
+  if not clock then
+    clock = offset
+    redis.call('HSET', KEYS[3], clock_field, clock)
+  end
+  local flow = ARGV[6] .. ':' .. ARGV[3]
+  offset = math.max(clock, tonumber(redis.call('HGET', KEYS[3], flow)) or 0)
+  redis.call('HSET', KEYS[3], flow, offset + tonumber(ARGV[5]))
+end
+redis.call('ZADD', KEYS[1], tonumber(ARGV[2]) + offset, ARGV[1])
+if ARGV[3] ~= '' then
+  count_submitter(KEYS[2], ARGV[3], 1)
+end
+return {redis.call('ZCARD', KEYS[4]), redis.call('ZCARD', KEYS[5]), redis.call('ZCARD', KEYS[6])}
+"""
+
+# KEYS: processing, leases, lease_meta, submitter_depth, fair_share, ready... (tiers in the order to try)
+# ARGV: deadline_ms, worker_id, default_tier
+# Moves the head of the first non-empty ready set into the worker's processing list
+# and records the lease deadline plus the original score so an expired lease keeps
+# its place in line.
+CLAIM_SCRIPT = SUBMITTER_LUA + FAIR_SHARE_LUA + """
+for i = 6, #KEYS do
+  local head = redis.call('ZPOPMIN', KEYS[i])
+  if #head > 0 then
+    local message, score = head[1], head[2]
+    redis.call('RPUSH', KEYS[1], message)
+    redis.call('ZADD', KEYS[2], ARGV[1], message)
+    redis.call('HSET', KEYS[3], message, score .. ':' .. ARGV[2])
+    count_submitter(KEYS[4], submitter_of(message), -1)
+    served(KEYS[5], KEYS[4], message, score, ARGV[3])
+    return message
+  end
+end
+return nil
+"""
+
+# KEYS: leases, lease_meta, submitter_depth, ready_small, ready_medium, ready_large, processing...
+# ARGV: now_ms, default_tier, (message, worker_id, index of its processing key in KEYS)...
+# Puts back on their tier's ready set the candidates whose lease is still expired and
+# still held by the worker they were read with (a heartbeat or a new claim since then
+# leaves them alone); returns the messages it requeued. Every key touched is declared.
+REAP_SCRIPT = SUBMITTER_LUA + TIERS_LUA + """
+local function ready_key(tier)
+  for i, name in ipairs(TIERS) do
+    if name == tier then
+      return KEYS[3 + i]
+    end
+  end
+end
+local reaped = {}
+for i = 3, #ARGV, 3 do
+  local message, worker = ARGV[i], ARGV[i + 1]
+  local deadline = redis.call('ZSCORE', KEYS[1], message)
+  local meta = redis.call('HGET', KEYS[2], message) or ''
+  local sep = string.find(meta, ':', 1, true)
+  local owner = sep and string.sub(meta, sep + 1) or ''
+  if deadline and tonumber(deadline) <= tonumber(ARGV[1]) and owner == worker then
+    if worker ~= '' then
+      redis.call('LREM', KEYS[tonumber(ARGV[i + 2])], 1, message)
+    end
+    redis.call('ZREM', KEYS[1], message)
+    redis.call('HDEL', KEYS[2], message)
+    local score = sep and string.sub(meta, 1, sep - 1) or 0
+    local ready = ready_key(tier_of(message, ARGV[2])) or ready_key(ARGV[2])
+    redis.call('ZADD', ready, score, message)
+    count_submitter(KEYS[3], submitter_of(message), 1)
+    table.insert(reaped, message)
+  end
+end
+return reaped
+"""
+
+# KEYS: processing, leases, lease_meta
+# ARGV: message, worker_id, new deadline_ms ('' to release the lease)
+# Extends or releases a lease only while ``worker_id`` still holds it, so a worker
+# whose lease was reaped and claimed again cannot touch the new owner's lease. Its
+# own processing entry is removed on release either way. Returns 1 if it held the lease.
+LEASE_SCRIPT = """
+local meta = redis.call('HGET', KEYS[3], ARGV[1]) or ''
+local sep = string.find(meta, ':', 1, true)
+local held = sep ~= nil and string.sub(meta, sep + 1) == ARGV[2]
+  and redis.call('ZSCORE', KEYS[2], ARGV[1]) ~= false
+if ARGV[3] == '' then
+  redis.call('LREM', KEYS[1], 1, ARGV[1])
+  if held then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[3], ARGV[1])
+  end
+elseif held then
+  redis.call('ZADD', KEYS[2], 'XX', ARGV[3], ARGV[1])
+end
+return held and 1 or 0
+"""
+
+# KEYS: submitter_depth, fair_share, ready... (tiers in the order to try)
+# ARGV: default_tier
+# Non-blocking pop of the most urgent task of the first non-empty tier without a lease.
+POP_SCRIPT = SUBMITTER_LUA + FAIR_SHARE_LUA + """
+for i = 3, #KEYS do
+  local popped = redis.call('ZPOPMIN', KEYS[i])
+  if #popped > 0 then
+    count_submitter(KEYS[1], submitter_of(popped[1]), -1)
+    served(KEYS[2], KEYS[1], popped[1], popped[2], ARGV[1])
+    return popped[1]
+  end
+end
+return nil
+"""
+
+
+@dataclass
+class Lease:
+    """A task claimed by one worker until ``deadline_ms`` unless it heartbeats."""
+
+    task: QueueTask
+    message: bytes
+    worker_id: str
+    deadline_ms: int
+    entry_id: bytes | None = None
+
+
+class QueueBackend(ABC):
+    """Redis connection handling shared by the queue implementations."""
 
     def __init__(
         self,
@@ -31,12 +352,37 @@ class TaskQueue:
         if self._redis is None:
             assert self._redis_url, "redis_url required when client not provided"
             self._redis = from_url(self._redis_url, encoding="utf-8", decode_responses=False)
+        instrument_redis(self._redis)
         await self._redis.ping()
-        LOGGER.info("Connected to Redis queue=%s", self.queue_name)
+        await self._prepare()
+        await self._drain_legacy_list()
+        LOGGER.info("Connected to Redis queue=%s backend=%s", self.queue_name, type(self).__name__)
+
+    async def _prepare(self) -> None:
+        """Backend-specific setup once the client is connected (scripts, groups)."""
+
+    async def _drain_legacy_list(self) -> None:
+        """Move tasks left on the original FIFO list at ``queue_name`` onto this backend.
+
+        Before priorities, tasks were RPUSHed onto a plain list named after the queue.
+        Each one is popped and enqueued again, oldest first; LPOP hands every message
+        to exactly one pod when several start at once.
+        """
+        if await self.redis.type(self.queue_name) not in (b"list", "list"):
+            return
+        drained = 0
+        while (message := await self.redis.lpop(self.queue_name)) is not None:
+            try:
+                await self.enqueue(QueueTask.model_validate_json(message))
+            except Exception:
+                await self.redis.lpush(self.queue_name, message)
+                raise
+            drained += 1
+        LOGGER.info("Moved %d tasks from legacy list %s onto the queue", drained, self.queue_name)
 
     async def close(self) -> None:
         if self._redis is not None:
-            await self._redis.close()
+            await self._redis.aclose()
 
     @property
     def redis(self) -> Redis:
@@ -44,13 +390,377 @@ class TaskQueue:
             raise RuntimeError("Redis client not connected yet")
         return self._redis
 
-    async def enqueue(self, payload: QueueTask) -> None:
+    async def health(self) -> None:
+        await self.redis.ping()
+
+    def route(self, payload: QueueTask) -> str | None:
+        """Size tier ``payload`` would be queued on, or ``None`` if the backend has no tiers."""
+        return None
+
+    @abstractmethod
+    async def enqueue(
+        self,
+        payload: QueueTask,
+        *,
+        record: TaskRecord | None = None,
+        repo: TaskRepository | None = None,
+    ) -> int:
+        ...
+
+    async def enqueue_with_depths(
+        self,
+        payload: QueueTask,
+        *,
+        record: TaskRecord | None = None,
+        repo: TaskRepository | None = None,
+    ) -> tuple[int, dict[str, int]]:
+        """Like :meth:`enqueue`, also returning the depth of each tier after it."""
+        depth = await self.enqueue(payload, record=record, repo=repo)
+        return depth, await self.depth_by_tier()
+
+    @abstractmethod
+    async def dequeue(self, timeout: float = 0) -> QueueTask | None:
+        ...
+
+    @abstractmethod
+    async def claim(
+        self,
+        worker_id: str,
+        *,
+        lease_seconds: float,
+        timeout: float = 0,
+        poll_interval: float = 0.5,
+    ) -> Lease | None:
+        ...
+
+    @abstractmethod
+    async def heartbeat(self, lease: Lease, *, lease_seconds: float) -> bool:
+        ...
+
+    @abstractmethod
+    async def ack(self, lease: Lease) -> None:
+        ...
+
+    @abstractmethod
+    async def reap_expired(self, *, repo: TaskRepository | None = None, limit: int = 100) -> list[QueueTask]:
+        ...
+
+    @abstractmethod
+    async def depth(self, priority: int | None = None) -> int:
+        ...
+
+    @abstractmethod
+    async def depth_by_priority(self) -> dict[int, int]:
+        ...
+
+    @abstractmethod
+    async def depth_by_tier(self) -> dict[str, int]:
+        ...
+
+    @abstractmethod
+    async def in_flight(self) -> int:
+        ...
+
+    @abstractmethod
+    async def admission_snapshot(self, submitter: str | None) -> tuple[int, int]:
+        """Total and per-submitter waiting depth in one round trip."""
+
+    @abstractmethod
+    async def oldest_enqueued_ms(self) -> int | None:
+        ...
+
+
+class TaskQueue(QueueBackend):
+    """Priority queue on Redis sorted sets, one per size tier.
+
+    Priority 9 is the most urgent and 0 the most deferrable (bulk backfills); tasks of
+    equal priority are shared fairly between submitters (``fair_share``) and served
+    in submission order per submitter. Enqueue routes each task to the ready set of
+    its tier (``tiers``); claims pick the tier with a weighted round-robin kept per
+    queue instance, i.e. per worker process.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_name: str,
+        redis_url: str | None = None,
+        redis_client: Redis | None = None,
+        tiers: TierPolicy | None = None,
+        fair_share: FairSharePolicy | None = None,
+    ) -> None:
+        super().__init__(queue_name=queue_name, redis_url=redis_url, redis_client=redis_client)
+        self.tiers = tiers or TierPolicy()
+        self.fair_share = fair_share or FairSharePolicy()
+        self.scheduler = TierScheduler(self.tiers.weights)
+        self.ready_prefix = f"{queue_name}:ready:"
+        self.ready_keys = {tier: f"{self.ready_prefix}{tier}" for tier in TIERS}
+        self.leases_key = f"{queue_name}:leases"
+        self.lease_meta_key = f"{queue_name}:lease-meta"
+        self.processing_prefix = f"{queue_name}:processing:"
+        self.submitter_depth_key = f"{queue_name}:submitter-depth"
+        self.fair_share_key = f"{queue_name}:fair-share"
+
+    async def _prepare(self) -> None:
+        self._enqueue_script = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._claim_script = self.redis.register_script(CLAIM_SCRIPT)
+        self._reap_script = self.redis.register_script(REAP_SCRIPT)
+        self._pop_script = self.redis.register_script(POP_SCRIPT)
+        self._lease_script = self.redis.register_script(LEASE_SCRIPT)
+
+    def route(self, payload: QueueTask) -> str:
+        return payload.tier if payload.tier in self.ready_keys else self.tiers.route(payload)
+
+    def _ordered_ready_keys(self) -> list[str]:
+        return [self.ready_keys[tier] for tier in self.scheduler.order()]
+
+    async def enqueue(
+        self,
+        payload: QueueTask,
+        *,
+        record: TaskRecord | None = None,
+        repo: TaskRepository | None = None,
+    ) -> int:
+        """Queue ``payload`` on its tier and return the new total depth in a single round trip.
+
+        Passing ``record`` and ``repo`` stores the task metadata in the same atomic
+        script, replacing a separate ``repo.save`` call. The chosen tier is written to
+        the message and the record.
+        """
+        depth, _ = await self.enqueue_with_depths(payload, record=record, repo=repo)
+        return depth
+
+    async def enqueue_with_depths(
+        self,
+        payload: QueueTask,
+        *,
+        record: TaskRecord | None = None,
+        repo: TaskRepository | None = None,
+    ) -> tuple[int, dict[str, int]]:
+        """:meth:`enqueue`, returning the tier depths the script counted as well."""
+        tier = self.route(payload)
+        payload = payload.model_copy(update={"tier": tier})
         message = orjson.dumps(payload.model_dump(mode="json"))
-        await self.redis.rpush(self.queue_name, message)
-        LOGGER.info("Queued task %s queue_depth=%d", payload.task_id, await self.depth())
+        band, _ = priority_band(payload.priority)
+        cost = self.fair_share.cost(payload.submitted_by) if self.fair_share.enabled else ""
+        keys = [self.ready_keys[tier], self.submitter_depth_key, self.fair_share_key, *self.ready_keys.values()]
+        args: list[Any] = [message, band, payload.submitted_by or "", int(time.time() * 1000), cost, tier]
+        if record is not None:
+            assert repo is not None, "repo required to store the task record"
+            record = record.model_copy(update={"tier": tier})
+            keys.extend([repo.key(record.task_id), repo.history_key(record.task_id), *repo.index_keys(record)])
+            history = repo.history_entry(record.status, record.updated_at) if repo.history_size > 0 else b""
+            args.extend(
+                [repo.ttl_seconds, history, repo.index_score(record), repo.index_cutoff_ms(), record.task_id]
+            )
+            for field in repo.encode(record).items():
+                args.extend(field)
+        counts = await self._enqueue_script(keys=keys, args=args)
+        by_tier = {name: int(count) for name, count in zip(self.ready_keys, counts)}
+        depth = sum(by_tier.values())
+        LOGGER.info(
+            "Queued task %s tier=%s priority=%d queue_depth=%d", payload.task_id, tier, payload.priority, depth
+        )
+        return depth, by_tier
 
-    async def depth(self) -> int:
-        return int(await self.redis.llen(self.queue_name))
+    async def dequeue(self, timeout: float = 0) -> QueueTask | None:
+        """Pop the most urgent task without a lease; poll up to ``timeout`` seconds."""
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + timeout
+        while True:
+            message = await self._pop_script(
+                keys=[self.submitter_depth_key, self.fair_share_key, *self._ordered_ready_keys()],
+                args=[DEFAULT_TIER],
+            )
+            if message is not None:
+                return QueueTask.model_validate(orjson.loads(message))
+            remaining = give_up_at - loop.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(0.5, remaining))
 
-    async def health(self) -> None:
-        await self.redis.ping()
+    async def depth(self, priority: int | None = None) -> int:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.ready_keys.values():
+                if priority is None:
+                    pipe.zcard(key)
+                else:
+                    pipe.zcount(key, *priority_band(priority))
+            counts = await pipe.execute()
+        return sum(int(count) for count in counts)
+
+    async def depth_by_tier(self) -> dict[str, int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.ready_keys.values():
+                pipe.zcard(key)
+            counts = await pipe.execute()
+        return {tier: int(count) for tier, count in zip(TIERS, counts)}
+
+    async def submitter_depth(self, submitter: str) -> int:
+        return int(await self.redis.hget(self.submitter_depth_key, submitter) or 0)
+
+    async def admission_snapshot(self, submitter: str | None) -> tuple[int, int]:
+        """Total and per-submitter ready depth in one round trip."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.ready_keys.values():
+                pipe.zcard(key)
+            pipe.hget(self.submitter_depth_key, submitter or "")
+            *counts, mine = await pipe.execute()
+        return sum(int(count) for count in counts), int(mine or 0)
+
+    async def oldest_enqueued_ms(self) -> int | None:
+        """Submission time of the longest-waiting task next in line on any tier and priority level.
+
+        Scores hold fair-share tags rather than times, so this reads ``submitted_at``
+        from the head of each band; tasks held back behind a bulk submitter's earlier
+        ones are not seen until they reach the head.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.ready_keys.values():
+                for priority in PRIORITY_LEVELS:
+                    low, high = priority_band(priority)
+                    pipe.zrangebyscore(key, low, high, start=0, num=1)
+            heads = await pipe.execute()
+        submitted = [
+            int(QueueTask.model_validate_json(head[0]).submitted_at.timestamp() * 1000) for head in heads if head
+        ]
+        return min(submitted) if submitted else None
+
+    async def depth_by_priority(self) -> dict[int, int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.ready_keys.values():
+                for priority in PRIORITY_LEVELS:
+                    pipe.zcount(key, *priority_band(priority))
+            counts = await pipe.execute()
+        depths: dict[int, int] = {}
+        for index, count in enumerate(counts):
+            if count:
+                priority = PRIORITY_LEVELS[index % len(PRIORITY_LEVELS)]
+                depths[priority] = depths.get(priority, 0) + int(count)
+        return depths
+
+    def processing_key(self, worker_id: str) -> str:
+        return f"{self.processing_prefix}{worker_id}"
+
+    async def claim(
+        self,
+        worker_id: str,
+        *,
+        lease_seconds: float,
+        timeout: float = 0,
+        poll_interval: float = 0.5,
+    ) -> Lease | None:
+        """Atomically move the most urgent task of the next tier into ``worker_id``'s processing list.
+
+        Tiers are tried in the order :class:`TierScheduler` picks, falling through to the
+        others when the preferred one is empty. The task stays leased until :meth:`ack`;
+        if the worker stops heartbeating, :meth:`reap_expired` returns it to the ready
+        set. Polls for up to ``timeout`` seconds because the move runs as a Lua script,
+        which cannot block.
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + timeout
+        while True:
+            deadline_ms = int((time.time() + lease_seconds) * 1000)
+            message = await self._claim_script(
+                keys=[
+                    self.processing_key(worker_id),
+                    self.leases_key,
+                    self.lease_meta_key,
+                    self.submitter_depth_key,
+                    self.fair_share_key,
+                    *self._ordered_ready_keys(),
+                ],
+                args=[deadline_ms, worker_id, DEFAULT_TIER],
+            )
+            if message is not None:
+                task = QueueTask.model_validate(orjson.loads(message))
+                LOGGER.debug("Worker %s claimed task %s", worker_id, task.task_id)
+                return Lease(task=task, message=message, worker_id=worker_id, deadline_ms=deadline_ms)
+            remaining = give_up_at - loop.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(poll_interval, remaining))
+
+    async def heartbeat(self, lease: Lease, *, lease_seconds: float) -> bool:
+        """Extend the lease; ``False`` means it already expired and was handed to the reaper."""
+        deadline_ms = int((time.time() + lease_seconds) * 1000)
+        if not await self._lease_call(lease, deadline_ms):
+            return False
+        lease.deadline_ms = deadline_ms
+        return True
+
+    async def ack(self, lease: Lease) -> None:
+        """Drop a finished (completed or terminally failed) task from the processing list.
+
+        The lease itself is only released while ``lease.worker_id`` still holds it; a
+        late ack after the task was reaped and claimed again leaves the new lease alone.
+        """
+        if not await self._lease_call(lease, ""):
+            LOGGER.warning("Ack for task %s after its lease was lost", lease.task.task_id)
+
+    async def _lease_call(self, lease: Lease, deadline_ms: int | str) -> bool:
+        return bool(
+            await self._lease_script(
+                keys=[self.processing_key(lease.worker_id), self.leases_key, self.lease_meta_key],
+                args=[lease.message, lease.worker_id, deadline_ms],
+            )
+        )
+
+    async def reap_expired(self, *, repo: TaskRepository | None = None, limit: int = 100) -> list[QueueTask]:
+        """Return tasks with expired leases to their tier's ready set, keeping their original place.
+
+        The expired leases and their owners are read first so the script that moves them
+        can declare every processing list it touches; it re-checks each lease, so one
+        renewed or claimed again in between is skipped. When ``repo`` is given each
+        requeued task is flipped back to ``queued`` and its ``retry_count`` incremented.
+        """
+        now_ms = int(time.time() * 1000)
+        expired = await self.redis.zrangebyscore(self.leases_key, "-inf", now_ms, start=0, num=limit)
+        if not expired:
+            return []
+        metas = await self.redis.hmget(self.lease_meta_key, expired)
+        keys = [self.leases_key, self.lease_meta_key, self.submitter_depth_key, *self.ready_keys.values()]
+        args: list[Any] = [now_ms, DEFAULT_TIER]
+        processing: dict[str, int] = {}
+        for message, meta in zip(expired, metas):
+            worker_id = meta.decode().partition(":")[2] if meta else ""
+            index = 0
+            if worker_id:
+                key = self.processing_key(worker_id)
+                if key not in processing:
+                    keys.append(key)
+                    processing[key] = len(keys)
+                index = processing[key]
+            args.extend([message, worker_id, index])
+        messages = await self._reap_script(keys=keys, args=args)
+        tasks = [QueueTask.model_validate(orjson.loads(message)) for message in messages or []]
+        for task in tasks:
+            LOGGER.warning("Lease expired for task %s; requeued", task.task_id)
+            if repo is not None:
+                await repo.increment_retry(task.task_id)
+        return tasks
+
+    async def in_flight(self) -> int:
+        return int(await self.redis.zcard(self.leases_key))
+
+
+def create_queue(settings: Settings, *, redis_client: Redis | None = None) -> QueueBackend:
+    if settings.queue_backend == "stream":
+        from .streams import StreamTaskQueue
+
+        return StreamTaskQueue(
+            queue_name=settings.queue_name,
+            redis_url=settings.redis_url,
+            redis_client=redis_client,
+            group=settings.stream_group,
+            retention_seconds=settings.stream_retention_seconds,
+            lease_seconds=settings.task_lease_seconds,
+        )
+    return TaskQueue(
+        queue_name=settings.queue_name,
+        redis_url=settings.redis_url,
+        redis_client=redis_client,
+        tiers=TierPolicy.from_settings(settings),
+        fair_share=FairSharePolicy.from_settings(settings),
+    )
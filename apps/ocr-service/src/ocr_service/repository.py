@@ -1,39 +1,368 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from typing import Iterable
 
 import orjson
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 
-from .models import TaskRecord, TaskStatus
+from .config import Settings
+from .models import TERMINAL_STATUSES, PendingUpload, StatusTransition, TaskEvent, TaskRecord, TaskStatus
 
 LOGGER = logging.getLogger(__name__)
 
+EVENT_FIELDS = tuple(TaskEvent.model_fields)
+
+# KEYS: record, history
+# ARGV: ttl_seconds, events_prefix ('' disables publishing), retry_increment,
+#       history_size, history_entry, final_statuses, field, value, ...
+# Applies a status transition in place, appends it to the capped history list and
+# publishes the resulting TaskEvent on the task/submitter/batch channels (see
+# events.event_channel). Returns nil when the record does not exist, so an expired
+# task is never resurrected as a partial hash. A task whose status is one of the
+# space-separated final_statuses is left alone and its current event fields are
+# returned; this is how a cancellation tombstone outlives late worker updates.
+UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return nil
+end
+local names = {""" + ", ".join(f"'{name}'" for name in EVENT_FIELDS) + """}
+local current = redis.call('HGET', KEYS[1], 'status') or ''
+if string.find(' ' .. ARGV[6] .. ' ', ' ' .. current .. ' ', 1, true) then
+  return redis.call('HMGET', KEYS[1], unpack(names))
+end
+if #ARGV > 6 then
+  redis.call('HSET', KEYS[1], unpack(ARGV, 7))
+end
+local increment = tonumber(ARGV[3])
+if increment ~= 0 then
+  redis.call('HINCRBY', KEYS[1], 'retry_count', increment)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+local history_size = tonumber(ARGV[4])
+if history_size > 0 then
+  redis.call('LPUSH', KEYS[2], ARGV[5])
+  redis.call('LTRIM', KEYS[2], 0, history_size - 1)
+  redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+local values = redis.call('HMGET', KEYS[1], unpack(names))
+if ARGV[2] ~= '' then
+  local event = {}
+  for i, name in ipairs(names) do
+    if values[i] then
+      event[name] = values[i]
+    end
+  end
+  event['retry_count'] = tonumber(event['retry_count'] or '0')
+  local payload = cjson.encode(event)
+  redis.call('PUBLISH', ARGV[2] .. 'task:' .. event['task_id'], payload)
+  if event['submitted_by'] then
+    redis.call('PUBLISH', ARGV[2] .. 'submitter:' .. event['submitted_by'], payload)
+  end
+  if event['batch_id'] then
+    redis.call('PUBLISH', ARGV[2] .. 'batch:' .. event['batch_id'], payload)
+  end
+end
+return values
+"""
+
+# KEYS: parent record, completed shard set
+# ARGV: shard_index, ttl_seconds
+# Counts a shard as done once, however often it is acked (a lost lease can run a
+# shard twice). Returns the parent's shards_completed, or nil if the parent is gone.
+COMPLETE_SHARD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return nil
+end
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+  redis.call('HINCRBY', KEYS[1], 'shards_completed', 1)
+end
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return tonumber(redis.call('HGET', KEYS[1], 'shards_completed'))
+"""
+
+# A digest claim is stored as ``DIGEST_PENDING_PREFIX + task_id`` with a short TTL
+# while its upload is still being written, then as the bare task id.
+DIGEST_PENDING_PREFIX = "pending:"
+
+# KEYS: digest
+# ARGV: task_id, pending marker, ttl_seconds
+# Turns the task's own in-flight claim (or a claim that lapsed meanwhile) into a
+# committed one; a claim another task took over after the marker expired is kept.
+COMMIT_DIGEST_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[1] and current ~= ARGV[2] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
+# KEYS: digest
+# ARGV: task_id, pending marker
+# Drops the claim only while it still belongs to ``task_id``, in flight or committed,
+# so a release never deletes a claim another task has taken over meanwhile.
+RELEASE_DIGEST_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current == ARGV[1] or current == ARGV[2] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# KEYS: record
+# ARGV: legacy value, field, value, ...
+# Rewrites a record stored in the original layout (one JSON string per task) as a
+# hash, keeping its TTL. A value that changed since it was read is left alone.
+CONVERT_LEGACY_SCRIPT = """
+if redis.call('TYPE', KEYS[1])['ok'] ~= 'string' or redis.call('GET', KEYS[1]) ~= ARGV[1] then
+  return 0
+end
+local ttl = redis.call('PTTL', KEYS[1])
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+if ttl > 0 then
+  redis.call('PEXPIRE', KEYS[1], ttl)
+end
+return 1
+"""
+
+
+def _decode_fields(names: Iterable[str | bytes], values: Iterable[bytes | str | None]) -> dict[str, str]:
+    decoded = {}
+    for name, value in zip(names, values):
+        if value is None:
+            continue
+        name = name.decode() if isinstance(name, bytes) else name
+        decoded[name] = value.decode() if isinstance(value, bytes) else value
+    return decoded
+
 
 class TaskRepository:
-    """Stores task metadata in Redis for quick status lookups."""
+    """Stores task metadata in Redis for quick status lookups.
+
+    Each task is a hash with one field per ``TaskRecord`` attribute (unset optional
+    fields are omitted), so status transitions and retry counts are updated in place
+    instead of rewriting the whole document.
+    """
 
-    def __init__(self, redis: Redis, *, key_prefix: str, ttl_seconds: int) -> None:
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        key_prefix: str,
+        ttl_seconds: int,
+        digest_prefix: str = "ocr:sha256:",
+        history_prefix: str = "ocr:task-history:",
+        shards_prefix: str = "ocr:task-shards:",
+        index_prefix: str = "ocr:task-index:",
+        pending_upload_prefix: str = "ocr:pending-upload:",
+        events_prefix: str | None = None,
+        history_size: int = 100,
+    ) -> None:
         self.redis = redis
         self.key_prefix = key_prefix
         self.ttl_seconds = ttl_seconds
+        self.digest_prefix = digest_prefix
+        self.history_prefix = history_prefix
+        self.shards_prefix = shards_prefix
+        self.index_prefix = index_prefix
+        self.pending_upload_prefix = pending_upload_prefix
+        self.events_prefix = events_prefix
+        self.history_size = history_size
+        self._update_script = redis.register_script(UPDATE_SCRIPT)
+        self._complete_shard_script = redis.register_script(COMPLETE_SHARD_SCRIPT)
+        self._commit_digest_script = redis.register_script(COMMIT_DIGEST_SCRIPT)
+        self._convert_legacy_script = redis.register_script(CONVERT_LEGACY_SCRIPT)
+        self._release_digest_script = redis.register_script(RELEASE_DIGEST_SCRIPT)
 
-    def _key(self, task_id: str) -> str:
+    def key(self, task_id: str) -> str:
         return f"{self.key_prefix}{task_id}"
 
+    def history_key(self, task_id: str) -> str:
+        return f"{self.history_prefix}{task_id}"
+
+    def shards_key(self, task_id: str) -> str:
+        return f"{self.shards_prefix}{task_id}"
+
+    def index_key(self, submitter: str | None = None) -> str:
+        """Sorted set of task ids scored by ``submitted_at`` (epoch ms): all tasks, or one submitter's."""
+        if submitter is None:
+            return f"{self.index_prefix}by-submitted-at"
+        return f"{self.index_prefix}by-submitter:{submitter}"
+
+    def index_keys(self, record: TaskRecord) -> list[str]:
+        """Indexes ``record`` belongs in; shards are reached through their parent and are not listed."""
+        if record.parent_id is not None:
+            return []
+        keys = [self.index_key()]
+        if record.submitted_by:
+            keys.append(self.index_key(record.submitted_by))
+        return keys
+
+    @staticmethod
+    def index_score(record: TaskRecord) -> int:
+        return int(record.submitted_at.timestamp() * 1000)
+
+    def index_cutoff_ms(self) -> int:
+        """Entries submitted before this are older than any live record and get trimmed."""
+        return int((time.time() - self.ttl_seconds) * 1000)
+
+    @staticmethod
+    def history_entry(status: TaskStatus, at: datetime, worker_id: str | None = None) -> bytes:
+        return orjson.dumps(StatusTransition(status=status, at=at, worker_id=worker_id).model_dump(mode="json"))
+
+    @staticmethod
+    def encode(record: TaskRecord) -> dict[str, str]:
+        """Flatten ``record`` into hash fields; ``None`` values are left out."""
+        return {
+            name: value if isinstance(value, str) else orjson.dumps(value).decode()
+            for name, value in record.model_dump(mode="json").items()
+            if value is not None
+        }
+
+    @staticmethod
+    def decode(fields: dict) -> TaskRecord:
+        return TaskRecord.model_validate(_decode_fields(fields.keys(), fields.values()))
+
+    def _digest_key(self, sha256: str) -> str:
+        return f"{self.digest_prefix}{sha256}"
+
+    def stage_save(self, pipe: Pipeline, record: TaskRecord) -> None:
+        """Queue the commands that (re)create ``record`` and start its history on ``pipe``."""
+        key = self.key(record.task_id)
+        pipe.delete(key)
+        pipe.hset(key, mapping=self.encode(record))
+        pipe.expire(key, self.ttl_seconds)
+        history_key = self.history_key(record.task_id)
+        pipe.delete(history_key)
+        if self.history_size > 0:
+            pipe.lpush(history_key, self.history_entry(record.status, record.updated_at))
+            pipe.expire(history_key, self.ttl_seconds)
+        if record.shards_completed is not None:
+            pipe.delete(self.shards_key(record.task_id))
+        cutoff = self.index_cutoff_ms()
+        for index_key in self.index_keys(record):
+            pipe.zadd(index_key, {record.task_id: self.index_score(record)})
+            pipe.zremrangebyscore(index_key, "-inf", f"({cutoff}")
+            pipe.expire(index_key, self.ttl_seconds)
+
     async def save(self, record: TaskRecord) -> None:
-        payload = orjson.dumps(record.model_dump(mode="json"))
-        key = self._key(record.task_id)
-        await self.redis.set(key, payload, ex=self.ttl_seconds)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self.stage_save(pipe, record)
+            await pipe.execute()
         LOGGER.debug("Stored task metadata task_id=%s", record.task_id)
 
+    async def convert_legacy_records(self, *, batch_size: int = 500) -> int:
+        """Rewrite records the original JSON-string layout stored as hashes; returns how many.
+
+        Every hash command on a task key fails with WRONGTYPE on such a record, so this
+        runs before a pod serves or works on anything. Concurrent runs are harmless.
+        """
+        converted = 0
+        async for key in self.redis.scan_iter(match=f"{self.key_prefix}*", count=batch_size, _type="string"):
+            raw = await self.redis.get(key)
+            if raw is None:
+                continue
+            try:
+                record = TaskRecord.model_validate_json(raw)
+            except ValueError:
+                LOGGER.warning("Skipping unreadable task record %s", key.decode())
+                continue
+            args: list[str | bytes] = [raw]
+            for field in self.encode(record).items():
+                args.extend(field)
+            converted += await self._convert_legacy_script(keys=[key], args=args)
+        if converted:
+            LOGGER.info("Converted %d task records to hashes", converted)
+        return converted
+
     async def get(self, task_id: str) -> TaskRecord | None:
-        raw = await self.redis.get(self._key(task_id))
-        if not raw:
+        fields = await self.redis.hgetall(self.key(task_id))
+        if not fields:
             return None
-        data = orjson.loads(raw)
-        return TaskRecord.model_validate(data)
+        return self.decode(fields)
+
+    async def get_many(self, task_ids: list[str]) -> dict[str, TaskRecord]:
+        """Resolve many tasks with one pipelined round trip; unknown or expired ids are left out."""
+        if not task_ids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for task_id in task_ids:
+                pipe.hgetall(self.key(task_id))
+            results = await pipe.execute()
+        return {task_id: self.decode(fields) for task_id, fields in zip(task_ids, results) if fields}
+
+    async def list_tasks(
+        self, *, submitter: str | None = None, cursor: str | None = None, limit: int = 50
+    ) -> tuple[list[TaskRecord], str | None]:
+        """Tasks newest first from the ``submitted_at`` index, one page at a time.
+
+        ``cursor`` is the ``next_cursor`` of the previous page (``<score>:<task_id>`` of
+        its last entry, which stays stable while new tasks arrive). Returns the page and
+        the cursor of the next one, or ``None`` at the end. Ids whose record already
+        expired are skipped, so a page can hold fewer than ``limit`` tasks.
+        """
+        key = self.index_key(submitter)
+        if cursor is None:
+            entries = await self.redis.zrevrangebyscore(key, "+inf", "-inf", start=0, num=limit + 1, withscores=True)
+        else:
+            score, _, after = cursor.partition(":")
+            if not score.isdigit() or not after:
+                raise ValueError("Malformed cursor")
+            entries = []
+            offset = 0
+            # Entries with the cursor's score come in descending id order; skip up to it.
+            while len(entries) <= limit:
+                batch = await self.redis.zrevrangebyscore(
+                    key, int(score), "-inf", start=offset, num=limit + 1, withscores=True
+                )
+                entries.extend(
+                    (member, value)
+                    for member, value in batch
+                    if int(value) < int(score) or member.decode() < after
+                )
+                if len(batch) <= limit:
+                    break
+                offset += len(batch)
+        page = [(member.decode(), int(value)) for member, value in entries[:limit]]
+        next_cursor = f"{page[-1][1]}:{page[-1][0]}" if len(entries) > limit else None
+        records = await self.get_many([task_id for task_id, _ in page])
+        return [records[task_id] for task_id, _ in page if task_id in records], next_cursor
+
+    async def get_history(self, task_id: str) -> list[StatusTransition]:
+        """Recorded status transitions, oldest first (at most ``history_size``)."""
+        entries = await self.redis.lrange(self.history_key(task_id), 0, -1)
+        return [StatusTransition.model_validate_json(entry) for entry in reversed(entries)]
+
+    def pending_upload_key(self, task_id: str) -> str:
+        return f"{self.pending_upload_prefix}{task_id}"
+
+    async def save_pending_upload(self, pending: PendingUpload, *, ttl_seconds: int) -> None:
+        await self.redis.set(self.pending_upload_key(pending.task_id), pending.model_dump_json(), ex=ttl_seconds)
+
+    async def get_pending_upload(self, task_id: str) -> PendingUpload | None:
+        raw = await self.redis.get(self.pending_upload_key(task_id))
+        return PendingUpload.model_validate_json(raw) if raw else None
+
+    async def consume_pending_upload(self, task_id: str) -> bool:
+        """Remove the pending upload; only the one caller that gets ``True`` may enqueue it."""
+        return bool(await self.redis.delete(self.pending_upload_key(task_id)))
+
+    async def exists(self, task_id: str) -> bool:
+        return bool(await self.redis.exists(self.key(task_id)))
+
+    async def get_event(self, task_id: str) -> TaskEvent | None:
+        """Read only the fields a status event carries."""
+        values = await self.redis.hmget(self.key(task_id), EVENT_FIELDS)
+        if values[0] is None:
+            return None
+        return TaskEvent.model_validate(_decode_fields(EVENT_FIELDS, values))
 
     async def update_status(
         self,
@@ -42,15 +371,131 @@ class TaskRepository:
         *,
         error_message: str | None = None,
         retry_count: int | None = None,
-    ) -> TaskRecord | None:
-        record = await self.get(task_id)
-        if not record:
-            return None
-        record.status = status
-        record.updated_at = datetime.utcnow()
+        result_uri: str | None = None,
+        retry_increment: int = 0,
+        retry_at: datetime | None = None,
+        worker_id: str | None = None,
+        unless: Iterable[TaskStatus] = (TaskStatus.cancelled,),
+    ) -> TaskEvent | None:
+        """Apply a status transition atomically, record it in the history and publish it.
+
+        Returns ``None`` if the task is gone. A task already in one of the ``unless``
+        statuses (by default only ``cancelled``) is not changed, and the returned event
+        carries its current status, so callers compare it against ``status``.
+        ``worker_id`` is stored with the history entry only.
+        """
+        now = datetime.now(timezone.utc)
+        fields: list[str] = ["status", status.value, "updated_at", now.isoformat().replace("+00:00", "Z")]
         if error_message is not None:
-            record.error_message = error_message
+            fields.extend(["error_message", error_message])
         if retry_count is not None:
-            record.retry_count = retry_count
-        await self.save(record)
-        return record
+            fields.extend(["retry_count", str(retry_count)])
+        if result_uri is not None:
+            fields.extend(["result_uri", result_uri])
+        if retry_at is not None:
+            fields.extend(["retry_at", retry_at.isoformat().replace("+00:00", "Z")])
+        values = await self._update_script(
+            keys=[self.key(task_id), self.history_key(task_id)],
+            args=[
+                self.ttl_seconds,
+                self.events_prefix or "",
+                retry_increment,
+                self.history_size,
+                self.history_entry(status, now, worker_id),
+                " ".join(final.value for final in unless),
+                *fields,
+            ],
+        )
+        if values is None:
+            return None
+        return TaskEvent.model_validate(_decode_fields(EVENT_FIELDS, values))
+
+    async def complete_shard(self, parent_id: str, shard_index: int) -> int | None:
+        """Mark one shard of ``parent_id`` done; returns how many are done, ``None`` if the parent is gone."""
+        completed = await self._complete_shard_script(
+            keys=[self.key(parent_id), self.shards_key(parent_id)], args=[shard_index, self.ttl_seconds]
+        )
+        return None if completed is None else int(completed)
+
+    async def cancel(self, task_id: str) -> TaskEvent | None:
+        """Tombstone a task that has not finished; the event shows the status it ended up in.
+
+        Nothing is removed from the queue. Workers check :meth:`is_cancelled` when they
+        claim a task and drop it, and no later update overwrites the tombstone.
+        """
+        return await self.update_status(task_id, TaskStatus.cancelled, unless=TERMINAL_STATUSES)
+
+    async def is_cancelled(self, task_id: str) -> bool:
+        status = await self.redis.hget(self.key(task_id), "status")
+        return status is not None and status.decode() == TaskStatus.cancelled.value
+
+    async def increment_retry(self, task_id: str) -> TaskEvent | None:
+        """Put a task back to ``queued`` after a lost lease and count the extra attempt."""
+        return await self.update_status(task_id, TaskStatus.queued, retry_increment=1)
+
+    async def claim_digest(
+        self, sha256: str, task_id: str, *, pending_ttl_seconds: int, force: bool = False
+    ) -> tuple[str, bool] | None:
+        """Point the content digest at ``task_id`` unless another task already owns it.
+
+        The claim starts out in flight: it expires after ``pending_ttl_seconds`` unless
+        :meth:`commit_digest` makes it permanent once the task record is written.
+        Returns ``(owner, in_flight)`` when the digest was already claimed, ``None``
+        when ``task_id`` now owns it. ``force`` overwrites a stale claim.
+        """
+        key = self._digest_key(sha256)
+        marker = f"{DIGEST_PENDING_PREFIX}{task_id}"
+        if force:
+            await self.redis.set(key, marker, ex=pending_ttl_seconds)
+            return None
+        claimed = await self.redis.set(key, marker, ex=pending_ttl_seconds, nx=True)
+        if claimed:
+            return None
+        existing = await self._digest_owner(sha256)
+        if existing is None:
+            # Expired between SET NX and GET; retry once with the key free.
+            claimed = await self.redis.set(key, marker, ex=pending_ttl_seconds, nx=True)
+            return None if claimed else await self._digest_owner(sha256)
+        return existing
+
+    async def commit_digest(self, sha256: str, task_id: str) -> bool:
+        """Keep ``task_id``'s in-flight claim for the task TTL; ``False`` if another task took it over."""
+        committed = await self._commit_digest_script(
+            keys=[self._digest_key(sha256)],
+            args=[task_id, f"{DIGEST_PENDING_PREFIX}{task_id}", self.ttl_seconds],
+        )
+        return bool(committed)
+
+    async def _digest_owner(self, sha256: str) -> tuple[str, bool] | None:
+        existing = await self.redis.get(self._digest_key(sha256))
+        if existing is None:
+            return None
+        value = existing.decode() if isinstance(existing, bytes) else existing
+        if value.startswith(DIGEST_PENDING_PREFIX):
+            return value.removeprefix(DIGEST_PENDING_PREFIX), True
+        return value, False
+
+    async def find_by_digest(self, sha256: str) -> str | None:
+        owner = await self._digest_owner(sha256)
+        return None if owner is None else owner[0]
+
+    async def release_digest(self, sha256: str, task_id: str) -> None:
+        """Drop the digest claim if ``task_id`` still owns it (e.g. storage write failed)."""
+        await self._release_digest_script(
+            keys=[self._digest_key(sha256)], args=[task_id, f"{DIGEST_PENDING_PREFIX}{task_id}"]
+        )
+
+
+def create_repository(redis: Redis, settings: Settings) -> TaskRepository:
+    return TaskRepository(
+        redis,
+        key_prefix=settings.task_status_prefix,
+        ttl_seconds=settings.task_ttl_seconds,
+        digest_prefix=settings.dedup_index_prefix,
+        history_prefix=settings.task_history_prefix,
+        shards_prefix=settings.task_shards_prefix,
+        index_prefix=settings.task_index_prefix,
+        pending_upload_prefix=settings.pending_upload_prefix,
+        events_prefix=settings.events_channel_prefix,
+        history_size=settings.status_history_size,
+    )
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from typing import Any
+
+import orjson
+import zstandard
+
+from .config import Settings
+from .models import ResultIndex, ResultPage
+from .storage import StorageBackend
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+PAGES_NAME = "pages.zst"
+
+
+def encode_result(task_id: str, document: dict[str, Any], *, level: int = 3) -> tuple[ResultIndex, bytes]:
+    """Split an extraction document into one zstd frame per page plus an index.
+
+    Frames are independent, so any page can be read with a single range request and
+    decompressed on its own. Everything except ``pages`` is kept in the index.
+    """
+    compressor = zstandard.ZstdCompressor(level=level)
+    metadata = {name: value for name, value in document.items() if name != "pages"}
+    frames: list[bytes] = []
+    pages: list[ResultPage] = []
+    offset = 0
+    size = 0
+    for number, page in enumerate(document.get("pages") or [], start=1):
+        raw = orjson.dumps(page)
+        frame = compressor.compress(raw)
+        pages.append(
+            ResultPage(
+                number=number,
+                offset=offset,
+                length=len(frame),
+                size_bytes=len(raw),
+                sha256=hashlib.sha256(raw).hexdigest(),
+            )
+        )
+        frames.append(frame)
+        offset += len(frame)
+        size += len(raw)
+    blob = b"".join(frames)
+    index = ResultIndex(
+        task_id=task_id,
+        etag=hashlib.sha256(blob).hexdigest(),
+        page_count=len(pages),
+        compressed_bytes=len(blob),
+        size_bytes=size,
+        metadata=metadata,
+        pages=pages,
+    )
+    return index, blob
+
+
+def decode_page(frame: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(frame)
+
+
+def assemble_document(index: ResultIndex, blob: bytes) -> bytes:
+    """Rebuild the original JSON document from the index and the pages object.
+
+    Page JSON is spliced in as bytes rather than parsed and re-serialised.
+    """
+    decompressor = zstandard.ZstdDecompressor()
+    pages = b",".join(
+        decompressor.decompress(blob[page.offset : page.offset + page.length]) for page in index.pages
+    )
+    head = orjson.dumps(index.metadata)[:-1]
+    separator = b"," if index.metadata else b""
+    return head + separator + b'"pages":[' + pages + b"]}"
+
+
+class ResultStore:
+    """Reads and writes page-addressable results under ``<prefix>/<task_id>/``.
+
+    The pages object is written before the index, so a readable index always points
+    at a complete pages object.
+    """
+
+    def __init__(self, storage: StorageBackend, *, prefix: str, compression_level: int = 3) -> None:
+        self.storage = storage
+        self.prefix = prefix.strip("/")
+        self.compression_level = compression_level
+
+    def index_key(self, task_id: str) -> str:
+        return f"{self.prefix}/{task_id}/{INDEX_NAME}"
+
+    def pages_key(self, task_id: str) -> str:
+        return f"{self.prefix}/{task_id}/{PAGES_NAME}"
+
+    async def save(self, task_id: str, document: dict[str, Any]) -> str:
+        """Store ``document`` and return the URI of its index."""
+        index, blob = await asyncio.to_thread(encode_result, task_id, document, level=self.compression_level)
+        await self.storage.save_bytes(self.pages_key(task_id), blob, content_type="application/zstd")
+        uri = await self.storage.save_bytes(
+            self.index_key(task_id), orjson.dumps(index.model_dump(mode="json")), content_type="application/json"
+        )
+        LOGGER.info(
+            "Stored result task_id=%s pages=%d bytes=%d compressed=%d",
+            task_id,
+            index.page_count,
+            index.size_bytes,
+            index.compressed_bytes,
+        )
+        return uri
+
+    async def assemble(self, task_id: str, part_ids: list[str]) -> str:
+        """Join the stored results of ``part_ids`` (in page order) into the result of ``task_id``.
+
+        Page frames are independent, so the parts' pages objects are concatenated
+        as-is and only the index offsets are rebased. Document metadata comes from
+        the first part.
+        """
+        indexes = await asyncio.gather(*(self.load_index(part_id) for part_id in part_ids))
+        missing = [part_id for part_id, index in zip(part_ids, indexes) if index is None]
+        if missing:
+            raise FileNotFoundError(f"Results missing for {', '.join(missing)}")
+        blobs = await asyncio.gather(
+            *(self.storage.read_bytes(self.pages_key(index.task_id)) if index.pages else _empty() for index in indexes)
+        )
+        pages: list[ResultPage] = []
+        base = 0
+        for index, blob in zip(indexes, blobs):
+            for page in index.pages:
+                pages.append(page.model_copy(update={"number": len(pages) + 1, "offset": base + page.offset}))
+            base += len(blob)
+        blob = b"".join(blobs)
+        metadata = dict(indexes[0].metadata)
+        if "page_count" in metadata:
+            metadata["page_count"] = len(pages)
+        index = ResultIndex(
+            task_id=task_id,
+            etag=hashlib.sha256(blob).hexdigest(),
+            page_count=len(pages),
+            compressed_bytes=len(blob),
+            size_bytes=sum(part.size_bytes for part in indexes),
+            metadata=metadata,
+            pages=pages,
+        )
+        await self.storage.save_bytes(self.pages_key(task_id), blob, content_type="application/zstd")
+        uri = await self.storage.save_bytes(
+            self.index_key(task_id), orjson.dumps(index.model_dump(mode="json")), content_type="application/json"
+        )
+        LOGGER.info("Assembled result task_id=%s parts=%d pages=%d", task_id, len(part_ids), index.page_count)
+        return uri
+
+    async def load_index(self, task_id: str) -> ResultIndex | None:
+        try:
+            raw = await self.storage.read_bytes(self.index_key(task_id))
+        except FileNotFoundError:
+            return None
+        return ResultIndex.model_validate_json(raw)
+
+    async def read_page_frame(self, index: ResultIndex, number: int) -> bytes:
+        """Fetch the compressed frame of page ``number`` (1-based) with one range read."""
+        page = index.pages[number - 1]
+        return await self.storage.read_bytes(self.pages_key(index.task_id), offset=page.offset, length=page.length)
+
+    async def read_document(self, index: ResultIndex) -> bytes:
+        blob = await self.storage.read_bytes(self.pages_key(index.task_id)) if index.pages else b""
+        return await asyncio.to_thread(assemble_document, index, blob)
+
+
+async def _empty() -> bytes:
+    return b""
+
+
+def create_result_store(storage: StorageBackend, settings: Settings) -> ResultStore:
+    return ResultStore(storage, prefix=settings.result_prefix, compression_level=settings.result_compression_level)
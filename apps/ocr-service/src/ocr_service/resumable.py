@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+from .config import Settings
+from .models import ResumableUpload
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _load_libcrypto() -> ctypes.CDLL | None:
+    name = ctypes.util.find_library("crypto")
+    if name is None:
+        return None
+    try:
+        lib = ctypes.CDLL(name)
+        for symbol in ("SHA256_Init", "SHA256_Update", "SHA256_Final"):
+            getattr(lib, symbol).restype = ctypes.c_int
+    except (OSError, AttributeError):  # pragma: no cover - stripped OpenSSL build
+        return None
+    lib.SHA256_Update.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
+    return lib
+
+
+_LIBCRYPTO = _load_libcrypto()
+
+# OpenSSL does not export sizeof(SHA256_CTX); this is its size in 1.1 and 3.x, and
+# _self_test() refuses a libcrypto it does not fit.
+_CTX_SIZE = 112
+_GUARD = b"\xa5" * 64
+
+
+def _self_test(lib: ctypes.CDLL) -> bool:
+    """Check ``lib`` against the FIPS 180-2 "abc" vector, across an export and resume.
+
+    The context is allocated with a guard band behind it so that a ``SHA256_CTX``
+    larger than ``_CTX_SIZE`` shows up as overwritten guard bytes rather than as
+    silent corruption of later uploads.
+    """
+    ctx = ctypes.create_string_buffer(_CTX_SIZE + len(_GUARD))
+    ctypes.memmove(ctypes.addressof(ctx) + _CTX_SIZE, _GUARD, len(_GUARD))
+    digest = ctypes.create_string_buffer(32)
+    if lib.SHA256_Init(ctx) != 1 or lib.SHA256_Update(ctx, b"a", 1) != 1 or ctx.raw[_CTX_SIZE:] != _GUARD:
+        # Resuming from a truncated state is not safe to try.
+        return False
+    resumed = ctypes.create_string_buffer(ctx.raw[:_CTX_SIZE] + _GUARD, _CTX_SIZE + len(_GUARD))
+    if lib.SHA256_Update(resumed, b"bc", 2) != 1 or lib.SHA256_Final(digest, resumed) != 1:
+        return False
+    return (
+        digest.raw.hex() == "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+        and resumed.raw[_CTX_SIZE:] == _GUARD
+    )
+
+
+if _LIBCRYPTO is not None and not _self_test(_LIBCRYPTO):
+    LOGGER.warning("OpenSSL libcrypto failed the SHA-256 self-test; resumable uploads are disabled")
+    _LIBCRYPTO = None
+
+
+class Sha256State:
+    """SHA-256 whose running state can be saved to Redis and resumed on another pod.
+
+    ``hashlib`` cannot export its state, so this drives OpenSSL's ``SHA256_CTX``
+    directly. The exported bytes are the raw struct and only portable between hosts
+    with the same OpenSSL build and architecture, which holds for one deployment.
+    """
+
+    CTX_SIZE = _CTX_SIZE
+
+    def __init__(self, state: bytes | None = None) -> None:
+        if _LIBCRYPTO is None:
+            raise RuntimeError("OpenSSL libcrypto is required for resumable SHA-256 state")
+        if state is None:
+            self._ctx = ctypes.create_string_buffer(self.CTX_SIZE)
+            _LIBCRYPTO.SHA256_Init(self._ctx)
+        else:
+            if len(state) != self.CTX_SIZE:
+                raise ValueError("Invalid SHA-256 state")
+            self._ctx = ctypes.create_string_buffer(state, self.CTX_SIZE)
+
+    @staticmethod
+    def available() -> bool:
+        return _LIBCRYPTO is not None
+
+    def update(self, data: bytes) -> None:
+        # ctypes releases the GIL, so this is worth running in a worker thread.
+        _LIBCRYPTO.SHA256_Update(self._ctx, data, len(data))
+
+    def export(self) -> bytes:
+        return self._ctx.raw
+
+    def hexdigest(self) -> str:
+        ctx = ctypes.create_string_buffer(self._ctx.raw, self.CTX_SIZE)
+        digest = ctypes.create_string_buffer(32)
+        _LIBCRYPTO.SHA256_Final(digest, ctx)
+        return digest.raw.hex()
+
+
+# KEYS: session
+# ARGV: expected_offset, offset, parts, sha_state, ttl_seconds
+# Commits a written part only if nobody advanced the upload in the meantime.
+ADVANCE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'offset')
+if current ~= ARGV[1] then
+  return current
+end
+redis.call('HSET', KEYS[1], 'offset', ARGV[2], 'parts', ARGV[3], 'sha_state', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return ARGV[2]
+"""
+
+
+class ResumableUploadStore:
+    """Redis state of in-progress resumable uploads: offset, part count and hash state."""
+
+    def __init__(self, redis: Redis, *, key_prefix: str, ttl_seconds: int) -> None:
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.ttl_seconds = ttl_seconds
+        self._advance_script = redis.register_script(ADVANCE_SCRIPT)
+
+    def key(self, task_id: str) -> str:
+        return f"{self.key_prefix}session:{task_id}"
+
+    def lock_key(self, task_id: str) -> str:
+        return f"{self.key_prefix}lock:{task_id}"
+
+    async def create(self, session: ResumableUpload) -> None:
+        fields = {
+            name: value if isinstance(value, str) else str(value)
+            for name, value in session.model_dump(mode="json").items()
+            if value is not None
+        }
+        key = self.key(session.task_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={**fields, "sha_state": Sha256State().export()})
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def get(self, task_id: str) -> tuple[ResumableUpload, bytes] | None:
+        """The session and its exported SHA-256 state, or ``None`` if unknown or expired."""
+        fields = await self.redis.hgetall(self.key(task_id))
+        if not fields:
+            return None
+        state = fields.pop(b"sha_state")
+        session = ResumableUpload.model_validate({name.decode(): value.decode() for name, value in fields.items()})
+        return session, state
+
+    async def advance(
+        self, task_id: str, *, expected_offset: int, offset: int, parts: int, sha_state: bytes
+    ) -> int | None:
+        """Move the upload from ``expected_offset`` to ``offset``.
+
+        Returns the offset now stored (``offset`` on success, the other writer's offset
+        on a conflict) or ``None`` when the session has expired.
+        """
+        current = await self._advance_script(
+            keys=[self.key(task_id)],
+            args=[expected_offset, offset, parts, sha_state, self.ttl_seconds],
+        )
+        if current is None:
+            return None
+        return int(current)
+
+    async def acquire(self, task_id: str, *, timeout_seconds: int) -> str | None:
+        """Take the per-upload write lock so two PATCHes never write the same part."""
+        token = uuid4().hex
+        if await self.redis.set(self.lock_key(task_id), token, nx=True, ex=timeout_seconds):
+            return token
+        return None
+
+    async def release(self, task_id: str, token: str) -> None:
+        key = self.lock_key(task_id)
+        held = await self.redis.get(key)
+        if held is not None and held.decode() == token:
+            await self.redis.delete(key)
+
+    async def consume(self, task_id: str) -> bool:
+        """Remove the session; only the one caller that gets ``True`` may queue the upload."""
+        return bool(await self.redis.delete(self.key(task_id)))
+
+    async def delete(self, task_id: str) -> None:
+        await self.redis.delete(self.key(task_id), self.lock_key(task_id))
+
+
+def create_resumable_store(redis: Redis, settings: Settings) -> ResumableUploadStore:
+    return ResumableUploadStore(
+        redis, key_prefix=settings.resumable_prefix, ttl_seconds=settings.resumable_session_ttl_seconds
+    )
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from redis.asyncio import Redis
+
+from .config import Settings
+from .models import DeadLetter, QueueTask, TaskStatus
+from .queue import QueueBackend
+from .repository import TaskRepository
+
+LOGGER = logging.getLogger(__name__)
+
+# KEYS: delayed
+# ARGV: now_ms, limit, visible_again_ms
+# Takes up to ``limit`` due retries and pushes their due time to ``visible_again_ms``
+# instead of removing them, so a mover that dies before re-queueing them does not
+# lose them and two movers never promote the same retry at once.
+TAKE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, message in ipairs(due) do
+  redis.call('ZADD', KEYS[1], 'XX', ARGV[3], message)
+end
+return due
+"""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter: retry ``n`` waits up to ``base * 2**(n-1)`` seconds."""
+
+    max_retries: int = 3
+    base_seconds: float = 10.0
+    max_seconds: float = 600.0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "RetryPolicy":
+        return cls(
+            max_retries=settings.task_max_retries,
+            base_seconds=settings.task_retry_base_seconds,
+            max_seconds=settings.task_retry_max_seconds,
+        )
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before retry number ``retry`` (1-based)."""
+        ceiling = min(self.max_seconds, self.base_seconds * 2 ** (retry - 1))
+        return random.uniform(0, ceiling)
+
+
+class RetryQueue:
+    """Delayed retries and dead letters of one task queue.
+
+    Failed tasks wait in ``<queue>:delayed``, a sorted set scored by due time (epoch
+    milliseconds), until :meth:`promote_due` puts them back on the queue. Tasks out of
+    retries are pushed onto the ``<queue>:dead-letter`` list (newest first) and stay
+    there until :meth:`requeue_dead_letters`. The list keeps the newest ``max_dead_letters``
+    and expires ``ttl_seconds`` after the last push, like the task records it points to.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        queue_name: str,
+        policy: RetryPolicy | None = None,
+        promote_timeout_seconds: float = 60.0,
+        max_dead_letters: int = 10_000,
+        ttl_seconds: int | None = None,
+    ) -> None:
+        self.redis = redis
+        self.policy = policy or RetryPolicy()
+        self.delayed_key = f"{queue_name}:delayed"
+        self.dead_letter_key = f"{queue_name}:dead-letter"
+        self.promote_timeout_seconds = promote_timeout_seconds
+        self.max_dead_letters = max_dead_letters
+        self.ttl_seconds = ttl_seconds
+        self._take_due_script = redis.register_script(TAKE_DUE_SCRIPT)
+
+    async def schedule(self, task: QueueTask, *, delay_seconds: float) -> datetime:
+        """Queue ``task`` again after ``delay_seconds``; returns when it becomes due."""
+        due_ms = int((time.time() + delay_seconds) * 1000)
+        await self.redis.zadd(self.delayed_key, {task.model_dump_json(): due_ms})
+        return datetime.fromtimestamp(due_ms / 1000, tz=timezone.utc)
+
+    async def promote_due(self, queue: QueueBackend, *, limit: int = 100) -> list[QueueTask]:
+        """Move retries whose time has come onto ``queue``."""
+        now_ms = int(time.time() * 1000)
+        messages = await self._take_due_script(
+            keys=[self.delayed_key],
+            args=[now_ms, limit, now_ms + int(self.promote_timeout_seconds * 1000)],
+        )
+        promoted = []
+        for message in messages or []:
+            task = QueueTask.model_validate_json(message)
+            await queue.enqueue(task)
+            await self.redis.zrem(self.delayed_key, message)
+            promoted.append(task)
+        if promoted:
+            LOGGER.info("Promoted %d due retries", len(promoted))
+        return promoted
+
+    async def delayed(self) -> int:
+        return int(await self.redis.zcard(self.delayed_key))
+
+    async def dead_letter(self, task: QueueTask, *, error: str, retry_count: int) -> None:
+        entry = DeadLetter(task=task, error=error, retry_count=retry_count, failed_at=datetime.now(timezone.utc))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(self.dead_letter_key, entry.model_dump_json())
+            pipe.ltrim(self.dead_letter_key, 0, self.max_dead_letters - 1)
+            if self.ttl_seconds:
+                pipe.expire(self.dead_letter_key, self.ttl_seconds)
+            await pipe.execute()
+        LOGGER.warning("Task %s dead-lettered after %d retries: %s", task.task_id, retry_count, error)
+
+    async def dead_letters(self, *, offset: int = 0, limit: int = 100) -> tuple[int, list[DeadLetter]]:
+        """Total count and one page of dead letters, newest first."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self.dead_letter_key)
+            pipe.lrange(self.dead_letter_key, offset, offset + limit - 1)
+            total, entries = await pipe.execute()
+        return int(total), [DeadLetter.model_validate_json(entry) for entry in entries]
+
+    async def requeue_dead_letters(
+        self,
+        queue: QueueBackend,
+        repo: TaskRepository,
+        *,
+        task_ids: list[str] | None = None,
+        limit: int = 100,
+    ) -> list[str]:
+        """Put dead letters back on ``queue`` with a fresh retry budget.
+
+        Without ``task_ids`` the ``limit`` oldest are requeued; otherwise the listed
+        tasks are. Each entry is removed before it is queued, so concurrent calls never
+        queue the same dead letter twice.
+        """
+        if task_ids is None:
+            entries = await self.redis.lrange(self.dead_letter_key, -limit, -1)
+        else:
+            wanted = set(task_ids)
+            entries = [
+                entry
+                for entry in await self.redis.lrange(self.dead_letter_key, 0, -1)
+                if DeadLetter.model_validate_json(entry).task.task_id in wanted
+            ]
+        requeued = []
+        for entry in reversed(entries):
+            if not await self.redis.lrem(self.dead_letter_key, 1, entry):
+                continue
+            task = DeadLetter.model_validate_json(entry).task
+            event = await repo.update_status(task.task_id, TaskStatus.queued, retry_count=0)
+            if event is None or event.status != TaskStatus.queued:
+                LOGGER.warning("Dropped dead letter %s: task record expired or cancelled", task.task_id)
+                continue
+            await queue.enqueue(task)
+            requeued.append(task.task_id)
+        LOGGER.info("Requeued %d dead letters", len(requeued))
+        return requeued
+
+
+def create_retry_queue(redis: Redis, settings: Settings) -> RetryQueue:
+    return RetryQueue(
+        redis,
+        queue_name=settings.queue_name,
+        policy=RetryPolicy.from_settings(settings),
+        max_dead_letters=settings.task_dead_letter_size,
+        ttl_seconds=settings.task_ttl_seconds,
+    )
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from .models import QueueTask, TaskRecord
+
+
+def plan_shards(page_count: int | None, pages_per_shard: int) -> list[tuple[int, int]]:
+    """1-based inclusive page ranges to fan a document out into.
+
+    Returns a single range (or none when the page count is unknown) for documents
+    that fit in one shard, so callers only fan out when the result has two or more.
+    """
+    if not page_count:
+        return []
+    if pages_per_shard <= 0 or page_count <= pages_per_shard:
+        return [(1, page_count)]
+    return [
+        (first, min(first + pages_per_shard - 1, page_count))
+        for first in range(1, page_count + 1, pages_per_shard)
+    ]
+
+
+def shard_task_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}.{index}"
+
+
+def split_task(
+    task: QueueTask, record: TaskRecord, ranges: list[tuple[int, int]]
+) -> tuple[TaskRecord, list[tuple[QueueTask, TaskRecord]]]:
+    """Fan a document out into page-range shards.
+
+    Returns the parent record, which carries the completion counter and is never
+    queued itself, and one queue message and record per shard.
+    """
+    shards = []
+    for index, (first, last) in enumerate(ranges):
+        fields = {
+            "task_id": shard_task_id(task.task_id, index),
+            "parent_id": task.task_id,
+            "shard_index": index,
+            "shard_count": len(ranges),
+            "first_page": first,
+            "last_page": last,
+            "page_count": last - first + 1,
+        }
+        shards.append((task.model_copy(update=fields), record.model_copy(update=fields)))
+    parent = record.model_copy(update={"shard_count": len(ranges), "shards_completed": 0})
+    return parent, shards
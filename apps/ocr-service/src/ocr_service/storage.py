@@ -1,22 +1,51 @@
 from __future__ import annotations
 
+import base64
 import hashlib
-import io
 import logging
+import os
+import time
 from abc import ABC, abstractmethod
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable
+from uuid import uuid4
 
 import aiofiles
 from aiofiles import os as aiofiles_os
 import asyncio
 import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
 from fastapi import UploadFile
 
+from .config import Settings
+from .metrics import S3_INFLIGHT_CALLS, S3_POOL_WAIT_SECONDS, STORAGE_CALL_SECONDS, timed
 from .models import StorageArtifact
 
 LOGGER = logging.getLogger(__name__)
 
+LOCAL_CHUNK_SIZE = 4 * 1024 * 1024
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+STORED_HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+@dataclass
+class PresignedUpload:
+    url: str
+    headers: dict[str, str]
+    expires_at: datetime
+
+
+@dataclass
+class ObjectInfo:
+    uri: str
+    path: str
+    size_bytes: int
+    sha256: str | None = None
+
 
 class StorageBackend(ABC):
     """Abstract storage interface."""
@@ -40,8 +69,83 @@ class StorageBackend(ABC):
         *,
         key: str,
         max_bytes: int,
+        sha256: str | None = None,
     ) -> StorageArtifact:
-        ...
+        """Store the upload under ``key``, hashing it on the way unless ``sha256`` is already known."""
+
+    @abstractmethod
+    async def fetch(self, path: str, *, scratch_dir: Path) -> Path:
+        """Make a stored object readable as a local file, downloading into ``scratch_dir`` if needed."""
+
+    @abstractmethod
+    async def save_bytes(self, key: str, data: bytes, *, content_type: str) -> str:
+        """Store ``data`` under ``key`` (relative to the backend prefix) and return its URI."""
+
+    @abstractmethod
+    async def read_bytes(self, key: str, *, offset: int = 0, length: int | None = None) -> bytes:
+        """Read ``length`` bytes of ``key`` from ``offset`` (to the end when ``None``).
+
+        Raises ``FileNotFoundError`` when the object does not exist.
+        """
+
+    @abstractmethod
+    async def head(self, key: str) -> ObjectInfo:
+        """Describe the object at ``key``; ``sha256`` is set when the backend stores a checksum.
+
+        Raises ``FileNotFoundError`` when the object does not exist.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove the object at ``key``; a missing object is not an error."""
+
+    async def presign_upload(
+        self,
+        key: str,
+        *,
+        size_bytes: int,
+        sha256: str,
+        content_type: str,
+        expires_in: int,
+    ) -> PresignedUpload:
+        """Return a URL the client can PUT the object to directly."""
+        raise NotImplementedError(f"{type(self).__name__} does not support presigned uploads")
+
+    # Resumable uploads: parts arrive in order, one request each, possibly on different
+    # pods. Every non-final part must be at least ``resumable_min_part_size`` bytes.
+    resumable_min_part_size = 1
+
+    async def begin_resumable(self, key: str, *, content_type: str) -> str | None:
+        """Prepare ``key`` for a resumable upload; returns a backend upload id if it needs one."""
+        raise NotImplementedError(f"{type(self).__name__} does not support resumable uploads")
+
+    async def write_resumable_part(
+        self, key: str, upload_id: str | None, *, part_number: int, offset: int, data: bytes
+    ) -> None:
+        """Store part ``part_number`` (1-based) starting at byte ``offset``; rewriting a part replaces it."""
+        raise NotImplementedError(f"{type(self).__name__} does not support resumable uploads")
+
+    async def finish_resumable(self, key: str, upload_id: str | None, *, size_bytes: int) -> ObjectInfo:
+        """Publish the assembled object at ``key`` without reading the parts back."""
+        raise NotImplementedError(f"{type(self).__name__} does not support resumable uploads")
+
+    async def abort_resumable(self, key: str, upload_id: str | None) -> None:
+        raise NotImplementedError(f"{type(self).__name__} does not support resumable uploads")
+
+    def stats(self) -> dict[str, float]:
+        """Backend-specific counters surfaced on ``/readyz``."""
+        return {}
+
+
+@dataclass
+class ExecutorStats:
+    """Counters for calls dispatched to a dedicated thread pool (loop thread only)."""
+
+    calls: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
 
 
 class LocalStorageBackend(StorageBackend):
@@ -60,11 +164,12 @@ class LocalStorageBackend(StorageBackend):
         return None
 
     async def health(self) -> None:
-        test_path = self.base_path / ".healthcheck"
-        test_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiofiles.open(test_path, "w") as handle:
-            await handle.write("ok")
-        await aiofiles_os.remove(test_path)
+        with timed(STORAGE_CALL_SECONDS, backend="local", operation="health"):
+            test_path = self.base_path / ".healthcheck"
+            test_path.parent.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(test_path, "w") as handle:
+                await handle.write("ok")
+            await aiofiles_os.remove(test_path)
 
     async def save_upload(
         self,
@@ -72,25 +177,87 @@ class LocalStorageBackend(StorageBackend):
         *,
         key: str,
         max_bytes: int,
+        sha256: str | None = None,
+    ) -> StorageArtifact:
+        """Copy the upload into the inbox off the event loop.
+
+        Each chunk is read from the spooled upload, hashed and written in one worker
+        thread call (SHA-256 releases the GIL, so concurrent uploads hash in parallel).
+        The file is written to a hidden temp name, preallocated when the size is known,
+        fsynced and renamed into place so readers never see a partial PDF.
+        """
+        with timed(STORAGE_CALL_SECONDS, backend="local", operation="save_upload"):
+            return await self._save_upload(upload, key=key, max_bytes=max_bytes, sha256=sha256)
+
+    async def fetch(self, path: str, *, scratch_dir: Path) -> Path:
+        # The inbox is already a local volume; hand out the stored file itself.
+        return Path(path)
+
+    async def save_bytes(self, key: str, data: bytes, *, content_type: str) -> str:
+        destination = self.base_path / key
+        with timed(STORAGE_CALL_SECONDS, backend="local", operation="save_bytes"):
+            await asyncio.to_thread(_write_atomic, destination, data)
+        return f"{self.base_uri.rstrip('/')}/{key}"
+
+    async def read_bytes(self, key: str, *, offset: int = 0, length: int | None = None) -> bytes:
+        with timed(STORAGE_CALL_SECONDS, backend="local", operation="read_bytes"):
+            return await asyncio.to_thread(_read_range, self.base_path / key, offset, length)
+
+    async def head(self, key: str) -> ObjectInfo:
+        path = self.base_path / key
+        size = (await asyncio.to_thread(path.stat)).st_size
+        return ObjectInfo(uri=f"{self.base_uri.rstrip('/')}/{key}", path=str(path), size_bytes=size)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread((self.base_path / key).unlink, missing_ok=True)
+
+    def _resumable_path(self, key: str) -> Path:
+        destination = self.base_path / key
+        return destination.with_name(f".{destination.name}.resumable")
+
+    async def begin_resumable(self, key: str, *, content_type: str) -> str | None:
+        path = self._resumable_path(key)
+        await asyncio.to_thread(lambda: _open_for_write(path, None).close())
+        return None
+
+    async def write_resumable_part(
+        self, key: str, upload_id: str | None, *, part_number: int, offset: int, data: bytes
+    ) -> None:
+        with timed(STORAGE_CALL_SECONDS, backend="local", operation="write_resumable_part"):
+            await asyncio.to_thread(_write_at, self._resumable_path(key), offset, data)
+
+    async def finish_resumable(self, key: str, upload_id: str | None, *, size_bytes: int) -> ObjectInfo:
+        destination = self.base_path / key
+        with timed(STORAGE_CALL_SECONDS, backend="local", operation="finish_resumable"):
+            await asyncio.to_thread(_publish_resumable, self._resumable_path(key), destination, size_bytes)
+        return ObjectInfo(uri=f"{self.base_uri.rstrip('/')}/{key}", path=str(destination), size_bytes=size_bytes)
+
+    async def abort_resumable(self, key: str, upload_id: str | None) -> None:
+        await asyncio.to_thread(self._resumable_path(key).unlink, missing_ok=True)
+
+    async def _save_upload(
+        self, upload: UploadFile, *, key: str, max_bytes: int, sha256: str | None
     ) -> StorageArtifact:
         destination = self.base_path / key
-        destination.parent.mkdir(parents=True, exist_ok=True)
-        sha256 = hashlib.sha256()
+        temp_path = destination.with_name(f".{destination.name}.{uuid4().hex}.part")
+        handle = await asyncio.to_thread(_open_for_write, temp_path, upload.size)
+        hasher = hashlib.sha256() if sha256 is None else None
         total = 0
 
-        async with aiofiles.open(destination, "wb") as buffer:
+        try:
+            await upload.seek(0)
             while True:
-                chunk = await upload.read(4 * 1024 * 1024)
-                if not chunk:
+                written = await asyncio.to_thread(
+                    _copy_chunk, upload.file, handle, hasher, max_bytes - total
+                )
+                if not written:
                     break
-                total += len(chunk)
-                if total > max_bytes:
-                    await upload.close()
-                    await buffer.close()
-                    await aiofiles_os.remove(destination)
-                    raise ValueError("PDF exceeds configured limit")
-                sha256.update(chunk)
-                await buffer.write(chunk)
+                total += written
+            await asyncio.to_thread(_finalize_write, handle, temp_path, destination, total)
+        except BaseException:
+            await asyncio.to_thread(_discard_write, handle, temp_path)
+            await upload.close()
+            raise
 
         await upload.seek(0)
 
@@ -98,10 +265,78 @@ class LocalStorageBackend(StorageBackend):
             uri=f"{self.base_uri.rstrip('/')}/{key}",
             path=str(destination),
             size_bytes=total,
-            sha256=sha256.hexdigest(),
+            sha256=hasher.hexdigest() if hasher is not None else sha256,
         )
 
 
+def _open_for_write(path: Path, expected_size: int | None) -> BinaryIO:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, "wb")
+    if expected_size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(handle.fileno(), 0, expected_size)
+        except OSError:  # pragma: no cover - filesystem without fallocate support
+            pass
+    return handle
+
+
+def _copy_chunk(source: BinaryIO, handle: BinaryIO, sha256: "hashlib._Hash | None", remaining: int) -> int:
+    chunk = source.read(LOCAL_CHUNK_SIZE)
+    if len(chunk) > remaining:
+        raise ValueError("PDF exceeds configured limit")
+    if sha256 is not None:
+        sha256.update(chunk)
+    handle.write(chunk)
+    return len(chunk)
+
+
+def _finalize_write(handle: BinaryIO, temp_path: Path, destination: Path, size: int) -> None:
+    # Preallocation may have reserved more than was received (client-declared size).
+    handle.truncate(size)
+    handle.flush()
+    os.fsync(handle.fileno())
+    handle.close()
+    os.replace(temp_path, destination)
+
+
+def _discard_write(handle: BinaryIO, temp_path: Path) -> None:
+    handle.close()
+    temp_path.unlink(missing_ok=True)
+
+
+def _write_atomic(destination: Path, data: bytes) -> None:
+    temp_path = destination.with_name(f".{destination.name}.{uuid4().hex}.part")
+    handle = _open_for_write(temp_path, len(data))
+    try:
+        handle.write(data)
+        _finalize_write(handle, temp_path, destination, len(data))
+    except BaseException:
+        _discard_write(handle, temp_path)
+        raise
+
+
+def _write_at(path: Path, offset: int, data: bytes) -> None:
+    with open(path, "r+b") as handle:
+        handle.seek(offset)
+        handle.write(data)
+        # Drop whatever a longer, abandoned attempt at this part left behind.
+        handle.truncate(offset + len(data))
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def _publish_resumable(temp_path: Path, destination: Path, size: int) -> None:
+    if temp_path.stat().st_size != size:
+        raise ValueError("Resumable upload is incomplete")
+    os.replace(temp_path, destination)
+
+
+def _read_range(path: Path, offset: int, length: int | None) -> bytes:
+    with path.open("rb") as handle:
+        handle.seek(offset)
+        return handle.read() if length is None else handle.read(length)
+
+
 class S3StorageBackend(StorageBackend):
     """Store PDFs in S3-compatible object storage (R2, MinIO, etc.)."""
 
@@ -112,21 +347,212 @@ class S3StorageBackend(StorageBackend):
         prefix: str,
         region: str | None = None,
         endpoint_url: str | None = None,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        max_pool_connections: int = 16,
     ) -> None:
+        if part_size < S3_MIN_PART_SIZE:
+            raise ValueError("S3 multipart part size must be at least 5 MiB")
         self.bucket = bucket
         self.prefix = prefix.strip("/")
-        self._client = boto3.client("s3", region_name=region, endpoint_url=endpoint_url)
+        self.part_size = part_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pool_connections = max(1, max_pool_connections)
+        # One thread per pooled connection: boto3 calls block, so more threads than
+        # connections would only queue inside urllib3 where the wait is invisible.
+        self._client = boto3.client(
+            "s3",
+            region_name=region,
+            endpoint_url=endpoint_url,
+            config=BotoConfig(max_pool_connections=self.max_pool_connections, retries={"mode": "standard"}),
+        )
+        self._executor: ThreadPoolExecutor | None = None
+        self._stats = ExecutorStats()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_pool_connections, thread_name_prefix="s3")
+        return self._executor
+
+    async def _call(self, fn: Callable[..., Any], /, **kwargs: Any) -> Any:
+        """Run a blocking boto3 call on the S3 pool, tracking queueing and concurrency."""
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        started: list[float] = []
+
+        def run() -> Any:
+            started.append(time.perf_counter())
+            return fn(**kwargs)
+
+        stats = self._stats
+        stats.calls += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        S3_INFLIGHT_CALLS.inc()
+        try:
+            return await loop.run_in_executor(self.executor, run)
+        finally:
+            finished = time.perf_counter()
+            stats.in_flight -= 1
+            S3_INFLIGHT_CALLS.dec()
+            STORAGE_CALL_SECONDS.labels(backend="s3", operation=fn.__name__).observe(finished - submitted)
+            if started:
+                waited = started[0] - submitted
+                stats.wait_seconds_total += waited
+                stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+                S3_POOL_WAIT_SECONDS.observe(waited)
+
+    def stats(self) -> dict[str, float]:
+        return {f"s3_{name}": value for name, value in asdict(self._stats).items()}
 
     async def connect(self) -> None:
-        await asyncio.to_thread(self._client.head_bucket, Bucket=self.bucket)
+        await self._call(self._client.head_bucket, Bucket=self.bucket)
         LOGGER.info("Connected to bucket %s", self.bucket)
 
     async def close(self) -> None:
-        return None
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True)
 
     async def health(self) -> None:
-        await asyncio.to_thread(
-            self._client.list_objects_v2, Bucket=self.bucket, MaxKeys=1, Prefix=self.prefix
+        await self._call(self._client.list_objects_v2, Bucket=self.bucket, MaxKeys=1, Prefix=self.prefix)
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}".lstrip("/")
+
+    async def fetch(self, path: str, *, scratch_dir: Path) -> Path:
+        scratch_dir.mkdir(parents=True, exist_ok=True)
+        destination = scratch_dir / f"{uuid4().hex}-{Path(path).name}"
+        await self._call(self._client.download_file, Bucket=self.bucket, Key=path, Filename=str(destination))
+        return destination
+
+    async def save_bytes(self, key: str, data: bytes, *, content_type: str) -> str:
+        object_key = self.object_key(key)
+        await self._call(
+            self._client.put_object, Bucket=self.bucket, Key=object_key, Body=data, ContentType=content_type
+        )
+        return f"s3://{self.bucket}/{object_key}"
+
+    async def read_bytes(self, key: str, *, offset: int = 0, length: int | None = None) -> bytes:
+        request: dict[str, Any] = {"Bucket": self.bucket, "Key": self.object_key(key)}
+        if offset or length is not None:
+            end = "" if length is None else offset + length - 1
+            request["Range"] = f"bytes={offset}-{end}"
+        client = self._client
+
+        # Named after the boto3 call so it shows up as such in STORAGE_CALL_SECONDS;
+        # the body is read on the pool thread too since StreamingBody blocks.
+        def get_object(**kwargs: Any) -> bytes:
+            return client.get_object(**kwargs)["Body"].read()
+
+        try:
+            return await self._call(get_object, **request)
+        except ClientError as exc:
+            if _is_missing(exc):
+                raise FileNotFoundError(key) from exc
+            raise
+
+    async def head(self, key: str) -> ObjectInfo:
+        object_key = self.object_key(key)
+        try:
+            response = await self._call(
+                self._client.head_object, Bucket=self.bucket, Key=object_key, ChecksumMode="ENABLED"
+            )
+        except ClientError as exc:
+            if _is_missing(exc):
+                raise FileNotFoundError(key) from exc
+            raise
+        checksum = response.get("ChecksumSHA256")
+        return ObjectInfo(
+            uri=f"s3://{self.bucket}/{object_key}",
+            path=object_key,
+            size_bytes=int(response["ContentLength"]),
+            # Multipart objects carry a checksum of part checksums ("...-N"), not of the body.
+            sha256=base64.b64decode(checksum).hex() if checksum and "-" not in checksum else None,
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._call(self._client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+    resumable_min_part_size = S3_MIN_PART_SIZE
+
+    async def begin_resumable(self, key: str, *, content_type: str) -> str | None:
+        response = await self._call(
+            self._client.create_multipart_upload, Bucket=self.bucket, Key=self.object_key(key), ContentType=content_type
+        )
+        return response["UploadId"]
+
+    async def write_resumable_part(
+        self, key: str, upload_id: str | None, *, part_number: int, offset: int, data: bytes
+    ) -> None:
+        await self._call(
+            self._client.upload_part,
+            Bucket=self.bucket,
+            Key=self.object_key(key),
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+
+    async def finish_resumable(self, key: str, upload_id: str | None, *, size_bytes: int) -> ObjectInfo:
+        """Complete the multipart upload from S3's own part list (ListParts)."""
+        object_key = self.object_key(key)
+        parts: list[dict[str, Any]] = []
+        marker = 0
+        while True:
+            page = await self._call(
+                self._client.list_parts, Bucket=self.bucket, Key=object_key, UploadId=upload_id, PartNumberMarker=marker
+            )
+            parts.extend({"PartNumber": part["PartNumber"], "ETag": part["ETag"]} for part in page.get("Parts", []))
+            if not page.get("IsTruncated"):
+                break
+            marker = page["NextPartNumberMarker"]
+        await self._call(
+            self._client.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        return ObjectInfo(uri=f"s3://{self.bucket}/{object_key}", path=object_key, size_bytes=size_bytes)
+
+    async def abort_resumable(self, key: str, upload_id: str | None) -> None:
+        await self._call(
+            self._client.abort_multipart_upload, Bucket=self.bucket, Key=self.object_key(key), UploadId=upload_id
+        )
+
+    async def presign_upload(
+        self,
+        key: str,
+        *,
+        size_bytes: int,
+        sha256: str,
+        content_type: str,
+        expires_in: int,
+    ) -> PresignedUpload:
+        """Presign a single PUT bound to the declared size and SHA-256.
+
+        The checksum is part of the signature, so S3 itself rejects a body that does
+        not hash to ``sha256``.
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        # Signing is local computation; no need for the S3 pool.
+        url = self._client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "ContentType": content_type,
+                "ContentLength": size_bytes,
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=expires_in,
+        )
+        return PresignedUpload(
+            url=url,
+            headers={"Content-Type": content_type, "x-amz-checksum-sha256": checksum},
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=expires_in),
         )
 
     async def save_upload(
@@ -135,40 +561,226 @@ class S3StorageBackend(StorageBackend):
         *,
         key: str,
         max_bytes: int,
+        sha256: str | None = None,
     ) -> StorageArtifact:
-        buffer = io.BytesIO()
-        sha256 = hashlib.sha256()
+        """Stream the upload to S3 one part at a time.
+
+        Bodies that fit in a single part go through ``put_object``; larger ones use a
+        multipart upload with at most ``max_concurrency`` parts in flight, so peak memory
+        is bounded by a few part sizes rather than the document size.
+        """
+        object_key = self.object_key(key)
+        content_type = upload.content_type or "application/pdf"
+        hasher = hashlib.sha256() if sha256 is None else None
         total = 0
+        buffer = bytearray()
+        multipart: _MultipartWriter | None = None
 
-        while True:
-            chunk = await upload.read(4 * 1024 * 1024)
-            if not chunk:
-                break
-            total += len(chunk)
-            if total > max_bytes:
-                raise ValueError("PDF exceeds configured limit")
-            sha256.update(chunk)
-            buffer.write(chunk)
+        try:
+            while True:
+                chunk = await upload.read(self.part_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise ValueError("PDF exceeds configured limit")
+                buffer += chunk
+                if len(buffer) < self.part_size:
+                    continue
+                part = bytes(buffer)
+                buffer.clear()
+                if hasher is not None:
+                    await asyncio.to_thread(hasher.update, part)
+                if multipart is None:
+                    multipart = await _MultipartWriter.start(
+                        self._call,
+                        self._client,
+                        bucket=self.bucket,
+                        key=object_key,
+                        content_type=content_type,
+                        max_concurrency=self.max_concurrency,
+                    )
+                await multipart.submit(part)
+
+            tail = bytes(buffer)
+            buffer.clear()
+            if hasher is not None:
+                await asyncio.to_thread(hasher.update, tail)
+            if multipart is None:
+                await self._call(
+                    self._client.put_object,
+                    Bucket=self.bucket,
+                    Key=object_key,
+                    Body=tail,
+                    ContentType=content_type,
+                )
+            else:
+                if tail:
+                    await multipart.submit(tail)
+                await multipart.complete()
+        except BaseException:
+            if multipart is not None:
+                await multipart.abort()
+            await upload.close()
+            raise
 
         await upload.seek(0)
 
-        object_key = f"{self.prefix}/{key}".lstrip("/")
-        payload = buffer.getvalue()
-
-        await asyncio.to_thread(
-            self._client.put_object,
-            Bucket=self.bucket,
-            Key=object_key,
-            Body=payload,
-            ContentType=upload.content_type or "application/pdf",
-        )
-
         return StorageArtifact(
             uri=f"s3://{self.bucket}/{object_key}",
             path=object_key,
             size_bytes=total,
-            sha256=sha256.hexdigest(),
+            sha256=hasher.hexdigest() if hasher is not None else sha256,
+        )
+
+
+class _MultipartWriter:
+    """Uploads parts of one S3 multipart upload with bounded parallelism."""
+
+    def __init__(
+        self,
+        call: Callable[..., Awaitable[Any]],
+        client,
+        *,
+        bucket: str,
+        key: str,
+        upload_id: str,
+        max_concurrency: int,
+    ) -> None:
+        self._call = call
+        self._client = client
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = upload_id
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending: set[asyncio.Task] = set()
+        self._parts: list[dict[str, object]] = []
+        self._next_part = 1
+        self._error: BaseException | None = None
+
+    @classmethod
+    async def start(
+        cls,
+        call: Callable[..., Awaitable[Any]],
+        client,
+        *,
+        bucket: str,
+        key: str,
+        content_type: str,
+        max_concurrency: int,
+    ) -> "_MultipartWriter":
+        response = await call(client.create_multipart_upload, Bucket=bucket, Key=key, ContentType=content_type)
+        return cls(call, client, bucket=bucket, key=key, upload_id=response["UploadId"], max_concurrency=max_concurrency)
+
+    async def submit(self, body: bytes) -> None:
+        """Start uploading ``body`` as the next part; waits while all slots are busy."""
+        await self._slots.acquire()
+        self._raise_failed()
+        part_number = self._next_part
+        self._next_part += 1
+        task = asyncio.create_task(self._upload_part(part_number, body))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _upload_part(self, part_number: int, body: bytes) -> None:
+        try:
+            response = await self._call(
+                self._client.upload_part,
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        except Exception as exc:
+            self._error = self._error or exc
+        finally:
+            self._slots.release()
+
+    def _raise_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    async def complete(self) -> None:
+        if self._pending:
+            await asyncio.gather(*self._pending)
+        self._raise_failed()
+        parts = sorted(self._parts, key=lambda part: part["PartNumber"])
+        await self._call(
+            self._client.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    async def abort(self) -> None:
+        for task in list(self._pending):
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        try:
+            await self._call(
+                self._client.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+            )
+        except Exception:  # pragma: no cover - best effort cleanup
+            LOGGER.exception("Failed to abort multipart upload %s for %s", self.upload_id, self.key)
+
+
+def _is_missing(exc: ClientError) -> bool:
+    return exc.response.get("Error", {}).get("Code") in {"NoSuchKey", "NotFound", "404"}
+
+
+def create_storage_backend(settings: Settings, override: StorageBackend | None = None) -> StorageBackend:
+    if override:
+        return override
+    if settings.storage_mode == "s3":
+        if not settings.s3_bucket:
+            raise ValueError("S3 bucket must be configured for storage_mode=s3")
+        return S3StorageBackend(
+            bucket=settings.s3_bucket,
+            prefix=settings.storage_prefix,
+            region=settings.s3_region,
+            endpoint_url=settings.s3_endpoint_url,
+            part_size=settings.s3_part_size_mb * 1024 * 1024,
+            max_concurrency=settings.s3_upload_concurrency,
+            max_pool_connections=settings.s3_max_pool_connections,
         )
+    return LocalStorageBackend(base_path=settings.storage_root, base_uri=settings.storage_base_uri)
+
+
+async def compute_upload_digest(upload: UploadFile, *, max_bytes: int) -> tuple[str, int]:
+    """Hash the spooled upload without touching storage and rewind it for the real write."""
+    digest, total = await asyncio.to_thread(_hash_file, upload.file, max_bytes)
+    await upload.seek(0)
+    return digest, total
+
+
+async def compute_stored_digest(storage: StorageBackend, key: str, *, size_bytes: int) -> str:
+    """Hash an object already in storage with ranged reads, one chunk in memory at a time."""
+    sha256 = hashlib.sha256()
+    for offset in range(0, size_bytes, STORED_HASH_CHUNK_SIZE):
+        chunk = await storage.read_bytes(key, offset=offset, length=min(STORED_HASH_CHUNK_SIZE, size_bytes - offset))
+        await asyncio.to_thread(sha256.update, chunk)
+    return sha256.hexdigest()
+
+
+def _hash_file(handle, max_bytes: int) -> tuple[str, int]:
+    sha256 = hashlib.sha256()
+    total = 0
+    handle.seek(0)
+    while True:
+        chunk = handle.read(LOCAL_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise ValueError("PDF exceeds configured limit")
+        sha256.update(chunk)
+    return sha256.hexdigest(), total
 
 
 def build_storage_key(filename: str, *, prefix: str, task_id: str, timestamp: datetime) -> str:
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from .models import QueueTask, TaskRecord
+from .queue import Lease, QueueBackend
+from .repository import TaskRepository
+
+LOGGER = logging.getLogger(__name__)
+
+MESSAGE_FIELD = b"task"
+
+
+class StreamTaskQueue(QueueBackend):
+    """Queue backend on a Redis Stream consumed through one consumer group.
+
+    Workers are stream consumers: XREADGROUP hands out entries, XACK+XDEL finishes
+    them, XPENDING gives exact in-flight counts and XAUTOCLAIM recovers entries held
+    by dead consumers. Entries are served strictly in arrival order; ``priority`` is
+    carried in the payload but not used for ordering on this backend.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_name: str,
+        redis_url: str | None = None,
+        redis_client: Redis | None = None,
+        group: str = "ocr-workers",
+        retention_seconds: int = 7 * 24 * 60 * 60,
+        lease_seconds: float = 300,
+    ) -> None:
+        super().__init__(queue_name=queue_name, redis_url=redis_url, redis_client=redis_client)
+        self.stream_key = f"{queue_name}:stream"
+        self.group = group
+        self.retention_seconds = retention_seconds
+        # Idle time after which XAUTOCLAIM treats a pending entry's consumer as dead.
+        self.lease_seconds = lease_seconds
+
+    async def _prepare(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def _min_id(self) -> str:
+        return f"{int((time.time() - self.retention_seconds) * 1000)}-0"
+
+    async def enqueue(
+        self,
+        payload: QueueTask,
+        *,
+        record: TaskRecord | None = None,
+        repo: TaskRepository | None = None,
+    ) -> int:
+        """XADD the task (and write its record hash) in one MULTI round trip; returns the depth."""
+        message = orjson.dumps(payload.model_dump(mode="json"))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if record is not None:
+                assert repo is not None, "repo required to store the task record"
+                repo.stage_save(pipe, record)
+            pipe.xadd(self.stream_key, {MESSAGE_FIELD: message}, minid=self._min_id(), approximate=True)
+            pipe.xlen(self.stream_key)
+            pipe.xpending(self.stream_key, self.group)
+            *_, length, pending = await pipe.execute()
+        depth = int(length) - int(pending["pending"])
+        LOGGER.info("Queued task %s queue_depth=%d", payload.task_id, depth)
+        return depth
+
+    async def claim_batch(
+        self,
+        worker_id: str,
+        *,
+        count: int,
+        lease_seconds: float,
+        timeout: float = 0,
+    ) -> list[Lease]:
+        """Read up to ``count`` new entries for ``worker_id``, blocking up to ``timeout`` seconds."""
+        response = await self.redis.xreadgroup(
+            self.group,
+            worker_id,
+            {self.stream_key: ">"},
+            count=count,
+            block=int(timeout * 1000) if timeout > 0 else None,
+        )
+        deadline_ms = int((time.time() + lease_seconds) * 1000)
+        leases = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                message = fields[MESSAGE_FIELD]
+                leases.append(
+                    Lease(
+                        task=QueueTask.model_validate(orjson.loads(message)),
+                        message=message,
+                        worker_id=worker_id,
+                        deadline_ms=deadline_ms,
+                        entry_id=entry_id,
+                    )
+                )
+        return leases
+
+    async def claim(
+        self,
+        worker_id: str,
+        *,
+        lease_seconds: float,
+        timeout: float = 0,
+        poll_interval: float = 0.5,
+    ) -> Lease | None:
+        leases = await self.claim_batch(worker_id, count=1, lease_seconds=lease_seconds, timeout=timeout)
+        return leases[0] if leases else None
+
+    async def dequeue(self, timeout: float = 0) -> QueueTask | None:
+        lease = await self.claim("dequeue", lease_seconds=0, timeout=timeout)
+        if lease is None:
+            return None
+        await self.ack(lease)
+        return lease.task
+
+    async def heartbeat(self, lease: Lease, *, lease_seconds: float) -> bool:
+        """Reset the entry's idle time if ``lease.worker_id`` still owns it."""
+        owned = await self.redis.xpending_range(
+            self.stream_key,
+            self.group,
+            min=lease.entry_id,
+            max=lease.entry_id,
+            count=1,
+            consumername=lease.worker_id,
+        )
+        if not owned:
+            return False
+        await self.redis.xclaim(
+            self.stream_key, self.group, lease.worker_id, min_idle_time=0, message_ids=[lease.entry_id], justid=True
+        )
+        lease.deadline_ms = int((time.time() + lease_seconds) * 1000)
+        return True
+
+    async def ack(self, lease: Lease) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream_key, self.group, lease.entry_id)
+            pipe.xdel(self.stream_key, lease.entry_id)
+            await pipe.execute()
+
+    async def reap_expired(self, *, repo: TaskRepository | None = None, limit: int = 100) -> list[QueueTask]:
+        """XAUTOCLAIM entries idle longer than ``lease_seconds`` and re-add them to the stream.
+
+        Each entry is re-added and acknowledged in one MULTI, so a reaper crash cannot
+        lose it; ``retry_count`` is bumped through ``repo`` when given. Consumers left
+        behind by exited workers are dropped afterwards.
+        """
+        _, entries, deleted = await self.redis.xautoclaim(
+            self.stream_key,
+            self.group,
+            "reaper",
+            min_idle_time=int(self.lease_seconds * 1000),
+            count=limit,
+        )
+        if deleted:
+            LOGGER.warning("Dropped %d pending entries trimmed by retention", len(deleted))
+        tasks: list[QueueTask] = []
+        for entry_id, fields in entries:
+            message = fields[MESSAGE_FIELD]
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.xadd(self.stream_key, {MESSAGE_FIELD: message})
+                pipe.xack(self.stream_key, self.group, entry_id)
+                pipe.xdel(self.stream_key, entry_id)
+                await pipe.execute()
+            task = QueueTask.model_validate(orjson.loads(message))
+            LOGGER.warning("Lease expired for task %s; requeued", task.task_id)
+            if repo is not None:
+                await repo.increment_retry(task.task_id)
+            tasks.append(task)
+        await self._prune_consumers()
+        return tasks
+
+    async def _prune_consumers(self) -> int:
+        """XGROUP DELCONSUMER every consumer idle past the lease that holds no entries.
+
+        Worker ids are ``hostname-pid``, so each restart leaves a consumer behind. One
+        with nothing pending owns no state, and a live worker polls well inside the lease
+        (if it was merely quiet, its next XREADGROUP re-creates it).
+        """
+        consumers = await self.redis.xinfo_consumers(self.stream_key, self.group)
+        idle_ms = int(self.lease_seconds * 1000)
+        removed = 0
+        for consumer in consumers:
+            if int(consumer["pending"]) or int(consumer["idle"]) < idle_ms:
+                continue
+            dropped = await self.redis.xgroup_delconsumer(self.stream_key, self.group, consumer["name"])
+            if dropped:
+                LOGGER.warning("Consumer %r claimed %d entries while being removed", consumer["name"], dropped)
+            removed += 1
+        if removed:
+            LOGGER.info("Removed %d idle stream consumers", removed)
+        return removed
+
+    async def depth(self, priority: int | None = None) -> int:
+        # Acked entries are deleted, so the stream holds waiting plus pending entries.
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xlen(self.stream_key)
+            pipe.xpending(self.stream_key, self.group)
+            length, pending = await pipe.execute()
+        return int(length) - int(pending["pending"])
+
+    async def depth_by_priority(self) -> dict[int, int]:
+        return {}
+
+    async def depth_by_tier(self) -> dict[str, int]:
+        # One stream, no size tiers.
+        return {}
+
+    async def in_flight(self) -> int:
+        pending: dict[str, Any] = await self.redis.xpending(self.stream_key, self.group)
+        return int(pending["pending"])
+
+    async def admission_snapshot(self, submitter: str | None) -> tuple[int, int]:
+        # Per-submitter depth is not tracked on the stream backend.
+        return await self.depth(), 0
+
+    async def oldest_enqueued_ms(self) -> int | None:
+        groups = await self.redis.xinfo_groups(self.stream_key)
+        last_delivered = next(
+            (group["last-delivered-id"] for group in groups if group["name"] in (self.group, self.group.encode())),
+            b"0-0",
+        )
+        if isinstance(last_delivered, bytes):
+            last_delivered = last_delivered.decode()
+        head = await self.redis.xrange(self.stream_key, min=f"({last_delivered}", count=1)
+        if not head:
+            return None
+        entry_id = head[0][0]
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        return int(entry_id.split("-", 1)[0])
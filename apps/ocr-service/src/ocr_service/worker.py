@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import os
+import signal
+import socket
+from pathlib import Path
+from typing import Any, Callable
+
+from .config import Settings, get_settings
+from .models import QueueTask, TaskStatus
+from .queue import Lease, QueueBackend, create_queue
+from .repository import TaskRepository, create_repository
+from .results import create_result_store
+from .retries import create_retry_queue
+from .shards import shard_task_id
+from .storage import StorageBackend, create_storage_backend
+
+LOGGER = logging.getLogger(__name__)
+
+# Blocking callable that turns a local PDF path into the extraction JSON document,
+# e.g. scripts/pdf_extract.extract_pdf_to_json. Runs in a worker thread. Shards of a
+# fanned-out document pass ``pages=(first, last)`` (1-based, inclusive) as well.
+ExtractionEngine = Callable[..., dict[str, Any]]
+
+
+def load_engine(spec: str | None) -> ExtractionEngine:
+    """Resolve a ``module:attribute`` spec to an extraction callable."""
+    if not spec:
+        raise ValueError("OCR_SERVICE_WORKER_ENGINE is not set; point it at a 'module:function' extraction engine")
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Engine spec must look like 'module:function', got {spec!r}")
+    try:
+        engine = getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError) as exc:
+        raise ValueError(f"Engine {spec!r} cannot be loaded in this environment: {exc}") from exc
+    if not callable(engine):
+        raise ValueError(f"Engine {spec!r} is not callable")
+    return engine
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class OCRWorker:
+    """Consumes leased QueueTasks, runs the extraction engine and stores the results.
+
+    Up to ``concurrency`` extractions run at once; ``prefetch`` further tasks are
+    claimed early so their PDFs download while the engine is busy.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue: QueueBackend,
+        repo: TaskRepository,
+        storage: StorageBackend,
+        engine: ExtractionEngine,
+        settings: Settings,
+        worker_id: str | None = None,
+    ) -> None:
+        self.queue = queue
+        self.repo = repo
+        self.storage = storage
+        self.results = create_result_store(storage, settings)
+        self.retries = create_retry_queue(queue.redis, settings)
+        self.engine = engine
+        self.settings = settings
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = settings.task_lease_seconds
+        self.scratch_dir = settings.worker_scratch_dir / self.worker_id
+        self._claim_slots = asyncio.Semaphore(settings.worker_concurrency + settings.worker_prefetch)
+        self._engine_slots = asyncio.Semaphore(settings.worker_concurrency)
+        self._jobs: set[asyncio.Task] = set()
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        stop = stop or asyncio.Event()
+        reaper = asyncio.create_task(self._reap_forever(stop), name="ocr-lease-reaper")
+        mover = asyncio.create_task(self._promote_forever(stop), name="ocr-retry-mover")
+        LOGGER.info(
+            "Worker %s started concurrency=%d prefetch=%d",
+            self.worker_id,
+            self.settings.worker_concurrency,
+            self.settings.worker_prefetch,
+        )
+        try:
+            while not stop.is_set():
+                await self._claim_slots.acquire()
+                lease: Lease | None = None
+                try:
+                    lease = await self.queue.claim(
+                        self.worker_id,
+                        lease_seconds=self.lease_seconds,
+                        timeout=self.settings.worker_poll_interval_seconds,
+                        poll_interval=min(0.5, self.settings.worker_poll_interval_seconds),
+                    )
+                except Exception:
+                    LOGGER.exception("Claim failed; backing off")
+                    await asyncio.sleep(self.settings.worker_poll_interval_seconds)
+                finally:
+                    if lease is None:
+                        self._claim_slots.release()
+                if lease is None:
+                    continue
+                job = asyncio.create_task(self._process(lease), name=f"ocr-task-{lease.task.task_id}")
+                self._jobs.add(job)
+                job.add_done_callback(self._jobs.discard)
+        finally:
+            reaper.cancel()
+            mover.cancel()
+            await asyncio.gather(reaper, mover, return_exceptions=True)
+            if self._jobs:
+                await asyncio.gather(*self._jobs, return_exceptions=True)
+            LOGGER.info("Worker %s stopped", self.worker_id)
+
+    async def _process(self, lease: Lease) -> None:
+        task = lease.task
+        heartbeat = asyncio.create_task(self._heartbeat(lease))
+        pdf_path: Path | None = None
+        try:
+            # Cancelled tasks stay in the queue as tombstones; drop them here.
+            if await self.repo.is_cancelled(task.task_id):
+                LOGGER.info("Skipping cancelled task %s", task.task_id)
+                return
+            pdf_path = await self.storage.fetch(task.storage_path, scratch_dir=self.scratch_dir)
+            async with self._engine_slots:
+                event = await self.repo.update_status(task.task_id, TaskStatus.processing, worker_id=self.worker_id)
+                if event is not None and event.status == TaskStatus.cancelled:
+                    LOGGER.info("Skipping task %s cancelled while waiting for the engine", task.task_id)
+                    return
+                pages = {} if task.first_page is None else {"pages": (task.first_page, task.last_page)}
+                document = await asyncio.to_thread(self.engine, str(pdf_path), **pages)
+            result_uri = await self.results.save(task.task_id, document)
+            event = await self.repo.update_status(
+                task.task_id, TaskStatus.completed, result_uri=result_uri, worker_id=self.worker_id
+            )
+            if event is not None and event.status == TaskStatus.cancelled:
+                LOGGER.info("Task %s was cancelled while running", task.task_id)
+                return
+            LOGGER.info("Completed task %s result=%s", task.task_id, result_uri)
+        except Exception as exc:
+            LOGGER.exception("Task %s failed", task.task_id)
+            await self._retry_or_fail(task, str(exc) or type(exc).__name__)
+        else:
+            if task.parent_id is not None:
+                await self._complete_shard(task)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            if pdf_path is not None and pdf_path.is_relative_to(self.scratch_dir):
+                pdf_path.unlink(missing_ok=True)
+            await self.queue.ack(lease)
+            self._claim_slots.release()
+
+    async def _retry_or_fail(self, task: QueueTask, error: str) -> None:
+        """Schedule another attempt after a backoff, or dead-letter the task once it is out of retries.
+
+        ``retry_count`` also counts attempts lost with an expired lease. A shard only
+        fails its parent when it is dead-lettered.
+        """
+        policy = self.retries.policy
+        event = await self.repo.get_event(task.task_id)
+        if event is not None and event.status == TaskStatus.cancelled:
+            return
+        retries = event.retry_count if event is not None else policy.max_retries
+        if retries < policy.max_retries:
+            retry_at = await self.retries.schedule(task, delay_seconds=policy.delay(retries + 1))
+            await self.repo.update_status(
+                task.task_id,
+                TaskStatus.queued,
+                error_message=error,
+                retry_increment=1,
+                retry_at=retry_at,
+                worker_id=self.worker_id,
+            )
+            LOGGER.warning("Task %s will be retried at %s (retry %d)", task.task_id, retry_at.isoformat(), retries + 1)
+            return
+        await self.retries.dead_letter(task, error=error, retry_count=retries)
+        await self.repo.update_status(task.task_id, TaskStatus.failed, error_message=error, worker_id=self.worker_id)
+        if task.parent_id is not None:
+            await self.repo.update_status(
+                task.parent_id,
+                TaskStatus.failed,
+                error_message=f"Shard {task.shard_index} failed: {error}",
+                worker_id=self.worker_id,
+            )
+
+    async def _complete_shard(self, task: QueueTask) -> None:
+        """Count a finished shard; whoever finishes the last one assembles the document."""
+        parent_id = task.parent_id
+        completed = await self.repo.complete_shard(parent_id, task.shard_index)
+        if completed is None or completed < task.shard_count:
+            return
+        try:
+            result_uri = await self.results.assemble(
+                parent_id, [shard_task_id(parent_id, index) for index in range(task.shard_count)]
+            )
+        except Exception as exc:
+            LOGGER.exception("Assembling task %s failed", parent_id)
+            await self.repo.update_status(
+                parent_id,
+                TaskStatus.failed,
+                error_message=f"Assembly failed: {str(exc) or type(exc).__name__}",
+                worker_id=self.worker_id,
+            )
+            return
+        await self.repo.update_status(parent_id, TaskStatus.completed, result_uri=result_uri, worker_id=self.worker_id)
+        LOGGER.info("Completed task %s from %d shards result=%s", parent_id, task.shard_count, result_uri)
+
+    async def _heartbeat(self, lease: Lease) -> None:
+        interval = max(1.0, self.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            if not await self.queue.heartbeat(lease, lease_seconds=self.lease_seconds):
+                LOGGER.warning("Lost lease on task %s; it may be processed again", lease.task.task_id)
+                return
+
+    async def _promote_forever(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                await self.retries.promote_due(self.queue)
+            except Exception:  # pragma: no cover - keep promoting after transient Redis errors
+                LOGGER.exception("Retry mover failed")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.settings.worker_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _reap_forever(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                await self.queue.reap_expired(repo=self.repo)
+            except Exception:  # pragma: no cover - keep reaping after transient Redis errors
+                LOGGER.exception("Lease reaper failed")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.settings.worker_reap_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_worker(
+    settings: Settings,
+    *,
+    redis_client=None,
+    storage_backend: StorageBackend | None = None,
+    engine: ExtractionEngine | None = None,
+    stop: asyncio.Event | None = None,
+) -> None:
+    engine = engine or load_engine(settings.worker_engine)
+    queue = create_queue(settings, redis_client=redis_client)
+    await queue.connect()
+    repo = create_repository(queue.redis, settings)
+    await repo.convert_legacy_records()
+    storage = create_storage_backend(settings, override=storage_backend)
+    await storage.connect()
+    worker = OCRWorker(
+        queue=queue,
+        repo=repo,
+        storage=storage,
+        engine=engine,
+        settings=settings,
+    )
+    try:
+        await worker.run(stop)
+    finally:
+        await storage.close()
+        await queue.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    async def serve() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await run_worker(get_settings(), stop=stop)
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 from pathlib import Path
+from urllib.parse import urlparse
 
+import boto3
 import fakeredis.aioredis
+import httpx
 import pytest
+import requests
+from asgi_lifespan import LifespanManager
 from fastapi.testclient import TestClient
+from moto import mock_aws
 
 from ocr_service.app import create_app
 from ocr_service.config import Settings
-from ocr_service.storage import LocalStorageBackend
+from ocr_service.models import TaskStatus
+from ocr_service.storage import LocalStorageBackend, S3StorageBackend
 
 
-@pytest.fixture()
-def client(tmp_path: Path):
+def build_app(tmp_path: Path, **overrides):
     redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
     storage_root = tmp_path / "inbox"
     settings = Settings(
@@ -21,10 +29,15 @@ def client(tmp_path: Path):
         storage_root=storage_root,
         storage_prefix="tests",
         storage_mode="local",
+        **overrides,
     )
     storage = LocalStorageBackend(base_path=storage_root, base_uri="file://tests")
-    app = create_app(settings=settings, redis_client=redis, storage_backend=storage)
-    with TestClient(app) as test_client:
+    return create_app(settings=settings, redis_client=redis, storage_backend=storage)
+
+
+@pytest.fixture()
+def client(tmp_path: Path):
+    with TestClient(build_app(tmp_path)) as test_client:
         yield test_client
 
 
@@ -42,12 +55,20 @@ def test_upload_and_status_flow(client):
     assert payload["status"] == "queued"
     assert payload["received_bytes"] == len(pdf_bytes)
     assert payload["queue_depth"] == 1
+    assert payload["tier"] == "small"
+    assert payload["queue_depth_by_tier"] == {"small": 1, "medium": 0, "large": 0}
 
     status_response = test_client.get(f"/status/{task_id}")
     assert status_response.status_code == 200
     status_payload = status_response.json()
     assert status_payload["task"]["filename"] == "unit.pdf"
+    assert status_payload["task"]["pdf_version"] == "1.4"
+    assert status_payload["task"]["linearized"] is False
+    assert status_payload["task"]["page_count"] is None
     assert status_payload["queue_depth"] == 1
+    assert status_payload["queue_depth_by_tier"]["small"] == 1
+    assert status_payload["task"]["tier"] == "small"
+    assert [entry["status"] for entry in status_payload["history"]] == ["queued"]
 
 
 def test_rejects_non_pdf(client):
@@ -66,3 +87,576 @@ def test_health_endpoints(client):
     assert resp.status_code == 200
     ready = test_client.get("/readyz")
     assert ready.status_code == 200
+
+
+def test_duplicate_upload_attaches_to_existing_task(client):
+    test_client = client
+    pdf_bytes = b"%PDF-1.4 watchlist\n%%EOF"
+    first = test_client.post(
+        "/upload",
+        files={"file": ("iuu-list.pdf", pdf_bytes, "application/pdf")},
+        headers={"X-Submitter": "sme-a@example.org"},
+    )
+    second = test_client.post(
+        "/upload",
+        files={"file": ("iuu-list-copy.pdf", pdf_bytes, "application/pdf")},
+        headers={"X-Submitter": "sme-b@example.org"},
+    )
+    assert first.status_code == 202
+    assert second.status_code == 202
+    assert first.json()["deduplicated"] is False
+    payload = second.json()
+    assert payload["deduplicated"] is True
+    assert payload["task_id"] == first.json()["task_id"]
+    assert payload["queue_depth"] == 1
+
+    storage_root = client.app.state.service.storage.base_path
+    assert len([p for p in storage_root.rglob("*.pdf")]) == 1
+
+
+def test_reupload_after_cancel_starts_a_new_task(client):
+    pdf_bytes = b"%PDF-1.4 cancelled by mistake\n%%EOF"
+    first = client.post("/upload", files={"file": ("mistake.pdf", pdf_bytes, "application/pdf")}).json()
+    assert client.post(f"/tasks/{first['task_id']}/cancel").json()["status"] == "cancelled"
+
+    second = client.post("/upload", files={"file": ("mistake.pdf", pdf_bytes, "application/pdf")})
+    assert second.status_code == 202
+    assert second.json()["deduplicated"] is False
+    assert second.json()["task_id"] != first["task_id"]
+    third = client.post("/upload", files={"file": ("mistake.pdf", pdf_bytes, "application/pdf")}).json()
+    assert third["deduplicated"] is True and third["task_id"] == second.json()["task_id"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_uploads_are_processed_once(tmp_path: Path):
+    app = build_app(tmp_path)
+    pdf_bytes = b"%PDF-1.4 concurrent\n%%EOF"
+    async with LifespanManager(app):
+        service = app.state.service
+        save_upload = service.storage.save_upload
+
+        async def slow_save_upload(*args, **kwargs):
+            # Keep the first upload mid-write while the second one checks the digest.
+            await asyncio.sleep(0.2)
+            return await save_upload(*args, **kwargs)
+
+        service.storage.save_upload = slow_save_upload
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            responses = await asyncio.gather(
+                *(
+                    http.post("/upload", files={"file": (f"copy-{n}.pdf", pdf_bytes, "application/pdf")})
+                    for n in range(2)
+                )
+            )
+            assert sorted(response.status_code for response in responses) == [202, 409]
+            accepted = next(response for response in responses if response.status_code == 202).json()
+            assert accepted["deduplicated"] is False
+            assert await service.queue.depth() == 1
+
+            again = await http.post("/upload", files={"file": ("copy-2.pdf", pdf_bytes, "application/pdf")})
+            assert again.json()["deduplicated"] is True
+            assert again.json()["task_id"] == accepted["task_id"]
+    assert len(list(service.storage.base_path.rglob("*.pdf"))) == 1
+
+
+def test_upload_priority_is_recorded(client):
+    test_client = client
+    response = test_client.post(
+        "/upload",
+        files={"file": ("urgent.pdf", b"%PDF-1.4 urgent\n%%EOF", "application/pdf")},
+        data={"priority": "9"},
+    )
+    assert response.status_code == 202
+    assert response.json()["priority"] == 9
+    health = test_client.get("/healthz").json()
+    assert health["queue_depth_by_priority"] == {"9": 1}
+
+    rejected = test_client.post(
+        "/upload",
+        files={"file": ("bad.pdf", b"%PDF-1.4 bad\n%%EOF", "application/pdf")},
+        data={"priority": "12"},
+    )
+    assert rejected.status_code == 422
+
+
+def paged_pdf(page_count: int) -> bytes:
+    """A minimal PDF with ``page_count`` empty pages and a valid xref table."""
+    kids = " ".join(f"{3 + index} 0 R" for index in range(page_count))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode(),
+        *[b"<< /Type /Page /Parent 2 0 R >>"] * page_count,
+    ]
+    out = bytearray(b"%PDF-1.7\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def test_large_upload_fans_out_into_page_shards(tmp_path: Path):
+    with TestClient(build_app(tmp_path, shard_pages=2)) as test_client:
+        response = test_client.post("/upload", files={"file": ("big.pdf", paged_pdf(5), "application/pdf")})
+        assert response.status_code == 202
+        task_id = response.json()["task_id"]
+        assert response.json()["queue_depth"] == 3
+
+        parent = test_client.get(f"/status/{task_id}").json()["task"]
+        assert parent["page_count"] == 5
+        assert parent["shard_count"] == 3
+        assert parent["shards_completed"] == 0
+        shard = test_client.get(f"/status/{task_id}.2").json()["task"]
+        assert (shard["parent_id"], shard["first_page"], shard["last_page"]) == (task_id, 5, 5)
+        assert test_client.portal.call(test_client.app.state.service.repo.complete_shard, task_id, 0) == 1
+        assert test_client.get(f"/status/{task_id}:shards").status_code == 404
+
+        cancelled = test_client.post(f"/tasks/{task_id}/cancel")
+        assert cancelled.status_code == 200 and cancelled.json()["status"] == "cancelled"
+        assert test_client.get(f"/status/{task_id}.1").json()["task"]["status"] == "cancelled"
+
+        small = test_client.post("/upload", files={"file": ("small.pdf", paged_pdf(2), "application/pdf")})
+        assert test_client.get(f"/status/{small.json()['task_id']}").json()["task"]["shard_count"] is None
+
+
+def test_batch_status_lookup(client):
+    test_client = client
+    task_ids = []
+    for index in range(3):
+        response = test_client.post(
+            "/upload",
+            files={"file": (f"doc-{index}.pdf", f"%PDF-1.4 {index}\n%%EOF".encode(), "application/pdf")},
+        )
+        task_ids.append(response.json()["task_id"])
+
+    response = test_client.post("/status/batch", json={"task_ids": [*task_ids, "missing", task_ids[0]]})
+    assert response.status_code == 200
+    payload = response.json()
+    assert [task["task_id"] for task in payload["tasks"]] == task_ids
+    assert payload["missing"] == ["missing"]
+    assert payload["queue_depth"] == 3
+
+    too_many = test_client.post("/status/batch", json={"task_ids": [str(i) for i in range(501)]})
+    assert too_many.status_code == 400
+
+
+def test_dead_letters_can_be_listed_and_requeued(client):
+    test_client = client
+    service = client.app.state.service
+    task_ids = []
+    for index in range(3):
+        response = test_client.post(
+            "/upload",
+            files={"file": (f"dead-{index}.pdf", f"%PDF-1.4 {index}\n%%EOF".encode(), "application/pdf")},
+        )
+        task_ids.append(response.json()["task_id"])
+        lease = test_client.portal.call(lambda: service.queue.claim("gpu-1", lease_seconds=30))
+        test_client.portal.call(lambda: service.queue.ack(lease))
+        test_client.portal.call(lambda: service.retries.dead_letter(lease.task, error="CUDA OOM", retry_count=3))
+        test_client.portal.call(lambda: service.repo.update_status(lease.task.task_id, TaskStatus.failed))
+
+    listing = test_client.get("/dead-letters", params={"limit": 2}).json()
+    assert listing["total"] == 3
+    assert [item["task"]["task_id"] for item in listing["items"]] == task_ids[:0:-1]
+    assert listing["items"][0]["error"] == "CUDA OOM"
+
+    picked = test_client.post("/dead-letters/requeue", json={"task_ids": [task_ids[1]]}).json()
+    assert picked == {"requeued": [task_ids[1]], "queue_depth": 1}
+    record = test_client.get(f"/status/{task_ids[1]}").json()["task"]
+    assert record["status"] == "queued" and record["retry_count"] == 0
+
+    rest = test_client.post("/dead-letters/requeue", json={}).json()
+    assert rest == {"requeued": [task_ids[0], task_ids[2]], "queue_depth": 3}
+    assert test_client.get("/dead-letters").json() == {"total": 0, "items": []}
+
+
+def test_list_tasks_by_submitter(client):
+    test_client = client
+    uploaded = []
+    for index in range(3):
+        response = test_client.post(
+            "/upload",
+            files={"file": (f"list-{index}.pdf", f"%PDF-1.4 {index}\n%%EOF".encode(), "application/pdf")},
+            headers={"X-Submitter": "sme@example.org" if index < 2 else "ops@example.org"},
+        )
+        uploaded.append(response.json()["task_id"])
+
+    first = test_client.get("/tasks", params={"submitter": "sme@example.org", "limit": 1}).json()
+    assert [task["task_id"] for task in first["tasks"]] == [uploaded[1]]
+    second = test_client.get(
+        "/tasks", params={"submitter": "sme@example.org", "limit": 1, "cursor": first["next_cursor"]}
+    ).json()
+    assert [task["task_id"] for task in second["tasks"]] == [uploaded[0]]
+    assert second["next_cursor"] is None
+
+    everyone = test_client.get("/tasks").json()
+    assert [task["task_id"] for task in everyone["tasks"]] == uploaded[::-1]
+    assert test_client.get("/tasks", params={"cursor": "bogus"}).status_code == 400
+
+
+def test_cancel_task(client):
+    test_client = client
+    task_ids = [
+        test_client.post(
+            "/upload", files={"file": (f"cancel-{index}.pdf", f"%PDF-1.4 {index}\n%%EOF".encode(), "application/pdf")}
+        ).json()["task_id"]
+        for index in range(2)
+    ]
+    repo = client.app.state.service.repo
+    test_client.portal.call(repo.update_status, task_ids[1], TaskStatus.completed)
+
+    response = test_client.post(f"/tasks/{task_ids[0]}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert test_client.post(f"/tasks/{task_ids[0]}/cancel").status_code == 200
+    payload = test_client.get(f"/status/{task_ids[0]}").json()
+    assert payload["task"]["status"] == "cancelled"
+    assert [entry["status"] for entry in payload["history"]] == ["queued", "cancelled"]
+
+    assert test_client.post(f"/tasks/{task_ids[1]}/cancel").status_code == 409
+    assert test_client.post("/tasks/unknown/cancel").status_code == 404
+
+
+def test_task_event_stream_ends_on_terminal_status(client):
+    test_client = client
+    response = test_client.post(
+        "/upload",
+        files={"file": ("events.pdf", b"%PDF-1.4 events\n%%EOF", "application/pdf")},
+    )
+    task_id = response.json()["task_id"]
+    repo = client.app.state.service.repo
+    test_client.portal.call(repo.update_status, task_id, TaskStatus.completed)
+
+    with test_client.stream("GET", f"/events/task/{task_id}") as stream:
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        body = "".join(stream.iter_text())
+    assert body.startswith("event: status\n")
+    assert '"status":"completed"' in body
+
+    assert test_client.get("/events/task/unknown").status_code == 404
+
+
+def test_admission_control_rejects_with_retry_after(tmp_path: Path):
+    app = build_app(
+        tmp_path,
+        admission_max_queue_depth=3,
+        admission_max_submitter_depth=1,
+        admission_drain_tasks_per_second=0.5,
+    )
+    with TestClient(app) as test_client:
+        def upload(name: str, submitter: str):
+            return test_client.post(
+                "/upload",
+                files={"file": (name, f"%PDF-1.4 {name}\n%%EOF".encode(), "application/pdf")},
+                headers={"X-Submitter": submitter},
+            )
+
+        assert upload("a1.pdf", "sme-a").status_code == 202
+        busy = upload("a2.pdf", "sme-a")
+        assert busy.status_code == 429
+        assert busy.headers["Retry-After"] == "2"
+        assert upload("b1.pdf", "sme-b").status_code == 202
+        assert upload("c1.pdf", "sme-c").status_code == 202
+
+        full = upload("d1.pdf", "sme-d")
+        assert full.status_code == 429
+        assert full.json()["detail"].startswith("OCR queue is full")
+        assert int(full.headers["Retry-After"]) == 2
+
+        storage_root = app.state.service.storage.base_path
+        assert len(list(storage_root.rglob("*.pdf"))) == 3
+
+
+def test_metrics_endpoint_reports_upload_phases_and_queue(client):
+    test_client = client
+    test_client.post(
+        "/upload",
+        files={"file": ("metrics.pdf", b"%PDF-1.4 metrics\n%%EOF", "application/pdf")},
+    )
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'ocr_upload_phase_seconds_count{phase="storage"}' in body
+    assert 'ocr_upload_phase_seconds_count{phase="receive"}' in body
+    assert "ocr_queue_depth 1.0" in body
+    assert 'ocr_redis_roundtrips_per_request_count{route="/upload"}' in body
+    assert 'ocr_storage_call_seconds_count{backend="local",operation="save_upload"}' in body
+
+
+def test_result_endpoints_serve_pages_with_etags(client):
+    test_client = client
+    document = {"page_count": 2, "pages": [{"page_number": 1, "text": "first"}, {"page_number": 2, "text": "second"}]}
+    results = client.app.state.service.results
+    test_client.portal.call(results.save, "task-1", document)
+
+    full = test_client.get("/result/task-1")
+    assert full.status_code == 200
+    assert full.json() == document
+    etag = full.headers["etag"]
+    assert test_client.get("/result/task-1", headers={"If-None-Match": etag}).status_code == 304
+
+    page = test_client.get("/result/task-1/pages/2")
+    assert page.status_code == 200
+    assert page.json() == {"page_number": 2, "text": "second"}
+    assert page.headers["etag"] != etag
+    assert test_client.get("/result/task-1/pages/2", headers={"If-None-Match": page.headers["etag"]}).status_code == 304
+
+    raw = test_client.get("/result/task-1/pages/1", headers={"Accept-Encoding": "zstd"})
+    assert raw.headers["content-encoding"] == "zstd"
+
+    assert test_client.get("/result/task-1/pages/3").status_code == 404
+    assert test_client.get("/result/unknown").status_code == 404
+
+
+def test_presigned_upload_flow_against_s3(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    pdf_bytes = b"%PDF-1.4 presigned\n%%EOF"
+    sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="ocr-inbox")
+        storage = S3StorageBackend(bucket="ocr-inbox", prefix="tests", region="us-east-1")
+        settings = Settings(redis_url="redis://unused", queue_name="test:queue", storage_prefix="uploads")
+        app = create_app(settings=settings, redis_client=fakeredis.aioredis.FakeRedis(), storage_backend=storage)
+        with TestClient(app) as test_client:
+            presign = test_client.post(
+                "/uploads/presign",
+                json={"filename": "direct.pdf", "size_bytes": len(pdf_bytes), "sha256": sha256},
+                headers={"X-Submitter": "sme@example.org"},
+            )
+            assert presign.status_code == 200
+            ticket = presign.json()
+            task_id = ticket["task_id"]
+
+            assert test_client.post(f"/uploads/{task_id}/complete").status_code == 409
+            put = requests.put(ticket["upload_url"], data=pdf_bytes, headers=ticket["upload_headers"])
+            assert put.status_code == 200
+
+            completed = test_client.post(f"/uploads/{task_id}/complete")
+            assert completed.status_code == 202
+            assert completed.json()["sha256"] == sha256
+            assert completed.json()["queue_depth"] == 1
+            record = test_client.get(f"/status/{task_id}").json()["task"]
+            assert record["submitted_by"] == "sme@example.org"
+            assert record["storage_uri"].startswith("s3://ocr-inbox/tests/uploads/")
+
+            assert test_client.post(f"/uploads/{task_id}/complete").status_code == 404
+            again = test_client.post(
+                "/uploads/presign",
+                json={"filename": "again.pdf", "size_bytes": len(pdf_bytes), "sha256": sha256},
+            )
+            assert again.json() == {**again.json(), "task_id": task_id, "deduplicated": True, "upload_url": None}
+
+
+def test_presigned_upload_without_stored_checksum_is_hashed_on_the_server(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    pdf_bytes = b"%PDF-1.4 declared\n%%EOF"
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="ocr-inbox")
+        storage = S3StorageBackend(bucket="ocr-inbox", prefix="tests", region="us-east-1")
+        head = storage.head
+
+        async def head_without_checksum(key: str):
+            # Like an S3-compatible store that keeps no ChecksumSHA256.
+            info = await head(key)
+            info.sha256 = None
+            return info
+
+        storage.head = head_without_checksum
+        settings = Settings(
+            redis_url="redis://unused", queue_name="test:queue", storage_prefix="uploads", admission_max_queue_depth=1
+        )
+        app = create_app(settings=settings, redis_client=fakeredis.aioredis.FakeRedis(), storage_backend=storage)
+        with TestClient(app) as test_client:
+            def presign(sha256: str):
+                return test_client.post(
+                    "/uploads/presign",
+                    json={"filename": "direct.pdf", "size_bytes": len(pdf_bytes), "sha256": sha256},
+                ).json()
+
+            def put_unchecked(ticket: dict, body: bytes) -> None:
+                key = urlparse(ticket["upload_url"]).path.lstrip("/").removeprefix("ocr-inbox/")
+                storage._client.put_object(Bucket="ocr-inbox", Key=key, Body=body)
+
+            # A body that does not match the declared digest is refused.
+            forged = presign(hashlib.sha256(b"some other document").hexdigest())
+            put_unchecked(forged, pdf_bytes.replace(b"declared", b"forgedxx"))
+            assert test_client.post(f"/uploads/{forged['task_id']}/complete").status_code == 400
+            assert test_client.get(f"/status/{forged['task_id']}:upload").status_code == 404
+
+            honest = presign(hashlib.sha256(pdf_bytes).hexdigest())
+            put_unchecked(honest, pdf_bytes)
+            completed = test_client.post(f"/uploads/{honest['task_id']}/complete")
+            assert completed.status_code == 202
+            assert completed.json()["sha256"] == hashlib.sha256(pdf_bytes).hexdigest()
+
+            # Presigned uploads go through admission control too.
+            full = test_client.post(
+                "/uploads/presign", json={"filename": "more.pdf", "size_bytes": 10, "sha256": "1" * 64}
+            )
+            assert full.status_code == 429
+            assert "Retry-After" in full.headers
+
+
+def test_presign_requires_s3_storage(client):
+    response = client.post(
+        "/uploads/presign",
+        json={"filename": "direct.pdf", "size_bytes": 10, "sha256": "0" * 64},
+    )
+    assert response.status_code == 400
+
+
+def test_resumable_upload_resumes_from_server_offset(client):
+    test_client = client
+    pdf_bytes = b"%PDF-1.4 " + b"resumable " * 100 + b"%%EOF"
+    created = test_client.post("/uploads", json={"filename": "big.pdf", "size_bytes": len(pdf_bytes)})
+    assert created.status_code == 201
+    ticket = created.json()
+    upload_url = created.headers["location"]
+    assert ticket["offset"] == 0
+
+    first = test_client.patch(upload_url, content=pdf_bytes[:400], headers={"Upload-Offset": "0"})
+    assert first.status_code == 204
+    assert first.headers["upload-offset"] == "400"
+
+    # A client that lost track of the offset is told where to resume.
+    stale = test_client.patch(upload_url, content=pdf_bytes[:400], headers={"Upload-Offset": "0"})
+    assert stale.status_code == 409
+    assert test_client.head(upload_url).headers["upload-offset"] == "400"
+
+    final = test_client.patch(upload_url, content=pdf_bytes[400:], headers={"Upload-Offset": "400"})
+    assert final.status_code == 202
+    payload = final.json()
+    assert payload["task_id"] == ticket["task_id"]
+    assert payload["sha256"] == hashlib.sha256(pdf_bytes).hexdigest()
+    assert payload["received_bytes"] == len(pdf_bytes)
+
+    record = test_client.get(f"/status/{ticket['task_id']}").json()["task"]
+    assert Path(record["storage_path"]).read_bytes() == pdf_bytes
+    assert test_client.head(upload_url).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_concurrent_final_patches_queue_the_upload_once(tmp_path: Path):
+    app = build_app(tmp_path)
+    pdf_bytes = b"%PDF-1.4 final twice\n%%EOF"
+    async with LifespanManager(app):
+        service = app.state.service
+        finish_resumable = service.storage.finish_resumable
+        finished = {}
+
+        async def slow_idempotent_finish(key, upload_id, *, size_bytes):
+            # Like S3 CompleteMultipartUpload, completing twice returns the same object.
+            await asyncio.sleep(0.2)
+            if key not in finished:
+                finished[key] = await finish_resumable(key, upload_id, size_bytes=size_bytes)
+            return finished[key]
+
+        service.storage.finish_resumable = slow_idempotent_finish
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            created = await http.post("/uploads", json={"filename": "twice.pdf", "size_bytes": len(pdf_bytes)})
+            url = created.headers["location"]
+
+            async def retry_final():
+                await asyncio.sleep(0.1)
+                return await http.patch(url, content=b"", headers={"Upload-Offset": str(len(pdf_bytes))})
+
+            final, retried = await asyncio.gather(
+                http.patch(url, content=pdf_bytes, headers={"Upload-Offset": "0"}), retry_final()
+            )
+            assert final.status_code == 202
+            assert retried.status_code == 409
+            late = await http.patch(url, content=b"", headers={"Upload-Offset": str(len(pdf_bytes))})
+            assert late.status_code == 404
+
+            record = (await http.get(f"/status/{final.json()['task_id']}")).json()["task"]
+            assert Path(record["storage_path"]).read_bytes() == pdf_bytes
+            assert await service.queue.depth() == 1
+
+
+@pytest.mark.asyncio
+async def test_resumable_chunks_count_against_inflight_bytes(tmp_path: Path):
+    app = build_app(tmp_path, admission_max_inflight_bytes=100)
+    chunks = [b"%PDF-1.4 " + letter * 60 + b"%%EOF" for letter in (b"x", b"y")]
+    async with LifespanManager(app):
+        storage = app.state.service.storage
+        write_resumable_part = storage.write_resumable_part
+
+        async def slow_write(*args, **kwargs):
+            await asyncio.sleep(0.2)
+            return await write_resumable_part(*args, **kwargs)
+
+        storage.write_resumable_part = slow_write
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            urls = [
+                (await http.post("/uploads", json={"filename": f"part-{n}.pdf", "size_bytes": len(chunks[n])})).headers[
+                    "location"
+                ]
+                for n in range(2)
+            ]
+
+            async def second_chunk():
+                await asyncio.sleep(0.1)
+                return await http.patch(urls[1], content=chunks[1], headers={"Upload-Offset": "0"})
+
+            first, over_budget = await asyncio.gather(
+                http.patch(urls[0], content=chunks[0], headers={"Upload-Offset": "0"}), second_chunk()
+            )
+            assert first.status_code == 202
+            assert over_budget.status_code == 429
+            assert "Retry-After" in over_budget.headers
+            retried = await http.patch(urls[1], content=chunks[1], headers={"Upload-Offset": "0"})
+            assert retried.status_code == 202
+
+
+def test_duplicate_resumable_upload_deletes_its_object(client):
+    pdf_bytes = b"%PDF-1.4 resumable duplicate\n%%EOF"
+    first = client.post("/upload", files={"file": ("dup.pdf", pdf_bytes, "application/pdf")}).json()
+    created = client.post("/uploads", json={"filename": "dup-again.pdf", "size_bytes": len(pdf_bytes)})
+
+    final = client.patch(created.headers["location"], content=pdf_bytes, headers={"Upload-Offset": "0"})
+    assert final.status_code == 200
+    assert final.json()["deduplicated"] is True
+    assert final.json()["task_id"] == first["task_id"]
+    storage_root = client.app.state.service.storage.base_path
+    assert len(list(storage_root.rglob("*.pdf"))) == 1
+
+
+def test_resumable_upload_start_goes_through_admission(tmp_path: Path):
+    with TestClient(build_app(tmp_path, admission_max_queue_depth=1)) as test_client:
+        test_client.post("/upload", files={"file": ("a.pdf", b"%PDF-1.4 a\n%%EOF", "application/pdf")})
+        rejected = test_client.post("/uploads", json={"filename": "big.pdf", "size_bytes": 1024})
+        assert rejected.status_code == 429
+        assert "Retry-After" in rejected.headers
+
+
+def test_upload_tripping_a_preflight_limit_is_refused(client):
+    # A 1 MiB /Length in a file of about a hundred bytes.
+    pdf_bytes = b"%PDF-1.5\n1 0 obj\n<< /Type /XRef /Size 2 /W [1 2 1] /Length 1048576 >>\nstream\n"
+    pdf_bytes += b"\nendstream\nendobj\nstartxref\n9\n%%EOF\n"
+    for name in ("bomb.pdf", "bomb-again.pdf"):
+        response = client.post("/upload", files={"file": (name, pdf_bytes, "application/pdf")})
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith("PDF rejected by preflight")
+    storage_root = client.app.state.service.storage.base_path
+    assert list(storage_root.rglob("*.pdf")) == []
+
+
+def test_status_ids_never_resolve_auxiliary_keys(client):
+    upload = client.post(
+        "/upload",
+        files={"file": ("aux.pdf", b"%PDF-1.4 aux\n%%EOF", "application/pdf")},
+        headers={"X-Submitter": "sme-aux"},
+    )
+    task_id = upload.json()["task_id"]
+    session = client.post("/uploads", json={"filename": "aux-big.pdf", "size_bytes": 1024}).json()["task_id"]
+    aux_ids = [f"{task_id}:history", f"{session}:resumable", "by-submitted-at", "by-submitter:sme-aux"]
+    for aux_id in aux_ids:
+        assert client.get(f"/status/{aux_id}").status_code == 404
+        assert client.post(f"/tasks/{aux_id}/cancel").status_code == 404
+    assert client.post("/status/batch", json={"task_ids": aux_ids}).json()["missing"] == aux_ids
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+import fakeredis.aioredis
+import pytest
+
+from ocr_service.events import EventBroker
+from ocr_service.models import TaskRecord, TaskStatus
+from ocr_service.repository import TaskRepository
+
+
+def make_record(task_id: str, **overrides) -> TaskRecord:
+    now = datetime.now(timezone.utc)
+    fields = dict(
+        task_id=task_id,
+        filename=f"{task_id}.pdf",
+        status=TaskStatus.queued,
+        content_type="application/pdf",
+        size_bytes=1024,
+        sha256="0" * 64,
+        storage_uri=f"file://tests/{task_id}.pdf",
+        storage_path=f"/tmp/{task_id}.pdf",
+        queue_name="test:queue",
+        submitted_at=now,
+        updated_at=now,
+    )
+    fields.update(overrides)
+    return TaskRecord(**fields)
+
+
+@pytest.mark.asyncio
+async def test_status_transitions_reach_task_submitter_and_batch_listeners():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    repo = TaskRepository(redis, key_prefix="test:task:", ttl_seconds=60, events_prefix="test:events:")
+    broker = EventBroker(redis, channel_prefix="test:events:")
+    await repo.save(make_record("job-1", submitted_by="sme@example.org", batch_id="refresh-42"))
+
+    async with broker.subscribe("task", "job-1") as by_task, broker.subscribe(
+        "submitter", "sme@example.org"
+    ) as by_submitter, broker.subscribe("batch", "refresh-42") as by_batch:
+        await repo.update_status("job-1", TaskStatus.processing)
+        for inbox in (by_task, by_submitter, by_batch):
+            event = await asyncio.wait_for(inbox.get(), timeout=2)
+            assert event.task_id == "job-1"
+            assert event.status == TaskStatus.processing
+
+    await broker.close()
+    await redis.aclose()
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import io
+import zlib
+from pathlib import Path
+
+import pytest
+
+from ocr_service.preflight import MAX_STREAM_BYTES, PdfLimitError, preflight_file, preflight_pdf, preflight_stored
+from ocr_service.storage import LocalStorageBackend
+
+FONT = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+IMAGE = b"<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /Length 3 >>\nstream\nabc\nendstream"
+
+
+def build_pdf(objects: list[bytes], *, trailer: bytes = b"", version: bytes = b"1.4") -> bytes:
+    """A PDF with a classic xref table; object 1 is the catalog."""
+    out = bytearray(b"%PDF-" + version + b"\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R %s>>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, trailer, xref)
+    return bytes(out)
+
+
+def build_compressed_pdf(objects: list[bytes]) -> bytes:
+    """A PDF 1.5 file with every object in an object stream and a predicted xref stream."""
+    positions, body = [], b""
+    for item in objects:
+        positions.append(len(body))
+        body += item + b"\n"
+    header = b" ".join(b"%d %d" % (number, position) for number, position in enumerate(positions, start=1)) + b"\n"
+    packed = zlib.compress(header + body)
+    stream_number = len(objects) + 1
+    xref_number = stream_number + 1
+
+    out = bytearray(b"%PDF-1.5\n")
+    stream_offset = len(out)
+    out += b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n" % (
+        stream_number,
+        len(objects),
+        len(header),
+        len(packed),
+    )
+    out += packed + b"\nendstream\nendobj\n"
+    xref_offset = len(out)
+
+    rows = [(0, 0, 255)]
+    rows += [(2, stream_number, index) for index in range(len(objects))]
+    rows += [(1, stream_offset, 0), (1, xref_offset, 0)]
+    raw = [bytes([kind]) + field.to_bytes(2, "big") + bytes([last]) for kind, field, last in rows]
+    predicted = b"".join(
+        b"\x02" + bytes((row[i] - previous[i]) & 0xFF for i in range(4))
+        for row, previous in zip(raw, [b"\x00" * 4] + raw[:-1])
+    )
+    data = zlib.compress(predicted)
+    out += (
+        b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 2 1] /Root 1 0 R /Filter /FlateDecode "
+        b"/DecodeParms << /Predictor 12 /Columns 4 >> /Length %d >>\nstream\n"
+    ) % (xref_number, xref_number + 1, len(data))
+    out += data + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref_offset
+    return bytes(out)
+
+
+def build_xref_stream_pdf(data: bytes, *, length: int | None = None) -> bytes:
+    """A PDF whose startxref points at a Flate xref stream holding ``data``."""
+    out = bytearray(b"%PDF-1.5\n")
+    offset = len(out)
+    out += b"1 0 obj\n<< /Type /XRef /Size 2 /W [1 2 1] /Filter /FlateDecode /Length %d >>\nstream\n" % (
+        len(data) if length is None else length
+    )
+    out += data + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % offset
+    return bytes(out)
+
+
+def inspect(data: bytes, **kwargs):
+    return preflight_pdf(lambda offset, length: data[offset : offset + length], len(data), **kwargs)
+
+
+def test_text_pdf_with_inherited_font_resources():
+    data = build_pdf(
+        [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 /Resources << /Font << /F1 5 0 R >> >> >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>",
+            FONT,
+        ]
+    )
+    result = inspect(data)
+    assert result.page_count == 2
+    assert result.has_text_layer is True
+    assert result.encrypted is False
+    assert result.linearized is False
+    assert result.pdf_version == "1.4"
+
+
+def test_image_only_scan_and_encryption_flag():
+    page = b"<< /Type /Page /Parent 2 0 R /Resources << /XObject << /Im0 4 0 R >> >> >>"
+    data = build_pdf(
+        [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            page,
+            IMAGE,
+            b"<< /Filter /Standard /V 2 /R 3 /O (owner\\)) /U <0a1b> /P -4 >>",
+        ],
+        trailer=b"/Encrypt 5 0 R ",
+    )
+    result = inspect(data)
+    assert result.page_count == 1
+    assert result.has_text_layer is False
+    assert result.encrypted is True
+
+
+def test_object_streams_and_nested_page_tree():
+    data = build_compressed_pdf(
+        [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 3 >>",
+            b"<< /Type /Pages /Parent 2 0 R /Kids [5 0 R 5 0 R] /Count 2 >>",
+            b"<< /Type /Pages /Parent 2 0 R /Kids [6 0 R] /Count 1 >>",
+            b"<< /Type /Page /Resources << /Font << /F1 7 0 R >> >> >>",
+            b"<< /Type /Page /Resources << /XObject << /Fm0 8 0 R >> >> >>",
+            FONT,
+            b"<< /Type /XObject /Subtype /Form /Resources << /Font << /F1 7 0 R >> >> >>",
+        ]
+    )
+    reads = []
+
+    def read(offset: int, length: int) -> bytes:
+        reads.append((offset, length))
+        return data[offset : offset + length]
+
+    result = preflight_pdf(read, len(data))
+    assert result.page_count == 3
+    assert result.has_text_layer is True
+    assert result.pdf_version == "1.5"
+    assert len(reads) < 10
+
+
+def test_linearization_hint_when_xref_is_broken():
+    placeholder = b"0" * 10
+    data = build_pdf([b"<< /Linearized 1 /L " + placeholder + b" /N 7 /O 3 /H [0 0] /E 0 /T 0 >>"])
+    data = data.replace(placeholder, b"%010d" % len(data)).replace(b"xref\n0 ", b"xraf\n0 ")
+    result = inspect(data)
+    assert result.linearized is True
+    assert result.page_count == 7
+
+
+def test_scan_fallback_counts_page_objects():
+    data = build_pdf(
+        [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+            b"<< /Type /Page /Resources << /Font << /F1 5 0 R >> >> >>",
+            b"<< /Type/Page >>",
+            FONT,
+        ]
+    ).replace(b"startxref", b"startxrex")
+    assert inspect(data).page_count is None
+
+    result = preflight_file(io.BytesIO(data))
+    assert result.page_count == 2
+    assert result.has_text_layer is True
+    assert result.encrypted is False
+
+
+def test_streams_past_the_limits_are_refused():
+    bomb = build_xref_stream_pdf(zlib.compress(bytes(MAX_STREAM_BYTES + 1)))
+    with pytest.raises(PdfLimitError, match="inflates past"):
+        inspect(bomb, scan=True)
+    overlong = build_xref_stream_pdf(zlib.compress(bytes(8)), length=1 << 40)
+    with pytest.raises(PdfLimitError, match="past the end of the file"):
+        inspect(overlong)
+
+
+def test_not_a_pdf():
+    result = inspect(b"GIF89a not a pdf")
+    assert result.page_count is None and result.pdf_version is None and result.linearized is None
+
+
+@pytest.mark.asyncio
+async def test_preflight_stored_object(tmp_path: Path):
+    storage = LocalStorageBackend(base_path=tmp_path, base_uri="file://tests")
+    data = build_pdf(
+        [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page >>",
+        ]
+    )
+    await storage.save_bytes("in/doc.pdf", data, content_type="application/pdf")
+    result = await preflight_stored(storage, "in/doc.pdf", size_bytes=len(data))
+    assert result.page_count == 1
+    assert result.has_text_layer is False
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+
+from ocr_service.models import QueueTask, TaskRecord, TaskStatus
+from ocr_service.queue import FairSharePolicy, TaskQueue, TierPolicy, TierScheduler
+from ocr_service.repository import TaskRepository
+
+
+def make_task(
+    task_id: str, *, priority: int = 5, submitted_by: str | None = None, page_count: int | None = None
+) -> QueueTask:
+    return QueueTask(
+        task_id=task_id,
+        filename=f"{task_id}.pdf",
+        content_type="application/pdf",
+        size_bytes=1024,
+        sha256="0" * 64,
+        storage_uri=f"file://tests/{task_id}.pdf",
+        storage_path=f"/tmp/{task_id}.pdf",
+        submitted_at=datetime.now(timezone.utc),
+        priority=priority,
+        submitted_by=submitted_by,
+        page_count=page_count,
+    )
+
+
+@pytest_asyncio.fixture()
+async def queue():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    task_queue = TaskQueue(queue_name="test:queue", redis_client=redis)
+    await task_queue.connect()
+    yield task_queue
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_dequeue_orders_by_priority_then_fifo(queue):
+    await queue.enqueue(make_task("backfill-1", priority=1))
+    await queue.enqueue(make_task("normal-1"))
+    await queue.enqueue(make_task("urgent-1", priority=9))
+    await queue.enqueue(make_task("normal-2"))
+    await queue.enqueue(make_task("urgent-2", priority=9))
+
+    order = [(await queue.dequeue()).task_id for _ in range(5)]
+    assert order == ["urgent-1", "urgent-2", "normal-1", "normal-2", "backfill-1"]
+    assert await queue.dequeue() is None
+    assert await queue.dequeue(timeout=0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_depth_by_priority(queue):
+    await queue.enqueue(make_task("a", priority=9))
+    await queue.enqueue(make_task("b", priority=9))
+    await queue.enqueue(make_task("c", priority=0))
+
+    assert await queue.depth() == 3
+    assert await queue.depth(priority=9) == 2
+    assert await queue.depth(priority=5) == 0
+    assert await queue.depth_by_priority() == {0: 1, 9: 2}
+
+
+@pytest.mark.asyncio
+async def test_claim_heartbeat_and_ack(queue):
+    await queue.enqueue(make_task("job-1"))
+
+    lease = await queue.claim("gpu-0", lease_seconds=30)
+    assert lease is not None
+    assert lease.task.task_id == "job-1"
+    assert await queue.depth() == 0
+    assert await queue.in_flight() == 1
+    assert await queue.redis.llen(queue.processing_key("gpu-0")) == 1
+
+    assert await queue.heartbeat(lease, lease_seconds=30) is True
+    await queue.ack(lease)
+    assert await queue.in_flight() == 0
+    assert await queue.redis.llen(queue.processing_key("gpu-0")) == 0
+    assert await queue.heartbeat(lease, lease_seconds=30) is False
+    assert await queue.claim("gpu-0", lease_seconds=30, timeout=0.05, poll_interval=0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_reaper_requeues_expired_lease_and_counts_retry(queue):
+    repo = TaskRepository(queue.redis, key_prefix="test:task:", ttl_seconds=60)
+    task = make_task("job-crash", priority=9)
+    await repo.save(
+        TaskRecord(
+            **task.model_dump(exclude={"priority"}),
+            priority=task.priority,
+            status=TaskStatus.processing,
+            queue_name=queue.queue_name,
+            updated_at=task.submitted_at,
+        )
+    )
+    await queue.enqueue(task)
+    await queue.enqueue(make_task("job-later", priority=1))
+
+    lease = await queue.claim("gpu-crashed", lease_seconds=0)
+    assert lease is not None and lease.task.task_id == "job-crash"
+
+    requeued = await queue.reap_expired(repo=repo)
+    assert [t.task_id for t in requeued] == ["job-crash"]
+    assert await queue.in_flight() == 0
+    assert await queue.redis.llen(queue.processing_key("gpu-crashed")) == 0
+
+    record = await repo.get("job-crash")
+    assert record.retry_count == 1
+    assert record.status == TaskStatus.queued
+
+    retry = await queue.claim("gpu-1", lease_seconds=30)
+    assert retry.task.task_id == "job-crash"
+
+
+@pytest.mark.asyncio
+async def test_late_ack_from_reaped_worker_keeps_new_lease(queue):
+    await queue.enqueue(make_task("job-slow"))
+    stale = await queue.claim("gpu-slow", lease_seconds=0)
+    assert [task.task_id for task in await queue.reap_expired()] == ["job-slow"]
+    current = await queue.claim("gpu-fast", lease_seconds=30)
+    assert current.message == stale.message
+
+    assert await queue.heartbeat(stale, lease_seconds=30) is False
+    await queue.ack(stale)
+    assert await queue.in_flight() == 1
+    assert await queue.reap_expired() == []
+    assert await queue.heartbeat(current, lease_seconds=30) is True
+
+    await queue.ack(current)
+    assert await queue.in_flight() == 0
+    assert await queue.redis.llen(queue.processing_key("gpu-fast")) == 0
+
+
+@pytest.mark.asyncio
+async def test_enqueue_with_record_is_single_script(queue):
+    repo = TaskRepository(queue.redis, key_prefix="test:task:", ttl_seconds=60)
+    task = make_task("job-atomic")
+    record = TaskRecord(
+        **task.model_dump(),
+        status=TaskStatus.queued,
+        queue_name=queue.queue_name,
+        updated_at=task.submitted_at,
+    )
+
+    assert await queue.enqueue(make_task("job-first")) == 1
+    assert await queue.enqueue(task, record=record, repo=repo) == 2
+    stored = await repo.get("job-atomic")
+    assert stored is not None and stored.status == TaskStatus.queued
+    assert stored.tier == "small"
+    assert 0 < await queue.redis.ttl(repo.key("job-atomic")) <= 60
+
+
+@pytest.mark.asyncio
+async def test_fair_share_serves_newcomer_ahead_of_bulk_backlog():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    queue = TaskQueue(queue_name="test:queue", redis_client=redis, fair_share=FairSharePolicy(weights={"alice": 2}))
+    await queue.connect()
+    for index in range(4):
+        await queue.enqueue(make_task(f"bulk-{index}", submitted_by="bulk"))
+    assert (await queue.claim("gpu-1", lease_seconds=30)).task.task_id == "bulk-0"
+
+    await queue.enqueue(make_task("alice-1", submitted_by="alice"))
+    await queue.enqueue(make_task("alice-2", submitted_by="alice"))
+    await queue.enqueue(make_task("urgent", submitted_by="bulk", priority=9))
+    assert await queue.oldest_enqueued_ms() is not None
+
+    order = [(await queue.claim("gpu-1", lease_seconds=30)).task.task_id for _ in range(6)]
+    assert order == ["urgent", "alice-1", "alice-2", "bulk-1", "bulk-2", "bulk-3"]
+    assert await redis.hkeys(queue.fair_share_key) == [b"clock:small"]
+    await redis.aclose()
+
+
+def test_tier_scheduler_interleaves_by_weight():
+    scheduler = TierScheduler({"small": 6, "medium": 3, "large": 1})
+    picks = [scheduler.order() for _ in range(10)]
+    assert [order[0] for order in picks] == [
+        "small", "medium", "small", "small", "medium", "small", "large", "small", "medium", "small"
+    ]
+    assert all(sorted(order) == ["large", "medium", "small"] for order in picks)
+
+
+@pytest.mark.asyncio
+async def test_tiers_route_on_enqueue_and_claims_follow_weights():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    queue = TaskQueue(
+        queue_name="test:queue",
+        redis_client=redis,
+        tiers=TierPolicy(small_max_pages=5, medium_max_pages=100, weights={"small": 2, "medium": 1, "large": 1}),
+    )
+    await queue.connect()
+    await queue.enqueue(make_task("scan", page_count=900, priority=9))
+    await queue.enqueue(make_task("report", page_count=40))
+    await queue.enqueue(make_task("memo-1", page_count=2))
+    await queue.enqueue(make_task("memo-2", page_count=2))
+    assert await queue.enqueue_with_depths(make_task("unknown-size")) == (5, {"small": 3, "medium": 1, "large": 1})
+    assert await queue.depth_by_tier() == {"small": 3, "medium": 1, "large": 1}
+    assert await queue.depth() == 5
+
+    claimed = [await queue.claim("gpu-1", lease_seconds=0) for _ in range(5)]
+    assert [lease.task.task_id for lease in claimed] == ["memo-1", "report", "scan", "memo-2", "unknown-size"]
+    assert [lease.task.tier for lease in claimed] == ["small", "medium", "large", "small", "small"]
+
+    assert len(await queue.reap_expired()) == 5
+    assert await queue.depth_by_tier() == {"small": 3, "medium": 1, "large": 1}
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_legacy_list_is_drained_onto_the_tiers():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    # The original queue RPUSHed untiered messages onto a list named after the queue.
+    for task_id in ("old-1", "old-2"):
+        await redis.rpush("test:queue", make_task(task_id).model_dump_json(exclude={"tier", "page_count"}))
+    queue = TaskQueue(queue_name="test:queue", redis_client=redis)
+    await queue.connect()
+
+    assert not await redis.exists("test:queue")
+    assert await queue.depth_by_tier() == {"small": 2, "medium": 0, "large": 0}
+    claimed = [await queue.claim("gpu-1", lease_seconds=30) for _ in range(2)]
+    assert [lease.task.task_id for lease in claimed] == ["old-1", "old-2"]
+    await redis.aclose()
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import fakeredis.aioredis
+import orjson
+import pytest
+import pytest_asyncio
+
+from ocr_service.models import TaskRecord, TaskStatus
+from ocr_service.repository import TaskRepository
+
+
+def make_record(task_id: str, **overrides) -> TaskRecord:
+    now = datetime.now(timezone.utc)
+    fields = dict(
+        task_id=task_id,
+        filename=f"{task_id}.pdf",
+        status=TaskStatus.queued,
+        content_type="application/pdf",
+        size_bytes=1024,
+        sha256="0" * 64,
+        storage_uri=f"file://tests/{task_id}.pdf",
+        storage_path=f"/tmp/{task_id}.pdf",
+        queue_name="test:queue",
+        submitted_at=now,
+        updated_at=now,
+    )
+    fields.update(overrides)
+    return TaskRecord(**fields)
+
+
+@pytest_asyncio.fixture()
+async def repo():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    yield TaskRepository(redis, key_prefix="test:task:", ttl_seconds=60)
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_record_round_trips_through_hash_fields(repo):
+    record = make_record("job-1", priority=9, batch_id="b-1")
+    await repo.save(record)
+
+    fields = await repo.redis.hgetall(repo.key("job-1"))
+    assert fields[b"status"] == b"queued"
+    assert fields[b"priority"] == b"9"
+    assert b"error_message" not in fields
+    assert await repo.get("job-1") == record
+    assert list(await repo.get_many(["job-1", "missing"])) == ["job-1"]
+
+
+@pytest.mark.asyncio
+async def test_update_status_writes_fields_in_place(repo):
+    await repo.save(make_record("job-1", submitted_by="sme@example.org"))
+
+    event = await repo.update_status("job-1", TaskStatus.failed, error_message="boom")
+    assert event.status == TaskStatus.failed and event.submitted_by == "sme@example.org"
+    assert (await repo.increment_retry("job-1")).retry_count == 1
+    assert (await repo.increment_retry("job-1")).retry_count == 2
+
+    record = await repo.get("job-1")
+    assert record.status == TaskStatus.queued
+    assert record.error_message == "boom"
+    assert record.retry_count == 2
+    assert (await repo.get_event("job-1")).retry_count == 2
+
+
+@pytest.mark.asyncio
+async def test_update_status_ignores_unknown_task(repo):
+    assert await repo.update_status("gone", TaskStatus.completed) is None
+    assert await repo.increment_retry("gone") is None
+    assert not await repo.exists("gone")
+    assert await repo.get_event("gone") is None
+
+
+@pytest.mark.asyncio
+async def test_cancel_tombstone_survives_later_updates(repo):
+    await repo.save(make_record("job-1"))
+    await repo.save(make_record("job-2"))
+    await repo.update_status("job-2", TaskStatus.completed)
+
+    assert (await repo.cancel("job-1")).status == TaskStatus.cancelled
+    assert await repo.is_cancelled("job-1")
+    assert (await repo.update_status("job-1", TaskStatus.processing)).status == TaskStatus.cancelled
+    assert (await repo.increment_retry("job-1")).retry_count == 0
+    assert (await repo.get("job-1")).status == TaskStatus.cancelled
+
+    assert (await repo.cancel("job-2")).status == TaskStatus.completed
+    assert not await repo.is_cancelled("job-2")
+    assert await repo.cancel("gone") is None
+
+
+@pytest.mark.asyncio
+async def test_list_tasks_pages_through_submitted_at_index(repo):
+    now = datetime.now(timezone.utc)
+    await repo.save(make_record("stale", submitted_at=now - timedelta(seconds=120), submitted_by="sme"))
+    for index, seconds in enumerate([5, 4, 4, 4, 1]):
+        await repo.save(make_record(f"job-{index}", submitted_at=now - timedelta(seconds=seconds), submitted_by="sme"))
+    await repo.save(make_record("other", submitted_by="ops"))
+    await repo.save(make_record("job-3.0", parent_id="job-3", submitted_by="sme"))
+
+    pages, cursor = [], None
+    while True:
+        tasks, cursor = await repo.list_tasks(submitter="sme", cursor=cursor, limit=2)
+        pages.append([task.task_id for task in tasks])
+        if cursor is None:
+            break
+    assert pages == [["job-4", "job-3"], ["job-2", "job-1"], ["job-0"]]
+
+    tasks, cursor = await repo.list_tasks(limit=10)
+    assert [task.task_id for task in tasks][:2] == ["other", "job-4"] and len(tasks) == 6 and cursor is None
+    assert await repo.redis.zscore(repo.index_key(), "stale") is None
+    with pytest.raises(ValueError):
+        await repo.list_tasks(cursor="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_status_history_is_capped_and_records_workers():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    repo = TaskRepository(redis, key_prefix="test:task:", ttl_seconds=60, history_size=3)
+    await repo.save(make_record("job-1"))
+    await repo.update_status("job-1", TaskStatus.processing, worker_id="gpu-1")
+    await repo.increment_retry("job-1")
+    await repo.update_status("job-1", TaskStatus.processing, worker_id="gpu-2")
+    await repo.update_status("job-1", TaskStatus.completed, worker_id="gpu-2")
+
+    history = await repo.get_history("job-1")
+    assert [(h.status, h.worker_id) for h in history] == [
+        (TaskStatus.queued, None),
+        (TaskStatus.processing, "gpu-2"),
+        (TaskStatus.completed, "gpu-2"),
+    ]
+    assert history[0].at <= history[-1].at
+    assert 0 < await redis.ttl(repo.history_key("job-1")) <= 60
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_records_are_converted_to_hashes(repo):
+    # The original repository SET each record as one JSON document.
+    legacy = {
+        "task_id": "old-1",
+        "filename": "old-1.pdf",
+        "status": "queued",
+        "content_type": "application/pdf",
+        "size_bytes": 1024,
+        "sha256": "0" * 64,
+        "storage_uri": "file://tests/old-1.pdf",
+        "storage_path": "/tmp/old-1.pdf",
+        "queue_name": "test:queue",
+        "submitted_at": "2024-05-01T10:00:00",
+        "updated_at": "2024-05-01T10:00:00",
+        "priority": 5,
+        "submitted_by": "sme@example.org",
+        "error_message": None,
+        "retry_count": 1,
+    }
+    await repo.redis.set(repo.key("old-1"), orjson.dumps(legacy), ex=60)
+    await repo.save(make_record("new-1"))
+
+    assert await repo.convert_legacy_records() == 1
+    assert await repo.convert_legacy_records() == 0
+    assert 0 < await repo.redis.ttl(repo.key("old-1")) <= 60
+    record = await repo.get("old-1")
+    assert (record.status, record.retry_count, record.submitted_by) == (TaskStatus.queued, 1, "sme@example.org")
+    assert not await repo.is_cancelled("old-1")
+    event = await repo.update_status("old-1", TaskStatus.processing)
+    assert event.status == TaskStatus.processing and event.retry_count == 1
+    assert (await repo.get("new-1")).task_id == "new-1"
+
+
+@pytest.mark.asyncio
+async def test_release_digest_keeps_a_claim_taken_over_by_another_task(repo):
+    digest = "ab" * 32
+    assert await repo.claim_digest(digest, "first", pending_ttl_seconds=60) is None
+    assert await repo.claim_digest(digest, "second", pending_ttl_seconds=60, force=True) is None
+
+    await repo.release_digest(digest, "first")
+    assert await repo.find_by_digest(digest) == "second"
+    await repo.release_digest(digest, "second")
+    assert await repo.find_by_digest(digest) is None
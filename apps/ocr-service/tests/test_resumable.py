@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import hashlib
+
+from ocr_service import resumable
+from ocr_service.resumable import Sha256State
+
+
+def test_sha256_state_resumes_from_exported_bytes():
+    data = b"%PDF-1.7 " + bytes(range(256)) * 1000
+    first = Sha256State()
+    first.update(data[:12345])
+    resumed = Sha256State(first.export())
+    resumed.update(data[12345:])
+
+    assert resumed.hexdigest() == hashlib.sha256(data).hexdigest()
+    # Reading the digest does not finalise the running state.
+    resumed.update(b"more")
+    assert resumed.hexdigest() == hashlib.sha256(data + b"more").hexdigest()
+
+
+def test_self_test_refuses_a_context_larger_than_assumed(monkeypatch):
+    assert resumable._LIBCRYPTO is not None
+    assert resumable._self_test(resumable._LIBCRYPTO)
+    # SHA256_Init writes past a 64-byte context into the guard band behind it.
+    monkeypatch.setattr(resumable, "_CTX_SIZE", 64)
+    assert not resumable._self_test(resumable._LIBCRYPTO)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import io
+import threading
+import time
+from pathlib import Path
+
+import boto3
+import pytest
+from fastapi import UploadFile
+from moto import mock_aws
+from starlette.datastructures import Headers
+
+from ocr_service import storage
+from ocr_service.storage import LOCAL_CHUNK_SIZE, LocalStorageBackend, S3StorageBackend
+
+PART_SIZE = 5 * 1024 * 1024
+
+
+def make_upload(data: bytes, filename: str = "scan.pdf") -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data),
+        filename=filename,
+        headers=Headers({"content-type": "application/pdf"}),
+    )
+
+
+@pytest.mark.asyncio
+async def test_local_upload_is_hashed_and_renamed_into_place(tmp_path: Path):
+    backend = LocalStorageBackend(base_path=tmp_path, base_uri="file://tests")
+    data = b"%PDF-1.4 " + b"0123456789" * (LOCAL_CHUNK_SIZE // 5)
+    upload = make_upload(data)
+    upload.size = len(data) + 1024  # client-declared size is only a preallocation hint
+
+    artifact = await backend.save_upload(upload, key="a/b/scan.pdf", max_bytes=len(data))
+
+    destination = tmp_path / "a/b/scan.pdf"
+    assert artifact.path == str(destination)
+    assert artifact.sha256 == hashlib.sha256(data).hexdigest()
+    assert destination.read_bytes() == data
+    assert [p.name for p in destination.parent.iterdir()] == ["scan.pdf"]
+
+
+@pytest.mark.asyncio
+async def test_known_digest_is_not_hashed_again(tmp_path: Path, monkeypatch):
+    backend = LocalStorageBackend(base_path=tmp_path, base_uri="file://tests")
+    data = b"%PDF-1.4 hashed already\n%%EOF"
+    digest = hashlib.sha256(data).hexdigest()
+    monkeypatch.setattr(storage.hashlib, "sha256", lambda *args: pytest.fail("upload hashed twice"))
+
+    artifact = await backend.save_upload(make_upload(data), key="a/known.pdf", max_bytes=len(data), sha256=digest)
+    assert artifact.sha256 == digest
+    assert (tmp_path / "a/known.pdf").read_bytes() == data
+
+
+@pytest.mark.asyncio
+async def test_local_oversize_upload_leaves_no_file(tmp_path: Path):
+    backend = LocalStorageBackend(base_path=tmp_path, base_uri="file://tests")
+    data = b"x" * (LOCAL_CHUNK_SIZE * 2)
+
+    with pytest.raises(ValueError):
+        await backend.save_upload(make_upload(data), key="a/huge.pdf", max_bytes=LOCAL_CHUNK_SIZE)
+
+    assert list((tmp_path / "a").iterdir()) == []
+
+
+@pytest.fixture()
+def s3_backend(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="ocr-inbox")
+        yield S3StorageBackend(
+            bucket="ocr-inbox",
+            prefix="tests",
+            region="us-east-1",
+            part_size=PART_SIZE,
+            max_concurrency=2,
+        )
+
+
+@pytest.mark.asyncio
+async def test_s3_small_upload_uses_single_put(s3_backend):
+    data = b"%PDF-1.4 small\n%%EOF"
+    artifact = await s3_backend.save_upload(make_upload(data), key="a/small.pdf", max_bytes=PART_SIZE)
+
+    assert artifact.path == "tests/a/small.pdf"
+    assert artifact.sha256 == hashlib.sha256(data).hexdigest()
+    stored = s3_backend._client.get_object(Bucket="ocr-inbox", Key=artifact.path)
+    assert stored["Body"].read() == data
+
+
+@pytest.mark.asyncio
+async def test_s3_large_upload_streams_multipart(s3_backend):
+    data = bytes(range(256)) * (PART_SIZE * 3 // 256) + b"tail"
+    artifact = await s3_backend.save_upload(make_upload(data), key="a/large.pdf", max_bytes=len(data))
+
+    assert artifact.size_bytes == len(data)
+    assert artifact.sha256 == hashlib.sha256(data).hexdigest()
+    stored = s3_backend._client.get_object(Bucket="ocr-inbox", Key=artifact.path)
+    assert stored["ETag"].strip('"').endswith("-4")
+    assert stored["Body"].read() == data
+
+    stats = s3_backend.stats()
+    assert stats["s3_calls"] == 6  # create + 4 parts + complete
+    assert stats["s3_in_flight"] == 0
+    assert 1 <= stats["s3_max_in_flight"] <= 2
+    await s3_backend.close()
+
+
+@pytest.mark.asyncio
+async def test_s3_oversize_upload_aborts_multipart(s3_backend):
+    data = b"x" * (PART_SIZE * 3)
+    with pytest.raises(ValueError):
+        await s3_backend.save_upload(make_upload(data), key="a/huge.pdf", max_bytes=PART_SIZE * 2)
+
+    client = s3_backend._client
+    assert client.list_multipart_uploads(Bucket="ocr-inbox").get("Uploads", []) == []
+    assert client.list_objects_v2(Bucket="ocr-inbox").get("KeyCount") == 0
+
+
+@pytest.mark.asyncio
+async def test_range_reads_on_local_and_s3(tmp_path: Path, s3_backend):
+    local = LocalStorageBackend(base_path=tmp_path, base_uri="file://tests")
+    for backend in (local, s3_backend):
+        await backend.save_bytes("results/t/pages.zst", b"0123456789", content_type="application/zstd")
+        assert await backend.read_bytes("results/t/pages.zst") == b"0123456789"
+        assert await backend.read_bytes("results/t/pages.zst", offset=3, length=4) == b"3456"
+        assert await backend.read_bytes("results/t/pages.zst", offset=7) == b"789"
+        with pytest.raises(FileNotFoundError):
+            await backend.read_bytes("results/missing/index.json")
+
+
+@pytest.mark.asyncio
+async def test_s3_resumable_parts_assemble_without_rereading(s3_backend):
+    first = b"a" * PART_SIZE
+    last = b"%%EOF"
+    upload_id = await s3_backend.begin_resumable("a/big.pdf", content_type="application/pdf")
+    await s3_backend.write_resumable_part("a/big.pdf", upload_id, part_number=1, offset=0, data=b"stale" * PART_SIZE)
+    # Resending a part after a failed commit replaces it.
+    await s3_backend.write_resumable_part("a/big.pdf", upload_id, part_number=1, offset=0, data=first)
+    await s3_backend.write_resumable_part("a/big.pdf", upload_id, part_number=2, offset=PART_SIZE, data=last)
+
+    info = await s3_backend.finish_resumable("a/big.pdf", upload_id, size_bytes=PART_SIZE + len(last))
+
+    assert info.path == "tests/a/big.pdf"
+    stored = s3_backend._client.get_object(Bucket="ocr-inbox", Key=info.path)["Body"].read()
+    assert stored == first + last
+
+
+def wrap_client_call(backend: S3StorageBackend, name: str, before) -> None:
+    """Run ``before(kwargs)`` in the S3 pool thread ahead of the real boto3 call."""
+    real = getattr(backend._client, name)
+
+    @functools.wraps(real)
+    def wrapper(**kwargs):
+        before(kwargs)
+        return real(**kwargs)
+
+    setattr(backend._client, name, wrapper)
+
+
+@pytest.mark.asyncio
+async def test_s3_multipart_keeps_at_most_max_concurrency_parts_in_flight(s3_backend):
+    lock = threading.Lock()
+    running = []
+    peak = [0]
+
+    def slow_part(kwargs):
+        with lock:
+            running.append(kwargs["PartNumber"])
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(kwargs["PartNumber"])
+
+    wrap_client_call(s3_backend, "upload_part", slow_part)
+    data = b"p" * (PART_SIZE * 5)
+    artifact = await s3_backend.save_upload(make_upload(data), key="a/wide.pdf", max_bytes=len(data))
+
+    assert peak[0] == 2
+    stored = s3_backend._client.get_object(Bucket="ocr-inbox", Key=artifact.path)
+    assert stored["ETag"].strip('"').endswith("-5")
+    await s3_backend.close()
+
+
+@pytest.mark.asyncio
+async def test_s3_failed_part_propagates_and_aborts_multipart(s3_backend):
+    def fail_part_two(kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ConnectionError("connection reset by peer")
+
+    wrap_client_call(s3_backend, "upload_part", fail_part_two)
+    data = b"f" * (PART_SIZE * 4)
+    with pytest.raises(ConnectionError, match="connection reset"):
+        await s3_backend.save_upload(make_upload(data), key="a/broken.pdf", max_bytes=len(data))
+
+    client = s3_backend._client
+    assert client.list_multipart_uploads(Bucket="ocr-inbox").get("Uploads", []) == []
+    assert client.list_objects_v2(Bucket="ocr-inbox").get("KeyCount") == 0
+    stats = s3_backend.stats()
+    assert stats["s3_in_flight"] == 0
+    assert stats["s3_max_in_flight"] <= 2
+    await s3_backend.close()
+
+
+@pytest.mark.asyncio
+async def test_s3_pool_queues_calls_beyond_max_pool_connections(s3_backend):
+    s3_backend.max_pool_connections = 2
+    release = threading.Event()
+    wrap_client_call(s3_backend, "put_object", lambda kwargs: release.wait(5))
+
+    saves = [
+        asyncio.create_task(s3_backend.save_bytes(f"results/{n}.json", b"{}", content_type="application/json"))
+        for n in range(3)
+    ]
+    await asyncio.sleep(0.1)
+    assert s3_backend.executor._max_workers == 2
+    assert s3_backend.stats()["s3_in_flight"] == 3
+    release.set()
+    await asyncio.gather(*saves)
+
+    stats = s3_backend.stats()
+    assert stats["s3_in_flight"] == 0
+    assert stats["s3_wait_seconds_max"] >= 0.05  # the third call waited for a free thread
+    await s3_backend.close()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+
+from ocr_service.config import Settings
+from ocr_service.models import QueueTask, TaskRecord, TaskStatus
+from ocr_service.queue import create_queue
+from ocr_service.repository import TaskRepository
+from ocr_service.streams import StreamTaskQueue
+
+
+def make_task(task_id: str) -> QueueTask:
+    return QueueTask(
+        task_id=task_id,
+        filename=f"{task_id}.pdf",
+        content_type="application/pdf",
+        size_bytes=1024,
+        sha256="0" * 64,
+        storage_uri=f"file://tests/{task_id}.pdf",
+        storage_path=f"/tmp/{task_id}.pdf",
+        submitted_at=datetime.now(timezone.utc),
+    )
+
+
+@pytest_asyncio.fixture()
+async def queue():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    stream_queue = StreamTaskQueue(queue_name="test:queue", redis_client=redis, lease_seconds=0)
+    await stream_queue.connect()
+    yield stream_queue
+    await redis.aclose()
+
+
+def test_create_queue_selects_stream_backend():
+    settings = Settings(queue_backend="stream", stream_group="gpus", task_lease_seconds=42)
+    stream_queue = create_queue(settings, redis_client=fakeredis.aioredis.FakeRedis())
+    assert isinstance(stream_queue, StreamTaskQueue)
+    assert stream_queue.group == "gpus"
+    assert stream_queue.lease_seconds == 42
+
+
+@pytest.mark.asyncio
+async def test_claim_batch_ack_and_counts(queue):
+    for index in range(3):
+        assert await queue.enqueue(make_task(f"job-{index}")) == index + 1
+    assert await queue.oldest_enqueued_ms() is not None
+
+    leases = await queue.claim_batch("gpu-1", count=2, lease_seconds=30)
+    assert [lease.task.task_id for lease in leases] == ["job-0", "job-1"]
+    assert await queue.depth() == 1
+    assert await queue.in_flight() == 2
+    assert await queue.heartbeat(leases[0], lease_seconds=30)
+
+    for lease in leases:
+        await queue.ack(lease)
+    assert await queue.in_flight() == 0
+    assert await queue.redis.xlen(queue.stream_key) == 1
+
+    task = await queue.dequeue()
+    assert task is not None and task.task_id == "job-2"
+    assert await queue.dequeue() is None
+    assert await queue.oldest_enqueued_ms() is None
+
+
+@pytest.mark.asyncio
+async def test_reaper_reclaims_idle_entries_and_counts_retry(queue):
+    repo = TaskRepository(queue.redis, key_prefix="test:task:", ttl_seconds=60)
+    task = make_task("job-crash")
+    record = TaskRecord(
+        **task.model_dump(),
+        status=TaskStatus.processing,
+        queue_name=queue.queue_name,
+        updated_at=task.submitted_at,
+    )
+    await queue.enqueue(task, record=record, repo=repo)
+
+    lease = await queue.claim("gpu-crashed", lease_seconds=0)
+    assert lease is not None
+    await asyncio.sleep(0.01)
+
+    requeued = await queue.reap_expired(repo=repo)
+    assert [t.task_id for t in requeued] == ["job-crash"]
+    assert await queue.in_flight() == 0
+    assert not await queue.heartbeat(lease, lease_seconds=30)
+
+    stored = await repo.get("job-crash")
+    assert stored.retry_count == 1
+    assert stored.status == TaskStatus.queued
+
+    retry = await queue.claim("gpu-1", lease_seconds=30)
+    assert retry is not None and retry.task.task_id == "job-crash"
+
+
+@pytest.mark.asyncio
+async def test_reaper_removes_idle_consumers_without_pending_entries(queue):
+    for index in range(2):
+        await queue.enqueue(make_task(f"job-{index}"))
+    done = await queue.claim("gpu-exited", lease_seconds=30)
+    await queue.ack(done)
+    assert await queue.claim("gpu-busy", lease_seconds=30) is not None
+    queue.lease_seconds = 0.01
+    await asyncio.sleep(0.02)
+
+    requeued = await queue.reap_expired()
+    assert [task.task_id for task in requeued] == ["job-1"]
+    consumers = await queue.redis.xinfo_consumers(queue.stream_key, queue.group)
+    assert [consumer["name"] for consumer in consumers] == [b"reaper"]
+
+    retry = await queue.claim("gpu-1", lease_seconds=30)
+    assert retry is not None and retry.task.task_id == "job-1"
+    queue.lease_seconds = 300
+    await queue.reap_expired()
+    consumers = await queue.redis.xinfo_consumers(queue.stream_key, queue.group)
+    assert sorted(consumer["name"] for consumer in consumers) == [b"gpu-1", b"reaper"]
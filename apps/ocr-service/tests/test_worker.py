@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import fakeredis.aioredis
+import orjson
+import pytest
+
+from ocr_service.config import Settings
+from ocr_service.models import QueueTask, TaskRecord, TaskStatus
+from ocr_service.queue import TaskQueue
+from ocr_service.repository import create_repository
+from ocr_service.results import decode_page
+from ocr_service.retries import RetryPolicy, create_retry_queue
+from ocr_service.shards import plan_shards, split_task
+from ocr_service.storage import LocalStorageBackend
+from ocr_service.worker import OCRWorker, load_engine
+
+
+def fake_engine(pdf_path: str) -> dict:
+    data = Path(pdf_path).read_bytes()
+    if b"corrupt" in data:
+        raise ValueError("unreadable PDF")
+    return {"page_count": 1, "pages": [{"page_number": 1, "text": data.decode()}]}
+
+
+async def submit(queue, repo, storage_root: Path, task_id: str, content: bytes) -> None:
+    path = storage_root / f"{task_id}.pdf"
+    path.write_bytes(content)
+    now = datetime.now(timezone.utc)
+    task = QueueTask(
+        task_id=task_id,
+        filename=path.name,
+        content_type="application/pdf",
+        size_bytes=len(content),
+        sha256="0" * 64,
+        storage_uri=f"file://tests/{path.name}",
+        storage_path=str(path),
+        submitted_at=now,
+    )
+    record = TaskRecord(**task.model_dump(), status=TaskStatus.queued, queue_name=queue.queue_name, updated_at=now)
+    await queue.enqueue(task, record=record, repo=repo)
+
+
+async def wait_for_status(repo, task_ids, statuses, timeout: float = 5.0):
+    async def poll():
+        while True:
+            records = await repo.get_many(task_ids)
+            if len(records) == len(task_ids) and all(r.status in statuses for r in records.values()):
+                return records
+            await asyncio.sleep(0.02)
+
+    return await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_worker_processes_tasks_and_records_results(tmp_path: Path):
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    settings = Settings(
+        queue_name="test:queue",
+        task_status_prefix="test:task:",
+        worker_concurrency=2,
+        worker_prefetch=1,
+        worker_scratch_dir=tmp_path / "scratch",
+        worker_poll_interval_seconds=0.05,
+        task_max_retries=2,
+        task_retry_base_seconds=0.05,
+    )
+    queue = TaskQueue(queue_name=settings.queue_name, redis_client=redis)
+    await queue.connect()
+    repo = create_repository(redis, settings)
+    storage = LocalStorageBackend(base_path=tmp_path / "inbox", base_uri="file://tests")
+    await storage.connect()
+    for index in range(3):
+        await submit(queue, repo, tmp_path / "inbox", f"ok-{index}", f"%PDF page {index}".encode())
+    await submit(queue, repo, tmp_path / "inbox", "bad", b"%PDF corrupt")
+
+    worker = OCRWorker(queue=queue, repo=repo, storage=storage, engine=fake_engine, settings=settings, worker_id="w1")
+    stop = asyncio.Event()
+    running = asyncio.create_task(worker.run(stop))
+    records = await wait_for_status(
+        repo, ["ok-0", "ok-1", "ok-2", "bad"], {TaskStatus.completed, TaskStatus.failed}
+    )
+    stop.set()
+    await asyncio.wait_for(running, 5)
+
+    assert records["bad"].status == TaskStatus.failed
+    assert records["bad"].error_message == "unreadable PDF"
+    assert records["bad"].retry_count == 2 and records["bad"].retry_at is not None
+    history = [entry.status for entry in await repo.get_history("bad")]
+    assert history.count(TaskStatus.processing) == 3 and history.count(TaskStatus.queued) == 3
+    total, dead = await worker.retries.dead_letters()
+    assert total == 1 and dead[0].task.task_id == "bad" and dead[0].retry_count == 2
+    assert await worker.retries.delayed() == 0
+    for index in range(3):
+        record = records[f"ok-{index}"]
+        assert record.status == TaskStatus.completed
+        index_doc = await worker.results.load_index(f"ok-{index}")
+        result = orjson.loads(await worker.results.read_document(index_doc))
+        assert result["pages"][0]["text"] == f"%PDF page {index}"
+        assert record.result_uri == f"file://tests/results/ok-{index}/index.json"
+    assert await queue.depth() == 0
+    assert await queue.in_flight() == 0
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_worker_skips_cancelled_tasks(tmp_path: Path):
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    settings = Settings(
+        queue_name="test:queue",
+        task_status_prefix="test:task:",
+        worker_scratch_dir=tmp_path / "scratch",
+        worker_poll_interval_seconds=0.05,
+    )
+    queue = TaskQueue(queue_name=settings.queue_name, redis_client=redis)
+    await queue.connect()
+    repo = create_repository(redis, settings)
+    storage = LocalStorageBackend(base_path=tmp_path / "inbox", base_uri="file://tests")
+    await storage.connect()
+    await submit(queue, repo, tmp_path / "inbox", "abandoned", b"%PDF abandoned")
+    await submit(queue, repo, tmp_path / "inbox", "wanted", b"%PDF wanted")
+    await repo.cancel("abandoned")
+    seen = []
+
+    def engine(pdf_path: str) -> dict:
+        seen.append(Path(pdf_path).name)
+        return fake_engine(pdf_path)
+
+    worker = OCRWorker(queue=queue, repo=repo, storage=storage, engine=engine, settings=settings, worker_id="w1")
+    stop = asyncio.Event()
+    running = asyncio.create_task(worker.run(stop))
+    await wait_for_status(repo, ["wanted"], {TaskStatus.completed})
+    stop.set()
+    await asyncio.wait_for(running, 5)
+
+    assert seen == ["wanted.pdf"]
+    assert (await repo.get("abandoned")).status == TaskStatus.cancelled
+    assert await queue.depth() == 0 and await queue.in_flight() == 0
+    await redis.aclose()
+
+
+def test_retry_policy_backoff_doubles_up_to_the_cap():
+    policy = RetryPolicy(max_retries=5, base_seconds=10, max_seconds=60)
+    for retry, ceiling in [(1, 10), (2, 20), (3, 40), (4, 60), (5, 60)]:
+        delays = [policy.delay(retry) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+
+@pytest.mark.asyncio
+async def test_dead_letters_are_capped_and_expire_with_task_records():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    retries = create_retry_queue(
+        redis, Settings(queue_name="test:queue", task_dead_letter_size=2, task_ttl_seconds=600)
+    )
+    for index in range(3):
+        task = QueueTask(
+            task_id=f"dead-{index}",
+            filename=f"dead-{index}.pdf",
+            content_type="application/pdf",
+            size_bytes=1024,
+            sha256="0" * 64,
+            storage_uri=f"file://tests/dead-{index}.pdf",
+            storage_path=f"/tmp/dead-{index}.pdf",
+            submitted_at=datetime.now(timezone.utc),
+        )
+        await retries.dead_letter(task, error="engine crashed", retry_count=3)
+
+    total, dead = await retries.dead_letters()
+    assert total == 2
+    assert [entry.task.task_id for entry in dead] == ["dead-2", "dead-1"]
+    assert 0 < await redis.ttl(retries.dead_letter_key) <= 600
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_failed_task_backs_off_then_dead_letters_and_requeues(tmp_path: Path):
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    settings = Settings(
+        queue_name="test:queue",
+        task_status_prefix="test:task:",
+        worker_scratch_dir=tmp_path / "scratch",
+        task_max_retries=2,
+        task_retry_base_seconds=30,
+    )
+    queue = TaskQueue(queue_name=settings.queue_name, redis_client=redis)
+    await queue.connect()
+    repo = create_repository(redis, settings)
+    storage = LocalStorageBackend(base_path=tmp_path / "inbox", base_uri="file://tests")
+    await storage.connect()
+    await submit(queue, repo, tmp_path / "inbox", "flaky", b"%PDF flaky")
+    worker = OCRWorker(queue=queue, repo=repo, storage=storage, engine=fake_engine, settings=settings, worker_id="w1")
+    retries = worker.retries
+
+    for attempt in (1, 2):
+        lease = await queue.claim("w1", lease_seconds=30)
+        before_ms = int(time.time() * 1000)
+        await worker._retry_or_fail(lease.task, "engine crashed")
+        await queue.ack(lease)
+
+        record = await repo.get("flaky")
+        assert (record.status, record.retry_count) == (TaskStatus.queued, attempt)
+        assert record.error_message == "engine crashed"
+        # The backoff parks the task in the delayed set, due when the record says.
+        message = lease.task.model_dump_json()
+        due_ms = await redis.zscore(retries.delayed_key, message)
+        assert before_ms <= due_ms <= before_ms + 30_000 * 2 ** (attempt - 1) + 1000
+        assert int(record.retry_at.timestamp() * 1000) == due_ms
+        assert await queue.depth() == 0 and await retries.promote_due(queue) == []
+
+        await redis.zadd(retries.delayed_key, {message: 0})
+        assert [task.task_id for task in await retries.promote_due(queue)] == ["flaky"]
+        assert await retries.delayed() == 0 and await queue.depth() == 1
+
+    lease = await queue.claim("w1", lease_seconds=30)
+    await worker._retry_or_fail(lease.task, "engine crashed")
+    await queue.ack(lease)
+    record = await repo.get("flaky")
+    assert (record.status, record.retry_count) == (TaskStatus.failed, 2)
+    assert await retries.delayed() == 0 and await queue.depth() == 0
+    total, dead = await retries.dead_letters()
+    assert total == 1
+    assert (dead[0].task.task_id, dead[0].retry_count, dead[0].error) == ("flaky", 2, "engine crashed")
+
+    assert await retries.requeue_dead_letters(queue, repo) == ["flaky"]
+    record = await repo.get("flaky")
+    assert (record.status, record.retry_count) == (TaskStatus.queued, 0)
+    assert (await retries.dead_letters())[0] == 0
+    assert (await queue.claim("w1", lease_seconds=30)).task.task_id == "flaky"
+    # A dead letter whose task was cancelled meanwhile is dropped, not queued.
+    await retries.dead_letter(lease.task, error="engine crashed", retry_count=2)
+    await repo.cancel("flaky")
+    assert await retries.requeue_dead_letters(queue, repo) == []
+    assert (await retries.dead_letters())[0] == 0 and await queue.depth() == 0
+    await redis.aclose()
+
+
+def paged_engine(pdf_path: str, pages: tuple[int, int] = (1, 7)) -> dict:
+    first, last = pages
+    return {
+        "page_count": last - first + 1,
+        "pages": [{"page_number": number, "text": f"page {number}"} for number in range(first, last + 1)],
+    }
+
+
+def test_plan_shards():
+    assert plan_shards(None, 3) == []
+    assert plan_shards(3, 3) == [(1, 3)]
+    assert plan_shards(7, 3) == [(1, 3), (4, 6), (7, 7)]
+    assert plan_shards(7, 0) == [(1, 7)]
+
+
+@pytest.mark.asyncio
+async def test_worker_assembles_sharded_document(tmp_path: Path):
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    settings = Settings(
+        queue_name="test:queue",
+        task_status_prefix="test:task:",
+        worker_concurrency=3,
+        worker_scratch_dir=tmp_path / "scratch",
+        worker_poll_interval_seconds=0.05,
+    )
+    queue = TaskQueue(queue_name=settings.queue_name, redis_client=redis)
+    await queue.connect()
+    repo = create_repository(redis, settings)
+    storage = LocalStorageBackend(base_path=tmp_path / "inbox", base_uri="file://tests")
+    await storage.connect()
+    path = tmp_path / "inbox" / "big.pdf"
+    path.write_bytes(b"%PDF big")
+    now = datetime.now(timezone.utc)
+    task = QueueTask(
+        task_id="big",
+        filename="big.pdf",
+        content_type="application/pdf",
+        size_bytes=8,
+        sha256="0" * 64,
+        storage_uri="file://tests/big.pdf",
+        storage_path=str(path),
+        submitted_at=now,
+        page_count=7,
+    )
+    record = TaskRecord(**task.model_dump(), status=TaskStatus.queued, queue_name=queue.queue_name, updated_at=now)
+    parent, shards = split_task(task, record, plan_shards(7, 3))
+    await repo.save(parent)
+    for shard, shard_record in shards:
+        await queue.enqueue(shard, record=shard_record, repo=repo)
+
+    worker = OCRWorker(queue=queue, repo=repo, storage=storage, engine=paged_engine, settings=settings, worker_id="w1")
+    stop = asyncio.Event()
+    running = asyncio.create_task(worker.run(stop))
+    records = await wait_for_status(repo, ["big"], {TaskStatus.completed, TaskStatus.failed})
+    stop.set()
+    await asyncio.wait_for(running, 5)
+
+    assert records["big"].status == TaskStatus.completed
+    assert records["big"].shards_completed == 3
+    assert records["big"].result_uri == "file://tests/results/big/index.json"
+    index = await worker.results.load_index("big")
+    assert [page.number for page in index.pages] == list(range(1, 8))
+    result = orjson.loads(await worker.results.read_document(index))
+    assert result["page_count"] == 7
+    assert [page["text"] for page in result["pages"]] == [f"page {number}" for number in range(1, 8)]
+    page = await worker.results.read_page_frame(index, 5)
+    assert orjson.loads(decode_page(page))["page_number"] == 5
+    assert await repo.complete_shard("big", 0) == 3
+    await redis.aclose()
+
+
+def test_load_engine_resolves_module_attribute():
+    assert load_engine("os.path:basename")("/a/b.pdf") == "b.pdf"
+    with pytest.raises(ValueError):
+        load_engine("no-colon")
+    with pytest.raises(ValueError, match="OCR_SERVICE_WORKER_ENGINE is not set"):
+        load_engine(None)
+    with pytest.raises(ValueError, match="cannot be loaded"):
+        load_engine("pdf_extract_missing:extract_pdf_to_json")
@@ -4,7 +4,7 @@ import json
 import os
 import sys
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import requests  # type: ignore
 
@@ -15,9 +15,16 @@ except ImportError as e:
     raise
 
 
-def _extract_with_pdfplumber(pdf_path: str, include_layout: bool = False) -> dict:
+def _extract_with_pdfplumber(
+    pdf_path: str,
+    include_layout: bool = False,
+    pages: Optional[Tuple[int, int]] = None,
+) -> dict:
     """Extract text and tables from a PDF into a structured JSON dict.
 
+    ``pages`` limits extraction to a 1-based inclusive page range; page numbers in
+    the output stay those of the full document.
+
     Structure:
     {
       "source_path": str,
@@ -45,9 +52,10 @@ def _extract_with_pdfplumber(pdf_path: str, include_layout: bool = False) -> dic
         },
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
+    selected = list(range(pages[0], pages[1] + 1)) if pages else None
+    with pdfplumber.open(pdf_path, pages=selected) as pdf:
         out["page_count"] = len(pdf.pages)
-        for idx, page in enumerate(pdf.pages, start=1):
+        for idx, page in enumerate(pdf.pages, start=pages[0] if pages else 1):
             page_obj = {
                 "page_number": idx,
                 "width": page.width,
@@ -90,11 +98,14 @@ def _extract_with_deepseek(
     ocr_url: str,
     include_layout: bool = False,
     headers: Optional[Dict[str, str]] = None,
+    pages: Optional[Tuple[int, int]] = None,
 ) -> dict:
     if not ocr_url:
         raise ValueError("--ocr-url is required when engine=deepseek")
     req_headers = headers.copy() if headers else {}
     data = {"include_layout": str(bool(include_layout)).lower()}
+    if pages:
+        data["first_page"], data["last_page"] = str(pages[0]), str(pages[1])
     with open(pdf_path, "rb") as f:
         files = {"file": (os.path.basename(pdf_path), f, "application/pdf")}
         resp = requests.post(ocr_url, headers=req_headers, data=data, files=files, timeout=300)
@@ -106,9 +117,16 @@ def _extract_with_deepseek(
     if not isinstance(payload, dict) or "pages" not in payload:
         raise ValueError("Unexpected DeepSeek OCR response: missing 'pages'")
 
+    page_range = pages
     pages = payload.get("pages", [])
     if not isinstance(pages, list):
         raise ValueError("Unexpected DeepSeek OCR response: 'pages' is not a list")
+    first_page = 1
+    if page_range:
+        first_page = page_range[0]
+        # An endpoint that ignores the range returns every page; keep only the requested ones.
+        if len(pages) > page_range[1] - page_range[0] + 1:
+            pages = pages[page_range[0] - 1 : page_range[1]]
 
     doc = {
         "source_path": os.path.abspath(pdf_path),
@@ -121,7 +139,7 @@ def _extract_with_deepseek(
         },
     }
 
-    for idx, p in enumerate(pages, start=1):
+    for idx, p in enumerate(pages, start=first_page):
         text = p.get("text") or ""
         words = p.get("words") if include_layout else None
         page_obj = {
@@ -154,12 +172,15 @@ def extract_pdf_to_json(
     engine: str = "pdfplumber",
     ocr_url: Optional[str] = None,
     ocr_headers: Optional[Dict[str, str]] = None,
+    pages: Optional[Tuple[int, int]] = None,
 ) -> dict:
     engine = engine.lower()
     if engine == "pdfplumber":
-        return _extract_with_pdfplumber(pdf_path, include_layout=include_layout)
+        return _extract_with_pdfplumber(pdf_path, include_layout=include_layout, pages=pages)
     if engine == "deepseek":
-        return _extract_with_deepseek(pdf_path, ocr_url=ocr_url or "", include_layout=include_layout, headers=ocr_headers)
+        return _extract_with_deepseek(
+            pdf_path, ocr_url=ocr_url or "", include_layout=include_layout, headers=ocr_headers, pages=pages
+        )
     raise ValueError(f"Unsupported engine: {engine}")
 
 